@@ -3,36 +3,73 @@
 import pandas as pd
 import streamlit as st
 import io
+from cache_planilhas import carregar_planilha
+from reconciliacao import COLUNAS_RELATORIO, formatar_pendentes, reconciliar, resumo_por_cidade
+from metricas import coletar, etapa, instrumentar, tabela_tempos
+from snapshots import delta_do_dia, gravar_snapshot
 
-# --- Função de Processamento de Dados (sem alterações) ---
+COLUNAS_INTERESSE = ['SVO', 'Status da OS', 'Agendado para', 'Cidade Consumidor']
+
+
+# --- Função de Processamento de Dados ---
+@instrumentar('processar_dados')
 def processar_dados(df_abertas, df_relatorio):
-    # ... (copie a função processar_dados do seu script original aqui, sem alterá-la)
     """
     Compara duas planilhas para encontrar SVOs pendentes.
     Retorna um DataFrame com as SVOs pendentes e a contagem total.
     """
-    df_abertas = df_abertas[
-        df_abertas['SVO'].notna() & df_abertas['SVO'].str.startswith('SVO-')
-    ].copy()
-    df_relatorio = df_relatorio[
-        df_relatorio['SVO'].notna() & df_relatorio['SVO'].str.startswith('SVO-')
-    ].copy()
-    colunas_interesse = ['SVO', 'Status da OS', 'Agendado para', 'Cidade Consumidor']
-    for col in colunas_interesse:
+    etapa('validacao')
+    for col in COLUNAS_INTERESSE:
         if col not in df_abertas.columns:
             st.error(f"Erro: A coluna '{col}' não foi encontrada na planilha de SVOs Abertas.")
             return pd.DataFrame(), 0
-    svos_pendentes = df_abertas[
-        ~df_abertas['SVO'].isin(df_relatorio['SVO'])
-    ][colunas_interesse].copy()
-    quantidade_svos = len(svos_pendentes)
-    if not svos_pendentes.empty:
-        status_order = svos_pendentes['Status da OS'].unique()
-        svos_pendentes['Status da OS'] = pd.Categorical(svos_pendentes['Status da OS'], categories=status_order, ordered=True)
-        svos_pendentes = svos_pendentes.sort_values('Status da OS')
-        svos_pendentes['Agendado para'] = pd.to_datetime(svos_pendentes['Agendado para'], errors='coerce').dt.strftime('%d/%m/%Y')
-        svos_pendentes['Agendado para'] = svos_pendentes['Agendado para'].fillna('Sem Data')
-    return svos_pendentes, quantidade_svos
+    etapa('reconciliacao')
+    resultado = reconciliar([df_abertas], [df_relatorio])
+    etapa('formatacao')
+    svos_pendentes = formatar_pendentes(resultado['pendentes'])
+    return svos_pendentes, len(svos_pendentes)
+
+
+def validar_colunas(planilhas, nome_grupo, colunas):
+    for nome, df in planilhas:
+        for col in colunas:
+            if col not in df.columns:
+                st.error(f"Erro: A coluna '{col}' não foi encontrada na planilha '{nome}' ({nome_grupo}).")
+                return False
+    return True
+
+
+def _tabela_delta(df):
+    tabela = df.rename(columns={
+        'status': 'Status', 'agendado': 'Agendado para',
+        'status_anterior': 'Status anterior', 'agendado_anterior': 'Agendado antes',
+    })
+    svo = 'SVO-' + tabela.pop('chave').astype(str)
+    if 'svo' in tabela.columns:  # SVOs fora do padrão 'SVO-<número>' guardam o texto original
+        svo = tabela.pop('svo').fillna(svo)
+    tabela.insert(0, 'SVO', svo)
+    return tabela
+
+
+def mostrar_delta(cidades):
+    st.markdown("#### O que mudou desde a última análise")
+    for cidade in cidades:
+        data_anterior, delta = delta_do_dia(cidade)
+        if delta is None:
+            st.info(f"{cidade}: ainda não há análise de um dia anterior para comparar.")
+            continue
+        st.markdown(f"**{cidade}** (comparado com {data_anterior.strftime('%d/%m/%Y')})")
+        colunas = st.columns(4)
+        rotulos = {
+            'novas': "Novas pendências", 'resolvidas': "Resolvidas",
+            'status_alterado': "Mudaram de status", 'reagendadas': "Reagendadas",
+        }
+        for coluna, (chave, rotulo) in zip(colunas, rotulos.items()):
+            coluna.metric(rotulo, len(delta[chave]))
+        for chave, rotulo in rotulos.items():
+            if not delta[chave].empty:
+                with st.expander(f"{rotulo} ({len(delta[chave])})"):
+                    st.dataframe(_tabela_delta(delta[chave]), use_container_width=True, hide_index=True)
 
 
 # --- Função Principal que Desenha a Interface ---
@@ -42,24 +79,58 @@ def run_analyzer_app():
 
     st.warning("""
     **ATENÇÃO:** Para o melhor funcionamento da ferramenta:
-    - Valide se a planilha de **Origem** e a planilha de **Relatório** são da mesma cidade.
-    - Ambas as planilhas devem conter uma coluna chamada **'SVO'**.
+    - Você pode enviar várias planilhas de **Origem** e vários **Relatórios**; o resultado é separado por cidade.
+    - Todas as planilhas devem conter uma coluna chamada **'SVO'**.
     """)
 
     col1, col2 = st.columns(2)
     with col1:
-        origem_file = st.file_uploader("1. Planilha de SVOs Abertas (Origem)", type=['xlsx'])
+        origem_files = st.file_uploader("1. Planilhas de SVOs Abertas (Origem)", type=['xlsx'], accept_multiple_files=True)
     with col2:
-        modelo_file = st.file_uploader("2. Planilha de Relatório (Modelo)", type=['xlsx'])
+        modelo_files = st.file_uploader("2. Planilhas de Relatório (Modelo)", type=['xlsx'], accept_multiple_files=True)
+
+    modo_delta = st.checkbox(
+        "Mostrar o que mudou desde a última análise (modo delta)",
+        help="Cada análise guarda um resumo das pendências por cidade; este modo compara com o dia anterior mais recente.",
+    )
+    mostrar_tempos = st.checkbox("Mostrar o tempo de cada etapa", help="Leitura, cruzamento e gravação do snapshot.")
 
     if st.button("Analisar Planilhas", type="primary"):
-        if origem_file is not None and modelo_file is not None:
-            with st.spinner('Processando os dados... Por favor, aguarde.'):
-                planilha_abertas = pd.read_excel(origem_file)
-                planilha_relatorio = pd.read_excel(modelo_file)
-                svos_pendentes, quantidade_svos = processar_dados(planilha_abertas, planilha_relatorio)
+        if origem_files and modelo_files:
+            with st.spinner('Processando os dados... Por favor, aguarde.'), coletar() as tempos:
+                planilhas_abertas = [(f.name, carregar_planilha(f)) for f in origem_files]
+                planilhas_relatorio = [(f.name, carregar_planilha(f, colunas=COLUNAS_RELATORIO)) for f in modelo_files]
+                if not (validar_colunas(planilhas_abertas, "Origem", COLUNAS_INTERESSE)
+                        and validar_colunas(planilhas_relatorio, "Relatório", ['SVO'])):
+                    st.stop()
+                resultado = reconciliar([df for _, df in planilhas_abertas], [df for _, df in planilhas_relatorio])
+                svos_pendentes = formatar_pendentes(resultado['pendentes'])
+                quantidade_svos = len(svos_pendentes)
+                cidades_snapshot = gravar_snapshot(
+                    resultado['pendentes'],
+                    outras_cidades=resultado['resolvidas']['Cidade Consumidor'].unique(),
+                )
 
             st.success("Análise concluída!")
+            if mostrar_tempos and tempos:
+                with st.expander("Tempo de cada etapa"):
+                    st.dataframe(tabela_tempos(tempos), use_container_width=True, hide_index=True)
+            invalidas = resultado['invalidas']
+            if not invalidas.empty:
+                st.warning(f"{len(invalidas)} linhas sem uma SVO no formato 'SVO-...' ficaram fora da análise.")
+                with st.expander(f"SVOs inválidas ({len(invalidas)})"):
+                    st.dataframe(invalidas, use_container_width=True, hide_index=True)
+            resumo = resumo_por_cidade(resultado)
+            if len(resumo) > 1 or not (resultado['desconhecidas'].empty and invalidas.empty):
+                st.markdown("#### Resumo por cidade")
+                st.dataframe(resumo.rename(columns={
+                    'pendentes': 'Pendentes', 'resolvidas': 'Resolvidas', 'desconhecidas': 'Só no relatório',
+                    'invalidas': 'SVO inválida',
+                }), use_container_width=True, hide_index=True)
+
+            if modo_delta:
+                mostrar_delta(cidades_snapshot)
+
             if quantidade_svos > 0:
                 st.metric(label="Total de SVOs que precisam de tratamento", value=quantidade_svos)
                 
@@ -76,9 +147,13 @@ def run_analyzer_app():
                 )
                 
                 st.markdown("---")
-                for status, group in svos_pendentes.groupby('Status da OS', observed=True):
-                    with st.expander(f"**{status}** ({len(group)} SVOs)"):
-                        st.dataframe(group, use_container_width=True, hide_index=True)
+                cidades = svos_pendentes.groupby('Cidade Consumidor', observed=True, dropna=False)
+                for cidade, pendentes_cidade in cidades:
+                    if cidades.ngroups > 1:
+                        st.markdown(f"### {cidade} ({len(pendentes_cidade)} SVOs)")
+                    for status, group in pendentes_cidade.groupby('Status da OS', observed=True):
+                        with st.expander(f"**{status}** ({len(group)} SVOs)"):
+                            st.dataframe(group, use_container_width=True, hide_index=True)
             else:
                 st.info("🎉 Nenhuma SVO pendente foi encontrada. Tudo em dia!")
         else:
@@ -0,0 +1,211 @@
+# Em ao_vivo.py
+# Contagens por cidade, dia e bairro (com as coordenadas) para as telas de
+# despacho. Cada planilha processada publica as contagens das cidades que traz;
+# só as linhas que mudaram ganham uma versão nova, e o mc_webapp entrega essas
+# mudanças em /api/agregados (JSON) e /api/agregados/stream (SSE), para a página
+# /ao-vivo atualizar o calor e os marcadores sem gerar outro HTML.
+# Compartilhado por processos (Streamlit, fila de mapas, lote noturno, gunicorn)
+# num SQLite em modo WAL, como as métricas e a fila.
+
+import os
+import sqlite3
+import threading
+import time
+from datetime import date, timedelta
+
+BASE_DIR = os.path.dirname(os.path.abspath(__file__))
+CAMINHO_AO_VIVO = os.environ.get('AO_VIVO_PATH', os.path.join(BASE_DIR, 'ao_vivo.sqlite3'))
+# Dias já passados ficam este tempo antes de serem zerados (as telas olham para hoje e
+# para a frente); as linhas zeradas são apagadas depois de outro tanto
+DIAS_RETENCAO = int(os.environ.get('AO_VIVO_DIAS', '7'))
+SEM_DATA = ''  # 'dia' das SVOs sem agendamento
+
+
+class AgregadosAoVivo:
+    """
+    Linhas (cidade, dia, bairro) -> contagem, latitude, longitude, versão. A versão
+    é um contador global: quem já viu a versão N pede só as linhas com versão > N.
+    Uma linha que deixa de existir fica com contagem 0 (para as telas a removerem).
+    Quando a limpeza apaga linhas zeradas, o 'piso' guarda a maior versão apagada:
+    quem está abaixo dele recebe o retrato completo em vez do delta.
+    """
+
+    def __init__(self, caminho=CAMINHO_AO_VIVO):
+        self.caminho = caminho
+        self._local = threading.local()
+        os.makedirs(os.path.dirname(os.path.abspath(caminho)), exist_ok=True)
+        with self._conexao() as conn:
+            conn.execute("""
+                CREATE TABLE IF NOT EXISTS contagens (
+                    cidade TEXT NOT NULL,
+                    dia TEXT NOT NULL,
+                    bairro TEXT NOT NULL,
+                    contagem INTEGER NOT NULL,
+                    latitude REAL,
+                    longitude REAL,
+                    versao INTEGER NOT NULL,
+                    PRIMARY KEY (cidade, dia, bairro)
+                ) WITHOUT ROWID
+            """)
+            conn.execute("CREATE INDEX IF NOT EXISTS contagens_versao ON contagens (versao)")
+            conn.execute("CREATE TABLE IF NOT EXISTS estado (nome TEXT PRIMARY KEY, valor INTEGER NOT NULL)")
+            conn.execute("INSERT OR IGNORE INTO estado VALUES ('versao', 0)")
+            conn.execute("INSERT OR IGNORE INTO estado VALUES ('piso', 0)")
+
+    def _conexao(self):
+        conn = getattr(self._local, 'conn', None)
+        if conn is None:
+            conn = sqlite3.connect(self.caminho, timeout=30, isolation_level=None)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            self._local.conn = conn
+        return conn
+
+    def versao(self):
+        return self._conexao().execute("SELECT valor FROM estado WHERE nome = 'versao'").fetchone()[0]
+
+    def publicar(self, cidade, linhas):
+        """
+        Substitui as contagens de `cidade` por `linhas` [(dia, bairro, contagem, lat, lon), ...]
+        (dia 'AAAA-MM-DD' ou SEM_DATA). Só o que mudou ganha versão nova.
+        Retorna quantas linhas mudaram.
+        """
+        novas = {(dia, bairro): (int(contagem), lat, lon) for dia, bairro, contagem, lat, lon in linhas if contagem}
+        conn = self._conexao()
+        conn.execute("BEGIN IMMEDIATE")  # uma publicação por vez: versões em ordem
+        try:
+            antigas = {
+                (dia, bairro): (contagem, lat, lon)
+                for dia, bairro, contagem, lat, lon in conn.execute(
+                    "SELECT dia, bairro, contagem, latitude, longitude FROM contagens WHERE cidade = ?", (cidade,),
+                )
+            }
+            mudancas = [(chave, valor) for chave, valor in novas.items() if antigas.get(chave) != valor]
+            mudancas += [((dia, bairro), (0, lat, lon)) for (dia, bairro), (contagem, lat, lon) in antigas.items()
+                         if contagem and (dia, bairro) not in novas]
+            if mudancas:
+                versao = self.versao() + 1
+                conn.executemany(
+                    "INSERT OR REPLACE INTO contagens VALUES (?, ?, ?, ?, ?, ?, ?)",
+                    [(cidade, dia, bairro, contagem, lat, lon, versao)
+                     for (dia, bairro), (contagem, lat, lon) in mudancas],
+                )
+                conn.execute("UPDATE estado SET valor = ? WHERE nome = 'versao'", (versao,))
+            conn.execute("COMMIT")
+        except BaseException:
+            conn.execute("ROLLBACK")
+            raise
+        return len(mudancas)
+
+    def publicar_cubo(self, cubo, coordenadas):
+        """
+        Publica as contagens de um CuboAgregado (uma substituição por cidade presente
+        nele), com as coordenadas {(bairro, cidade): (lat, lon)} já geocodificadas.
+        """
+        contagens = cubo.por('cidade', 'dia', 'bairro').dropna(subset=['cidade', 'bairro'])
+        dias = contagens['dia'].dt.strftime('%Y-%m-%d').fillna(SEM_DATA)
+        por_cidade = {}
+        for cidade, dia, bairro, contagem in zip(contagens['cidade'], dias, contagens['bairro'], contagens['contagem']):
+            lat, lon = coordenadas.get((bairro, cidade), (None, None))
+            por_cidade.setdefault(str(cidade), []).append((dia, str(bairro), int(contagem), lat, lon))
+        mudancas = sum(self.publicar(cidade, linhas) for cidade, linhas in por_cidade.items())
+        self.limpar()
+        return mudancas
+
+    def mudancas(self, desde=0, cidade=None, dia=None):
+        """
+        (versão atual, completo, linhas com versão > `desde`), linhas como
+        [cidade, dia, bairro, contagem, lat, lon]. Com `desde` 0, ou abaixo do piso
+        da limpeza, vem o retrato completo (sem as linhas zeradas) e completo=True.
+        """
+        estado = dict(self._conexao().execute("SELECT nome, valor FROM estado"))
+        versao = estado['versao']
+        if desde < estado['piso']:
+            desde = 0
+        if desde >= versao:
+            return versao, not desde, []
+        consulta = "SELECT cidade, dia, bairro, contagem, latitude, longitude FROM contagens WHERE versao > ?"
+        parametros = [desde]
+        if not desde:
+            consulta += " AND contagem > 0"
+        if cidade is not None:
+            consulta += " AND cidade = ?"
+            parametros.append(cidade)
+        if dia is not None:
+            consulta += " AND dia = ?"
+            parametros.append(dia)
+        return versao, not desde, [list(linha) for linha in self._conexao().execute(consulta, parametros)]
+
+    def cidades(self):
+        return [linha[0] for linha in self._conexao().execute(
+            "SELECT DISTINCT cidade FROM contagens WHERE contagem > 0 ORDER BY cidade")]
+
+    def limpar(self, dias=DIAS_RETENCAO):
+        """
+        Zera, numa versão nova, os dias que já passaram há mais de `dias` dias (as telas
+        conectadas removem os marcadores) e apaga as linhas dos dias passados há mais
+        de 2 * `dias`, subindo o piso. Retorna (zeradas, apagadas).
+        """
+        zerar = (date.today() - timedelta(days=dias)).isoformat()
+        apagar = (date.today() - timedelta(days=2 * dias)).isoformat()
+        conn = self._conexao()
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            versao = self.versao() + 1
+            piso, apagadas, vivas = conn.execute(
+                "SELECT MAX(versao), COUNT(*), SUM(contagem > 0) FROM contagens WHERE dia != ? AND dia < ?",
+                (SEM_DATA, apagar),
+            ).fetchone()
+            if apagadas:
+                conn.execute("DELETE FROM contagens WHERE dia != ? AND dia < ?", (SEM_DATA, apagar))
+                # Linha apagada sem ter sido zerada antes: qualquer tela pode tê-la, todas recebem o retrato
+                conn.execute("UPDATE estado SET valor = MAX(valor, ?) WHERE nome = 'piso'", (versao if vivas else piso,))
+            zeradas = conn.execute(
+                "UPDATE contagens SET contagem = 0, versao = ? WHERE dia != ? AND dia < ? AND contagem > 0",
+                (versao, SEM_DATA, zerar),
+            ).rowcount
+            if zeradas or vivas:
+                conn.execute("UPDATE estado SET valor = ? WHERE nome = 'versao'", (versao,))
+            conn.execute("COMMIT")
+        except BaseException:
+            conn.execute("ROLLBACK")
+            raise
+        return zeradas, apagadas
+
+
+def eventos(agregados, desde=0, cidade=None, dia=None, duracao=30.0, intervalo=2.0):
+    """
+    Corpo de um Server-Sent Events: um evento 'delta' (JSON com versão, se é o retrato
+    completo e as linhas) a cada mudança, e um comentário de vida nos intervalos.
+    Fecha depois de `duracao` segundos (o navegador reconecta sozinho com o
+    Last-Event-ID), para não prender uma thread do servidor indefinidamente.
+    """
+    import json
+
+    yield f"retry: {int(intervalo * 1000)}\n\n"
+    fim = time.monotonic() + duracao
+    primeiro = True
+    while True:
+        versao, completo, linhas = agregados.mudancas(desde, cidade, dia)
+        # Abaixo do piso da limpeza, o retrato completo vai mesmo vazio (a tela se esvazia)
+        if linhas or primeiro or (completo and desde):
+            dados = json.dumps({'versao': versao, 'completo': completo, 'linhas': linhas}, ensure_ascii=False)
+            yield f"id: {versao}\nevent: delta\ndata: {dados}\n\n"
+            desde, primeiro = versao, False
+        else:
+            yield ": sem mudanças\n\n"
+        if time.monotonic() >= fim:
+            return
+        time.sleep(intervalo)
+
+
+_agregados_padrao = None
+_agregados_padrao_lock = threading.Lock()
+
+
+def agregados_padrao():
+    global _agregados_padrao
+    with _agregados_padrao_lock:
+        if _agregados_padrao is None:
+            _agregados_padrao = AgregadosAoVivo()
+        return _agregados_padrao
@@ -0,0 +1,74 @@
+# Em aquecimento.py
+# Aquecimento depois da subida. O home.py só carrega a ferramenta que o usuário
+# abre; enquanto o menu está na tela, uma thread em segundo plano carrega os
+# módulos das ferramentas, a tabela de apelidos de bairros e os cubos recentes,
+# e sobe os processos da fila de mapas (que já abrem o geocodificador e os
+# caches de coordenadas). O primeiro clique e o primeiro mapa não pagam isso.
+# Tudo fica na memória do processo do Streamlit; AQUECIMENTO=0 desliga.
+
+import importlib
+import multiprocessing
+import os
+import sys
+import threading
+import time
+
+AQUECER = os.environ.get('AQUECIMENTO', '1') != '0'
+# Módulos das ferramentas, na ordem em que costumam ser abertas
+MODULOS = ['pandas', 'mapper_app', 'analyzer_app']
+
+_iniciado = False
+_iniciado_lock = threading.Lock()
+
+
+def _modulos():
+    for nome in MODULOS:
+        importlib.import_module(nome)
+    return len(MODULOS)
+
+
+def _caches():
+    from cubo import cache_padrao
+    from enderecos import carregar_apelidos
+
+    carregar_apelidos()
+    return cache_padrao().aquecer()
+
+
+def _fila():
+    from fila_mapas import fila_padrao
+
+    return len(fila_padrao().aquecer())
+
+
+def aquecer(etapas=(_modulos, _caches, _fila)):
+    """Roda as etapas em ordem; uma que falhe não impede as outras. Retorna {etapa: segundos}."""
+    tempos = {}
+    for funcao in etapas:
+        nome = funcao.__name__.lstrip('_')
+        inicio = time.perf_counter()
+        try:
+            funcao()
+        except Exception as e:
+            print(f"AVISO: aquecimento de '{nome}' falhou: {e}")
+            continue
+        tempos[nome] = round(time.perf_counter() - inicio, 3)
+    print(f"Aquecimento concluído: {tempos}")
+    return tempos
+
+
+def iniciar_aquecimento():
+    """Dispara o aquecimento numa thread, uma vez por processo (as próximas chamadas não fazem nada)."""
+    global _iniciado
+    # Num processo filho (a fila de mapas é spawn, que reexecuta o script principal
+    # como __mp_main__), aquecer subiria outro pool, e assim por diante
+    principal = getattr(sys.modules.get('__main__'), '__name__', '__main__')
+    if multiprocessing.parent_process() is not None or principal == '__mp_main__':
+        return None
+    with _iniciado_lock:
+        if _iniciado or not AQUECER:
+            return None
+        _iniciado = True
+    thread = threading.Thread(target=aquecer, name='aquecimento', daemon=True)
+    thread.start()
+    return thread
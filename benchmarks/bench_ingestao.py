@@ -0,0 +1,83 @@
+# Em benchmarks/bench_ingestao.py
+# Compara pd.read_excel (todas as colunas) com ingestao.ler_planilha.
+# Cada método roda num processo separado para medir o pico de memória (RSS) isolado.
+# Uso: python benchmarks/bench_ingestao.py [planilha.xlsx] [--linhas 50000]
+
+import argparse
+import json
+import os
+import resource
+import subprocess
+import sys
+import tempfile
+import time
+
+RAIZ = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, RAIZ)
+
+METODOS = ['pandas_read_excel', 'ingestao_openpyxl', 'ingestao_calamine']
+
+
+def pico_rss_mb():
+    pico = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # Linux informa em KiB, macOS em bytes
+    return pico / 1024 / 1024 if sys.platform == 'darwin' else pico / 1024
+
+
+def medir(metodo, caminho):
+    import pandas as pd
+    from ingestao import CALAMINE_DISPONIVEL, ler_planilha
+
+    if metodo == 'ingestao_calamine' and not CALAMINE_DISPONIVEL:
+        return {'metodo': metodo, 'erro': 'python-calamine não instalado'}
+
+    rss_inicial = pico_rss_mb()
+    inicio = time.perf_counter()
+    if metodo == 'pandas_read_excel':
+        df = pd.read_excel(caminho)
+    elif metodo == 'ingestao_openpyxl':
+        df = ler_planilha(caminho, backend='openpyxl')
+    else:
+        df = ler_planilha(caminho, backend='calamine')
+    tempo = time.perf_counter() - inicio
+    return {
+        'metodo': metodo,
+        'tempo_s': round(tempo, 3),
+        'pico_rss_mb': round(pico_rss_mb(), 1),
+        'rss_importacoes_mb': round(rss_inicial, 1),
+        'linhas': len(df),
+        'colunas': len(df.columns),
+        'memoria_df_mb': round(df.memory_usage(deep=True).sum() / 1024 / 1024, 2),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('planilha', nargs='?')
+    parser.add_argument('--linhas', type=int, default=50_000)
+    parser.add_argument('--metodo', choices=METODOS, help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.metodo:
+        print(json.dumps(medir(args.metodo, args.planilha)))
+        return
+
+    caminho = args.planilha
+    if caminho is None:
+        from benchmarks.gerador import gerar_planilha
+        caminho = os.path.join(tempfile.gettempdir(), f"bench_svo_{args.linhas}.xlsx")
+        if not os.path.exists(caminho):
+            print(f"Gerando planilha sintética com {args.linhas} linhas...")
+            gerar_planilha(caminho, args.linhas)
+
+    print(f"Arquivo: {caminho} ({os.path.getsize(caminho) / 1024 / 1024:.1f} MB)")
+    for metodo in METODOS:
+        saida = subprocess.run(
+            [sys.executable, os.path.abspath(__file__), caminho, '--metodo', metodo],
+            capture_output=True, text=True, check=True, cwd=RAIZ,
+        )
+        print(saida.stdout.strip().splitlines()[-1])
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,200 @@
+# Em benchmarks/bench_inicio.py
+# Mede a partida a frio, do processo novo até a primeira página utilizável:
+#   - importacao: tempo de importar cada módulo num interpretador novo (-X importtime);
+#   - servidor: do 'streamlit run home.py' até o /_stcore/health responder, e do
+#     gunicorn até o mc_webapp responder a '/';
+#   - menu: primeira execução do home.py numa sessão (AppTest), como no primeiro acesso;
+#   - ferramenta: o clique no analisador ou no gerador de mapas depois de --espera
+#     segundos no menu (o tempo em que o aquecimento roda em segundo plano).
+# Cada medição roda num processo separado, com caches numa pasta temporária.
+#
+# Uso: python benchmarks/bench_inicio.py
+#      python benchmarks/bench_inicio.py --sem-aquecimento --saida frio.json
+#      python benchmarks/bench_inicio.py --comparar frio.json quente.json
+
+import argparse
+import json
+import os
+import platform
+import re
+import shutil
+import socket
+import subprocess
+import sys
+import tempfile
+import time
+import urllib.request
+from datetime import datetime
+
+RAIZ = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, RAIZ)
+
+PASTA_RESULTADOS = os.path.join(RAIZ, 'benchmarks', 'resultados')
+MODULOS = ['streamlit', 'aquecimento', 'analyzer_app', 'mapper_app', 'mc_webapp', 'mc_simple', 'mc_geral', 'fila_mapas']
+# Botões do menu do home.py
+FERRAMENTAS = {'analyzer': 0, 'mapper': 1}
+
+
+def _ambiente(pasta, aquecer):
+    return dict(
+        os.environ,
+        GEO_CACHE_PATH=os.path.join(pasta, 'geo_cache.sqlite3'),
+        GAZETTEER_PATH=os.path.join(pasta, 'gazetteer.sqlite3'),
+        PLANILHAS_CACHE_DIR=os.path.join(pasta, 'cache_planilhas'),
+        CUBOS_DIR=os.path.join(pasta, 'cache_cubos'),
+        MAPAS_DIR=os.path.join(pasta, 'mapas'),
+        METRICAS_PATH=os.path.join(pasta, 'metricas.sqlite3'),
+        FILA_MAPAS_PATH=os.path.join(pasta, 'fila_mapas.sqlite3'),
+        FILA_MAPAS_ENTRADAS=os.path.join(pasta, 'fila_mapas'),
+        AO_VIVO_PATH=os.path.join(pasta, 'ao_vivo.sqlite3'),
+        AQUECIMENTO='1' if aquecer else '0',
+        PYTHONDONTWRITEBYTECODE='1',
+    )
+
+
+def medir_importacao(modulo, ambiente):
+    """Milissegundos de importação de `modulo` (com as dependências) num interpretador novo."""
+    saida = subprocess.run([sys.executable, '-X', 'importtime', '-c', f'import {modulo}'],
+                           capture_output=True, text=True, cwd=RAIZ, env=ambiente)
+    for linha in saida.stderr.splitlines():
+        encontrado = re.match(r'import time:\s+\d+ \|\s+(\d+) \| ' + re.escape(modulo) + '$', linha)
+        if encontrado:
+            return round(int(encontrado.group(1)) / 1000, 1)
+    return None
+
+
+def _porta_livre():
+    with socket.socket() as s:
+        s.bind(('127.0.0.1', 0))
+        return s.getsockname()[1]
+
+
+def _esperar_resposta(url, processo, limite=60.0):
+    """Segundos até `url` responder 200 (None se o processo morrer ou passar do limite)."""
+    inicio = time.perf_counter()
+    while time.perf_counter() - inicio < limite:
+        if processo.poll() is not None:
+            return None
+        try:
+            with urllib.request.urlopen(url, timeout=1) as resposta:
+                if resposta.status == 200:
+                    return round(time.perf_counter() - inicio, 3)
+        except OSError:
+            time.sleep(0.02)
+    return None
+
+
+def medir_servidor(nome, ambiente):
+    porta = _porta_livre()
+    if nome == 'streamlit':
+        comando = [sys.executable, '-m', 'streamlit', 'run', 'home.py', '--server.headless=true',
+                   f'--server.port={porta}', '--server.address=127.0.0.1', '--browser.gatherUsageStats=false']
+        url = f'http://127.0.0.1:{porta}/_stcore/health'
+    else:
+        comando = [sys.executable, '-m', 'gunicorn', '-c', 'gunicorn.conf.py', '-b', f'127.0.0.1:{porta}',
+                   '-w', '1', 'mc_webapp:app']
+        url = f'http://127.0.0.1:{porta}/'
+    processo = subprocess.Popen(comando, cwd=RAIZ, env=ambiente, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+    try:
+        return _esperar_resposta(url, processo)
+    finally:
+        processo.terminate()
+        processo.wait(timeout=30)
+
+
+def medir_sessao(ferramenta, espera):
+    """Roda dentro do processo filho: primeira execução do home.py e o clique em `ferramenta`."""
+    from streamlit.testing.v1 import AppTest  # o servidor já tem o streamlit carregado
+
+    app = AppTest.from_file(os.path.join(RAIZ, 'home.py'), default_timeout=120)
+    inicio = time.perf_counter()
+    app.run()
+    menu = time.perf_counter() - inicio
+    time.sleep(espera)  # o usuário lendo o menu
+    inicio = time.perf_counter()
+    app.button[FERRAMENTAS[ferramenta]].click().run()
+    clique = time.perf_counter() - inicio
+    erros = [e.value for e in app.exception]
+    return {'menu_s': round(menu, 3), 'ferramenta_s': round(clique, 3), 'erros': erros}
+
+
+def _sessao(ferramenta, args, ambiente):
+    comando = [sys.executable, os.path.abspath(__file__), '--sessao', ferramenta, '--espera', str(args.espera)]
+    saida = subprocess.run(comando, capture_output=True, text=True, cwd=RAIZ, env=ambiente)
+    if saida.returncode != 0:
+        return {'erro': (saida.stderr.strip().splitlines() or ['?'])[-1]}
+    return json.loads(saida.stdout.strip().splitlines()[-1])
+
+
+def medir(args):
+    pasta = tempfile.mkdtemp(prefix='bench_inicio_')
+    ambiente = _ambiente(pasta, not args.sem_aquecimento)
+    try:
+        resultado = {'importacao_ms': {m: medir_importacao(m, ambiente) for m in MODULOS}}
+        print("Importação (ms): " + ', '.join(f"{m} {t}" for m, t in resultado['importacao_ms'].items()), flush=True)
+        resultado['servidor_s'] = {nome: medir_servidor(nome, ambiente) for nome in ('streamlit', 'gunicorn')}
+        print(f"Servidores no ar (s): {resultado['servidor_s']}", flush=True)
+        resultado['sessoes'] = {ferramenta: _sessao(ferramenta, args, ambiente) for ferramenta in FERRAMENTAS}
+        for ferramenta, sessao in resultado['sessoes'].items():
+            print(f"Sessão {ferramenta}: {sessao}", flush=True)
+        menus = [s['menu_s'] for s in resultado['sessoes'].values() if 'menu_s' in s]
+        if resultado['servidor_s']['streamlit'] is not None and menus:
+            # Contêiner a frio até o menu na tela: servidor no ar + primeira execução do home.py
+            resultado['primeira_pagina_s'] = round(resultado['servidor_s']['streamlit'] + min(menus), 3)
+            print(f"Primeira página: {resultado['primeira_pagina_s']} s")
+    finally:
+        shutil.rmtree(pasta, ignore_errors=True)
+    return resultado
+
+
+def comparar(antes, depois):
+    with open(antes, encoding='utf-8') as f:
+        a = json.load(f)['resultado']
+    with open(depois, encoding='utf-8') as f:
+        b = json.load(f)['resultado']
+    print(f"{'medida':<32}{'antes':>10}{'depois':>10}")
+    linhas = [(f"importação {m} (ms)", a['importacao_ms'].get(m), b['importacao_ms'].get(m)) for m in MODULOS]
+    linhas += [(f"servidor {n} (s)", a['servidor_s'].get(n), b['servidor_s'].get(n)) for n in ('streamlit', 'gunicorn')]
+    for ferramenta in FERRAMENTAS:
+        sa, sb = a['sessoes'].get(ferramenta, {}), b['sessoes'].get(ferramenta, {})
+        linhas += [(f"menu ({ferramenta}) (s)", sa.get('menu_s'), sb.get('menu_s')),
+                   (f"abrir {ferramenta} (s)", sa.get('ferramenta_s'), sb.get('ferramenta_s'))]
+    linhas.append(("primeira página (s)", a.get('primeira_pagina_s'), b.get('primeira_pagina_s')))
+    for nome, va, vb in linhas:
+        print(f"{nome:<32}{va if va is not None else '-':>10}{vb if vb is not None else '-':>10}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark da partida a frio (importações, servidores e primeira página).")
+    parser.add_argument('--espera', type=float, default=3.0, help="Segundos no menu antes de abrir a ferramenta")
+    parser.add_argument('--sem-aquecimento', action='store_true', help="AQUECIMENTO=0 (sem aquecimento em segundo plano)")
+    parser.add_argument('--saida', help="Arquivo JSON do resultado (padrão: benchmarks/resultados/)")
+    parser.add_argument('--comparar', nargs=2, metavar=('ANTES', 'DEPOIS'))
+    parser.add_argument('--sessao', choices=list(FERRAMENTAS), help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.comparar:
+        comparar(*args.comparar)
+        return
+    if args.sessao:
+        print(json.dumps(medir_sessao(args.sessao, args.espera)))
+        return
+
+    dados = {
+        'gerado_em': datetime.now().isoformat(timespec='seconds'),
+        'commit': subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], capture_output=True, text=True,
+                                 cwd=RAIZ).stdout.strip() or None,
+        'python': platform.python_version(),
+        'maquina': f"{platform.system()} {platform.machine()}, {os.cpu_count()} CPUs",
+        'parametros': {'espera': args.espera, 'aquecimento': not args.sem_aquecimento},
+        'resultado': medir(args),
+    }
+    saida = args.saida or os.path.join(PASTA_RESULTADOS, f"inicio_{datetime.now():%Y%m%d-%H%M%S}.json")
+    os.makedirs(os.path.dirname(os.path.abspath(saida)), exist_ok=True)
+    with open(saida, 'w', encoding='utf-8') as f:
+        json.dump(dados, f, ensure_ascii=False, indent=2)
+    print(f"Resultado salvo em {saida}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,328 @@
+# Em benchmarks/bench_pipeline.py
+# Mede o caminho inteiro com dados sintéticos: leitura da planilha, cruzamento
+# de pendências (processar_dados), mapa do dia (SVOMaps), filtro dos próximos
+# dias (filtro_futuro) e mapa geral (mapa), etapa por etapa.
+# Cada medição roda num processo separado, para o pico de memória (RSS) ser só
+# dela, com caches vazios e um Nominatim falso com a latência escolhida.
+# O resultado vai para um JSON; --comparar mostra a diferença entre dois JSONs.
+# Com --esquema cru, a planilha fica como o pd.read_excel entrega (texto em
+# todas as colunas, um objeto str por célula), para comparar com o esquema
+# normalizado da ingestão (category, SVO inteira, datetime64). --fracao-svo-fora-do-padrao
+# (padrão 1%) deixa SVOs em branco ou com zeros à esquerda, como nas exportações reais.
+# Com --renderizador folium, os mapas saem pela árvore de objetos do folium em vez
+# do template direto (pagina_mapa.py); a etapa "Salvando o mapa" é o render + gravação.
+#
+# Uso: python benchmarks/bench_pipeline.py --linhas 1000 10000 100000 --latencia 0.05
+#      python benchmarks/bench_pipeline.py --linhas 1000000 --esquema cru --saida cru.json
+#      python benchmarks/bench_pipeline.py --linhas 10000 100000 --etapas SVOMaps mapa --renderizador folium --saida folium.json
+#      python benchmarks/bench_pipeline.py --comparar antes.json depois.json
+
+import argparse
+import json
+import os
+import platform
+import resource
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+from datetime import date, datetime, timedelta
+
+RAIZ = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, RAIZ)
+
+ETAPAS = ['ingestao', 'processar_dados', 'cubo', 'SVOMaps', 'filtro_futuro', 'mapa']
+PASTA_RESULTADOS = os.path.join(RAIZ, 'benchmarks', 'resultados')
+
+
+def _status_kb(campo):
+    """Campo de /proc/self/status em KiB (só Linux), ou None."""
+    try:
+        with open('/proc/self/status') as f:
+            for linha in f:
+                if linha.startswith(campo + ':'):
+                    return int(linha.split()[1])
+    except OSError:
+        pass
+    return None
+
+
+def pico_rss_mb():
+    pico = _status_kb('VmHWM')
+    if pico is not None:
+        return pico / 1024
+    pico = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # Linux informa em KiB, macOS em bytes
+    return pico / 1024 / 1024 if sys.platform == 'darwin' else pico / 1024
+
+
+def zerar_pico_rss():
+    """
+    No Linux, zera o pico de RSS do processo, para o pico medido ser só o da
+    etapa (e não o de gerar os dados). Retorna o RSS atual em MB.
+    """
+    try:
+        with open('/proc/self/clear_refs', 'w') as f:
+            f.write('5')
+    except OSError:
+        pass
+    atual = _status_kb('VmRSS')
+    return atual / 1024 if atual is not None else pico_rss_mb()
+
+
+def como_excel(df):
+    """
+    A planilha como o pd.read_excel entrega: SVO, status, cidade e bairro em
+    texto, com um objeto str por célula (o gerador reaproveita os mesmos objetos).
+    """
+    for coluna in ('SVO', 'Status da OS', 'Cidade Consumidor', 'Bairro Consumidor'):
+        df[coluna] = [''.join(v) if isinstance(v, str) else v for v in df[coluna].astype(object).tolist()]
+    return df
+
+
+class Cronometro:
+    """
+    Recebe as chamadas progresso(etapa, fração) das funções de mapa e guarda
+    quanto tempo cada etapa levou (do aviso dela até o aviso seguinte).
+    """
+
+    def __init__(self):
+        self.etapas = {}
+        self._atual = None
+        self._inicio = None
+
+    def __call__(self, etapa, fracao=None):
+        agora = time.perf_counter()
+        if self._atual is not None:
+            self.etapas[self._atual] = self.etapas.get(self._atual, 0.0) + agora - self._inicio
+        self._atual, self._inicio = etapa, agora
+
+    def parar(self):
+        self(None)
+        return {etapa: round(tempo, 4) for etapa, tempo in self.etapas.items()}
+
+
+def _tamanhos_kb(pasta):
+    html = dados = 0
+    for nome in os.listdir(pasta):
+        if nome.endswith('.html'):
+            html += os.path.getsize(os.path.join(pasta, nome))
+        elif nome.endswith('.json.gz'):
+            dados += os.path.getsize(os.path.join(pasta, nome))
+    return round(html / 1024, 1), round(dados / 1024, 1)
+
+
+def medir(etapa, linhas, args, pasta):
+    """Roda dentro do processo filho; as variáveis de ambiente já apontam para `pasta`."""
+    from benchmarks.gerador import gerar_dataframe, gerar_planilha, nomes_cidades
+    from ingestao import converter_tipos
+
+    opcoes = dict(cidades=nomes_cidades(args.cidades), bairros_por_cidade=args.bairros,
+                  dias=args.dias, fracao_sem_data=args.fracao_sem_data,
+                  fracao_svo_fora_do_padrao=args.fracao_svo_fora_do_padrao)
+    cronometro = Cronometro()
+    resultado = {'etapa': etapa, 'linhas': linhas}
+
+    if etapa == 'ingestao':
+        from ingestao import ler_planilha
+        caminho = os.path.join(tempfile.gettempdir(), f"bench_pipeline_{linhas}_{args.cidades}_{args.bairros}"
+                                                      f"_{args.fracao_svo_fora_do_padrao}.xlsx")
+        if not os.path.exists(caminho):
+            gerar_planilha(caminho, linhas, colunas_extras=args.colunas_extras, **opcoes)
+        rss_inicial = zerar_pico_rss()
+        inicio = time.perf_counter()
+        df = ler_planilha(caminho)
+        tempo = time.perf_counter() - inicio
+        resultado['xlsx_mb'] = round(os.path.getsize(caminho) / 1024 / 1024, 1)
+    else:
+        # Importações antes do cronômetro: só conta o trabalho de cada função
+        import analyzer_app
+        from cubo import CuboAgregado
+        from mc_geral import filtro_futuro, mapa
+        from mc_simple import SVOMaps
+
+        df = gerar_dataframe(linhas, **opcoes)
+        df = como_excel(df) if args.esquema == 'cru' else converter_tipos(df)
+        if etapa == 'mapa':
+            df = filtro_futuro(df)
+        resultado['dataframe_mb'] = round(df.memory_usage(deep=True).sum() / 1024 / 1024, 1)
+        rss_inicial = zerar_pico_rss()
+        inicio = time.perf_counter()
+        cronometro('Preparando')  # o que vem antes do primeiro aviso de progresso
+        if etapa == 'processar_dados':
+            # Etapas internas: as funções que processar_dados chama, cronometradas
+            for nome in ('reconciliar', 'formatar_pendentes'):
+                original = getattr(analyzer_app, nome)
+                setattr(analyzer_app, nome, lambda *a, _nome=nome, _f=original, **k: (cronometro(_nome), _f(*a, **k))[1])
+            relatorio = df.iloc[::3][['SVO', 'Cidade Consumidor']]
+            _, resultado['pendentes'] = analyzer_app.processar_dados(df, relatorio)
+        elif etapa == 'cubo':
+            # Montagem do cubo e recortes típicos da interface (uma semana, um status)
+            cronometro('montagem')
+            cubo = CuboAgregado.de_dataframe(df)
+            cronometro('recortes')
+            status = list(cubo.contagens['status'].dropna().unique()[:1])
+            for i in range(args.dias):
+                inicio_fatia = date.today() + timedelta(days=i)
+                cubo.fatiar(inicio_fatia, inicio_fatia + timedelta(days=6), status=status).por('bairro')
+            resultado['cubo_linhas'] = len(cubo)
+            resultado['cubo_kb'] = round(cubo.contagens.memory_usage(deep=True).sum() / 1024, 1)
+            resultado['recorte_ms'] = round((time.perf_counter() - cronometro._inicio) * 1000 / max(args.dias, 1), 2)
+        elif etapa == 'SVOMaps':
+            dia = (date.today() + timedelta(days=1)).isoformat()
+            cidade = df['Cidade Consumidor'].iloc[0]
+            SVOMaps(df, 'Bairro Consumidor', f"{cidade}, SP", os.path.join(pasta, 'mapas', f"{cidade}_bench.html"),
+                    dia, progresso=cronometro)
+        elif etapa == 'filtro_futuro':
+            resultado['linhas_filtradas'] = len(filtro_futuro(df))
+        else:
+            mapa(df, progresso=cronometro, pasta=os.path.join(pasta, 'mapas'))
+        tempo = time.perf_counter() - inicio
+
+    resultado.update({
+        'tempo_s': round(tempo, 3),
+        'etapas': cronometro.parar(),
+        'pico_rss_mb': round(pico_rss_mb(), 1),
+        'rss_antes_mb': round(rss_inicial, 1),
+        # Memória que a etapa precisou além do que já estava carregado
+        'memoria_etapa_mb': round(pico_rss_mb() - rss_inicial, 1),
+    })
+    if etapa in ('SVOMaps', 'mapa'):
+        resultado['html_kb'], resultado['dados_kb'] = _tamanhos_kb(os.path.join(pasta, 'mapas'))
+    return resultado
+
+
+def _executar(etapa, linhas, args, dominio):
+    """Uma medição num processo novo, com caches e pasta de mapas só dele."""
+    pasta = tempfile.mkdtemp(prefix='bench_pipeline_')
+    os.makedirs(os.path.join(pasta, 'mapas'))
+    ambiente = dict(
+        os.environ,
+        GEO_CACHE_PATH=os.path.join(pasta, 'geo_cache.sqlite3'),
+        GAZETTEER_PATH=os.path.join(pasta, 'gazetteer.sqlite3'),
+        PLANILHAS_CACHE_DIR=os.path.join(pasta, 'cache_planilhas'),
+        MAPAS_DIR=os.path.join(pasta, 'mapas'),
+        METRICAS_PATH=os.path.join(pasta, 'metricas.sqlite3'),
+        NOMINATIM_DOMAIN=dominio, NOMINATIM_SCHEME='http', NOMINATIM_TAXA=str(args.taxa),
+        MAPAS_RENDERIZADOR=args.renderizador,
+    )
+    comando = [
+        sys.executable, os.path.abspath(__file__), '--etapa', etapa, '--linhas', str(linhas), '--pasta', pasta,
+        '--cidades', str(args.cidades), '--bairros', str(args.bairros), '--dias', str(args.dias),
+        '--fracao-sem-data', str(args.fracao_sem_data), '--colunas-extras', str(args.colunas_extras),
+        '--esquema', args.esquema, '--fracao-svo-fora-do-padrao', str(args.fracao_svo_fora_do_padrao),
+    ]
+    try:
+        saida = subprocess.run(comando, capture_output=True, text=True, cwd=RAIZ, env=ambiente)
+        if saida.returncode != 0:
+            return {'etapa': etapa, 'linhas': linhas, 'erro': saida.stderr.strip().splitlines()[-1]}
+        return json.loads(saida.stdout.strip().splitlines()[-1])
+    finally:
+        shutil.rmtree(pasta, ignore_errors=True)
+
+
+def _commit():
+    try:
+        return subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], capture_output=True, text=True,
+                              cwd=RAIZ, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def _linha(r):
+    if 'erro' in r:
+        return f"{r['etapa']:<16}{r['linhas']:>10}  ERRO: {r['erro']}"
+    tamanho = f"  html {r['html_kb']:.0f} KB + dados {r['dados_kb']:.0f} KB" if 'html_kb' in r else ''
+    dataframe = f"  DataFrame {r['dataframe_mb']:.0f} MB" if 'dataframe_mb' in r else ''
+    return (f"{r['etapa']:<16}{r['linhas']:>10}{r['tempo_s']:>10.3f} s{r['pico_rss_mb']:>10.1f} MB"
+            f" (etapa {r.get('memoria_etapa_mb', 0):.0f} MB){dataframe}"
+            f"  geocodificações {r.get('geocodificacoes', 0)}{tamanho}")
+
+
+def comparar(antes, depois):
+    """
+    Tabela (etapa, linhas) com tempo, pico de memória, memória da própria etapa
+    e tamanho do DataFrame dos dois arquivos, com a razão dos tempos.
+    """
+    with open(antes, encoding='utf-8') as f:
+        a = {(r['etapa'], r['linhas']): r for r in json.load(f)['resultados'] if 'erro' not in r}
+    with open(depois, encoding='utf-8') as f:
+        b = {(r['etapa'], r['linhas']): r for r in json.load(f)['resultados'] if 'erro' not in r}
+    print(f"{'etapa':<16}{'linhas':>10}{'antes':>10}{'depois':>10}{'razão':>8}{'RSS antes':>12}{'RSS depois':>12}"
+          f"{'etapa antes':>13}{'etapa depois':>14}{'df antes':>10}{'df depois':>11}")
+    for chave in sorted(a.keys() & b.keys(), key=lambda k: (ETAPAS.index(k[0]), k[1])):
+        ra, rb = a[chave], b[chave]
+        razao = rb['tempo_s'] / ra['tempo_s'] if ra['tempo_s'] else float('nan')
+        print(f"{chave[0]:<16}{chave[1]:>10}{ra['tempo_s']:>10.3f}{rb['tempo_s']:>10.3f}{razao:>7.2f}x"
+              f"{ra['pico_rss_mb']:>11.1f}M{rb['pico_rss_mb']:>11.1f}M"
+              f"{ra.get('memoria_etapa_mb', float('nan')):>12.1f}M{rb.get('memoria_etapa_mb', float('nan')):>13.1f}M"
+              f"{ra.get('dataframe_mb', float('nan')):>9.1f}M{rb.get('dataframe_mb', float('nan')):>10.1f}M")
+        for etapa in [e for e in ra['etapas'] if e in rb['etapas']]:
+            print(f"  {etapa:<36}{ra['etapas'][etapa]:>10.3f}{rb['etapas'][etapa]:>10.3f}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark do caminho planilha -> pendências -> mapas.")
+    parser.add_argument('--linhas', type=int, nargs='+', default=[1_000, 10_000, 100_000])
+    parser.add_argument('--etapas', nargs='+', choices=ETAPAS, default=ETAPAS)
+    parser.add_argument('--cidades', type=int, default=1)
+    parser.add_argument('--bairros', type=int, default=60, help="Bairros por cidade")
+    parser.add_argument('--dias', type=int, default=15, help="Agendamentos até quantos dias à frente")
+    parser.add_argument('--fracao-sem-data', type=float, default=0.15)
+    parser.add_argument('--colunas-extras', type=int, default=75)
+    parser.add_argument('--fracao-svo-fora-do-padrao', type=float, default=0.01,
+                        help="SVOs em branco ou com zeros à esquerda (as exportações reais sempre têm algumas)")
+    parser.add_argument('--esquema', choices=['normalizado', 'cru'], default='normalizado',
+                        help="'cru': DataFrame como o pd.read_excel entrega, sem o esquema da ingestão")
+    parser.add_argument('--renderizador', choices=['template', 'folium'], default='template',
+                        help="'folium': páginas dos mapas montadas com os objetos do folium (caminho antigo)")
+    parser.add_argument('--latencia', type=float, default=0.05, help="Latência do Nominatim falso, em segundos")
+    parser.add_argument('--taxa', type=float, default=1000, help="Requisições/s permitidas ao Nominatim falso")
+    parser.add_argument('--xlsx-ate', type=int, default=200_000,
+                        help="Maior planilha .xlsx gerada para medir a leitura (escrever .xlsx grandes é lento)")
+    parser.add_argument('--saida', help="Arquivo JSON do resultado (padrão: benchmarks/resultados/)")
+    parser.add_argument('--comparar', nargs=2, metavar=('ANTES', 'DEPOIS'))
+    parser.add_argument('--etapa', choices=ETAPAS, help=argparse.SUPPRESS)
+    parser.add_argument('--pasta', help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.comparar:
+        comparar(*args.comparar)
+        return
+    if args.etapa:
+        print(json.dumps(medir(args.etapa, args.linhas[0], args, args.pasta)))
+        return
+
+    from fake_nominatim import FakeNominatim
+    servidor = FakeNominatim(latencia=args.latencia).iniciar()
+
+    resultados = []
+    for linhas in args.linhas:
+        for etapa in args.etapas:
+            if etapa == 'ingestao' and linhas > args.xlsx_ate:
+                continue
+            antes = servidor.estatisticas()['requisicoes']
+            resultado = _executar(etapa, linhas, args, servidor.domain)
+            resultado['geocodificacoes'] = servidor.estatisticas()['requisicoes'] - antes
+            resultados.append(resultado)
+            print(_linha(resultado), flush=True)
+    servidor.shutdown()
+
+    dados = {
+        'gerado_em': datetime.now().isoformat(timespec='seconds'),
+        'commit': _commit(),
+        'python': platform.python_version(),
+        'maquina': f"{platform.system()} {platform.machine()}, {os.cpu_count()} CPUs",
+        'parametros': {k: v for k, v in vars(args).items() if k not in ('etapa', 'pasta', 'saida', 'comparar')},
+        'resultados': resultados,
+    }
+    saida = args.saida or os.path.join(PASTA_RESULTADOS, f"pipeline_{datetime.now():%Y%m%d-%H%M%S}.json")
+    os.makedirs(os.path.dirname(os.path.abspath(saida)), exist_ok=True)
+    with open(saida, 'w', encoding='utf-8') as f:
+        json.dump(dados, f, ensure_ascii=False, indent=2)
+    print(f"Resultado salvo em {saida}")
+
+
+if __name__ == '__main__':
+    main()
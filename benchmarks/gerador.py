@@ -0,0 +1,104 @@
+# Em benchmarks/gerador.py
+# Gera planilhas de SVO sintéticas no formato das exportações do sistema.
+
+import argparse
+import os
+from datetime import date
+
+import numpy as np
+import pandas as pd
+from openpyxl import Workbook
+
+CIDADES = ['Campinas', 'Sumaré', 'Hortolândia', 'Valinhos', 'Paulínia']
+PREFIXOS_BAIRRO = ['Jardim', 'Vila', 'Parque', 'Residencial', 'Chácara']
+NOMES_BAIRRO = ['América', 'Nova', 'Industrial', 'São José', 'Aurora', 'Primavera', 'Esperança', 'das Flores']
+STATUS = ['Aberta', 'Agendada', 'Em execução', 'Aguardando material', 'Pendente cliente']
+
+
+def bairros_da_cidade(cidade, quantidade):
+    nomes = [f"{p} {n}" for p in PREFIXOS_BAIRRO for n in NOMES_BAIRRO]
+    nomes += [f"{p} {n} {i}" for i in range(2, 1000) for p in PREFIXOS_BAIRRO for n in NOMES_BAIRRO]
+    return ['Centro'] + nomes[:quantidade - 1]
+
+
+def nomes_cidades(quantidade):
+    """As cidades de CIDADES e, passando delas, 'Cidade 6', 'Cidade 7'..."""
+    return (CIDADES + [f"Cidade {i}" for i in range(len(CIDADES) + 1, quantidade + 1)])[:quantidade]
+
+
+def gerar_dataframe(linhas=10_000, cidades=CIDADES[:1], bairros_por_cidade=60, status=STATUS,
+                    dias=15, fracao_sem_data=0.15, semente=42, fracao_svo_fora_do_padrao=0.0):
+    """
+    DataFrame com as colunas usadas pela aplicação, gerado de forma vetorizada
+    (1 milhão de linhas em poucos segundos). 'Agendado para' vai de 2 dias atrás
+    a `dias` dias à frente; `fracao_sem_data` das SVOs fica sem data.
+    `fracao_svo_fora_do_padrao` das SVOs vem como nas exportações reais: metade
+    em branco, metade com zeros à esquerda ('SVO-01000123').
+    """
+    rng = np.random.default_rng(semente)
+    hoje = np.datetime64(date.today(), 'D')
+
+    idx_cidade = rng.integers(0, len(cidades), linhas)
+    tabela_bairro = np.array([b for c in cidades for b in bairros_da_cidade(c, bairros_por_cidade)], dtype=object)
+    # Distribuição desigual entre bairros, como nos dados reais
+    pesos = 1 / np.arange(1, bairros_por_cidade + 1)
+    idx_bairro = rng.choice(bairros_por_cidade, linhas, p=pesos / pesos.sum())
+    idx_status = rng.integers(0, len(status), linhas)
+    deslocamento = rng.integers(-2, dias, linhas)
+    sem_data = rng.random(linhas) < fracao_sem_data
+
+    agendado = (hoje + deslocamento).astype('datetime64[ns]')
+    agendado[sem_data] = np.datetime64('NaT')
+    svos = np.char.add('SVO-', (1_000_000 + np.arange(linhas)).astype(str)).astype(object)
+    fora_do_padrao = np.flatnonzero(rng.random(linhas) < fracao_svo_fora_do_padrao)
+    svos[fora_do_padrao[::2]] = None
+    svos[fora_do_padrao[1::2]] = np.char.add('SVO-0', (1_000_000 + fora_do_padrao[1::2]).astype(str))
+    return pd.DataFrame({
+        'SVO': svos,
+        'Status da OS': np.asarray(status, dtype=object)[idx_status],
+        'Agendado para': agendado,
+        'Cidade Consumidor': np.asarray(cidades, dtype=object)[idx_cidade],
+        'Bairro Consumidor': tabela_bairro[idx_cidade * bairros_por_cidade + idx_bairro],
+    })
+
+
+def gerar_planilha(caminho, linhas=10_000, cidades=CIDADES[:1], bairros_por_cidade=60, status=STATUS,
+                   dias=15, fracao_sem_data=0.15, colunas_extras=75, semente=42, fracao_svo_fora_do_padrao=0.0):
+    """
+    Escreve um .xlsx com as colunas de `gerar_dataframe` e `colunas_extras`
+    colunas de enchimento (as exportações reais têm ~80 colunas).
+    Retorna o caminho do arquivo.
+    """
+    df = gerar_dataframe(linhas, cidades, bairros_por_cidade, status, dias, fracao_sem_data, semente,
+                         fracao_svo_fora_do_padrao)
+    agendado = [None if pd.isna(d) else d.date() for d in df['Agendado para']]
+
+    wb = Workbook(write_only=True)
+    ws = wb.create_sheet('Planilha1')
+    extras = [f"Campo {i}" for i in range(colunas_extras)]
+    ws.append(list(df.columns) + extras)
+    enchimento = [f"valor {i}" for i in range(colunas_extras)]
+    for linha, data in zip(df.itertuples(index=False), agendado):
+        ws.append([linha[0], linha[1], data, linha[3], linha[4]] + enchimento)
+    os.makedirs(os.path.dirname(os.path.abspath(caminho)), exist_ok=True)
+    wb.save(caminho)
+    return caminho
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Gera uma planilha de SVOs sintética.")
+    parser.add_argument('saida')
+    parser.add_argument('--linhas', type=int, default=10_000)
+    parser.add_argument('--cidades', type=int, default=1)
+    parser.add_argument('--bairros', type=int, default=60)
+    parser.add_argument('--status', type=int, default=len(STATUS), help="Quantos status diferentes")
+    parser.add_argument('--dias', type=int, default=15, help="Agendamentos até quantos dias à frente")
+    parser.add_argument('--fracao-sem-data', type=float, default=0.15)
+    parser.add_argument('--colunas-extras', type=int, default=75)
+    parser.add_argument('--fracao-svo-fora-do-padrao', type=float, default=0.0,
+                        help="SVOs em branco ou com zeros à esquerda, como nas exportações reais")
+    args = parser.parse_args()
+    gerar_planilha(args.saida, args.linhas, nomes_cidades(args.cidades), args.bairros, STATUS[:args.status],
+                   args.dias, args.fracao_sem_data, args.colunas_extras,
+                   fracao_svo_fora_do_padrao=args.fracao_svo_fora_do_padrao)
+    print(f"Planilha gerada em {args.saida}")
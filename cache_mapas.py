@@ -0,0 +1,225 @@
+# Em cache_mapas.py
+
+import argparse
+import hashlib
+import os
+import re
+import threading
+import time
+
+import numpy as np
+import pandas as pd
+
+from camada_marcadores import LIMITE_PONTOS_INDIVIDUAIS
+from catalogo_mapas import PASTA_MAPAS
+from grade_espacial import FORMA_PADRAO, LIMITE_PONTOS_CALOR, TAMANHOS_CELULA_M
+from metricas import contar
+
+# Mapas mais velhos que isso saem da pasta; acima do limite de espaço, saem os menos acessados
+IDADE_MAXIMA_S = float(os.environ.get('MAPAS_IDADE_MAXIMA_HORAS', '72')) * 3600
+LIMITE_BYTES = int(float(os.environ.get('MAPAS_LIMITE_MB', '512')) * 1024 * 1024)
+INTERVALO_LIMPEZA_S = 60
+
+# Sobe quando a forma de desenhar os mapas mudar, para não reaproveitar mapas antigos
+VERSAO_RENDER = 1
+
+# Arquivos de um mesmo mapa: '<base>.<chave>' + HTML, dados e as variantes comprimidas do
+# catalogo_mapas. O que não tem chave no nome (mapas antigos, outros arquivos) não é do cache.
+_ARTEFATO = re.compile(r'^(?P<grupo>.+\.[0-9a-f]{16})\.(?:html|json)(?:\.gz|\.br)?$')
+# Páginas de índice (mc_simple.pagina_indice) embutem os mapas em iframes
+_IFRAME = re.compile(r'<iframe src="([^"]+)"')
+
+
+def opcoes_render():
+    """Configurações (variáveis de ambiente) que mudam o desenho de qualquer mapa."""
+    return {
+        'versao': VERSAO_RENDER,
+        'limite_pontos': LIMITE_PONTOS_INDIVIDUAIS,
+        'limite_calor': LIMITE_PONTOS_CALOR,
+        'grade': FORMA_PADRAO,
+        'celulas': TAMANHOS_CELULA_M,
+    }
+
+
+def chave_mapa(df, **opcoes):
+    """
+    Hash das linhas que entram no mapa (independe da ordem delas), das opções
+    do mapa (datas, cidade...) e de `opcoes_render`. Mesma chave = mesmo mapa.
+    """
+    linhas = np.sort(pd.util.hash_pandas_object(df, index=False).to_numpy())
+    h = hashlib.sha256(linhas.tobytes())
+    h.update('|'.join(map(str, df.columns)).encode('utf-8'))
+    h.update(repr(sorted({**opcoes, **opcoes_render()}.items())).encode('utf-8'))
+    return h.hexdigest()[:16]
+
+
+def chave_pagina(titulo, mapas):
+    """Chave de uma página que só embute outros mapas (já endereçados): [(rótulo, nome do arquivo), ...]."""
+    h = hashlib.sha256(repr((titulo, list(mapas), VERSAO_RENDER)).encode('utf-8'))
+    return h.hexdigest()[:16]
+
+
+def caminho_artefato(caminho_html, chave):
+    """'static/temp_maps/Campinas_20261020.html' -> 'static/temp_maps/Campinas_20261020.<chave>.html'"""
+    base, extensao = os.path.splitext(caminho_html)
+    return f"{base}.{chave}{extensao or '.html'}"
+
+
+def _grupo(nome):
+    encontrado = _ARTEFATO.match(nome)
+    return encontrado['grupo'] if encontrado else None
+
+
+def _embutidos(caminho_html):
+    """Grupos dos mapas que uma página de índice embute em iframes."""
+    try:
+        with open(caminho_html, encoding='utf-8') as f:
+            fontes = _IFRAME.findall(f.read())
+    except OSError:
+        return set()
+    return {g for g in map(_grupo, fontes) if g is not None}
+
+
+class CacheMapas:
+    """
+    Mapas gerados, endereçados pelo conteúdo: o nome do arquivo leva a chave de
+    `chave_mapa`, então os mesmos dados com as mesmas opções reaproveitam o mapa
+    já salvo em vez de geocodificar e desenhar tudo de novo.
+    A limpeza remove mapas mais velhos que `idade_maxima` e, acima de
+    `limite_bytes`, os acessados há mais tempo (LRU pelo atime, que o cache
+    atualiza a cada acerto sem mexer no mtime usado pelo catálogo). Uma página
+    de índice conta como acesso aos mapas que embute e sai junto com eles.
+    """
+
+    def __init__(self, pasta=PASTA_MAPAS, idade_maxima=IDADE_MAXIMA_S, limite_bytes=LIMITE_BYTES):
+        self.pasta = pasta
+        self.idade_maxima = idade_maxima
+        self.limite_bytes = limite_bytes
+        self._lock = threading.Lock()
+        self._ultima_limpeza = 0.0
+        self.hits = 0
+        self.misses = 0
+        self.removidos = 0
+        self.bytes_liberados = 0
+
+    def buscar(self, caminho, dados=True):
+        """
+        True se o mapa (HTML e, com `dados`, o .json.gz) em `caminho` já existe e não
+        venceu; marca como acessado. Páginas de índice não têm dados: `dados=False`.
+        """
+        agora = time.time()
+        arquivos = (caminho, os.path.splitext(caminho)[0] + '.json.gz') if dados else (caminho,)
+        try:
+            infos = [os.stat(arquivo) for arquivo in arquivos]
+        except FileNotFoundError:
+            infos = None
+        if infos is None or any(agora - info.st_mtime > self.idade_maxima for info in infos):
+            with self._lock:
+                self.misses += 1
+            contar('cache_total', cache='mapas', resultado='miss')
+            return False
+        for arquivo, info in zip(arquivos, infos):
+            os.utime(arquivo, (agora, info.st_mtime))
+        with self._lock:
+            self.hits += 1
+        contar('cache_total', cache='mapas', resultado='hit')
+        return True
+
+    def registrar(self):
+        """Chamado depois de salvar um mapa novo: roda a limpeza, no máximo uma vez por minuto."""
+        if time.monotonic() - self._ultima_limpeza >= INTERVALO_LIMPEZA_S:
+            self.limpar()
+
+    def limpar(self, agora=None):
+        """Remove mapas vencidos e, acima do limite de espaço, os menos acessados. Retorna (mapas, bytes)."""
+        agora = agora or time.time()
+        with self._lock:
+            self._ultima_limpeza = time.monotonic()
+            grupos = {}
+            if os.path.isdir(self.pasta):
+                for entrada in os.scandir(self.pasta):
+                    grupo = _grupo(entrada.name)
+                    if grupo is None:
+                        continue
+                    try:
+                        info = entrada.stat()
+                    except FileNotFoundError:
+                        continue
+                    criado, acesso, tamanho, arquivos = grupos.get(grupo, (info.st_mtime, 0.0, 0, []))
+                    grupos[grupo] = (
+                        min(criado, info.st_mtime), max(acesso, info.st_atime),
+                        tamanho + info.st_size, arquivos + [entrada.path],
+                    )
+
+            # Páginas de índice (HTML sem .json.gz): cada mapa embutido conta como acessado
+            # quando a página foi, e a página sai quando sai qualquer um deles
+            paginas = {}
+            for g, (_, _, _, arquivos) in grupos.items():
+                nomes = {os.path.basename(arquivo) for arquivo in arquivos}
+                if g + '.html' in nomes and g + '.json.gz' not in nomes:
+                    paginas[g] = _embutidos(os.path.join(self.pasta, g + '.html')) & grupos.keys()
+            for pagina, embutidos in paginas.items():
+                for g in embutidos:
+                    criado, acesso, tamanho, arquivos = grupos[g]
+                    grupos[g] = (criado, max(acesso, grupos[pagina][1]), tamanho, arquivos)
+
+            vencidos = [g for g, (criado, _, _, _) in grupos.items() if agora - criado > self.idade_maxima]
+            total = sum(tamanho for _, _, tamanho, _ in grupos.values())
+            restantes = sorted((g for g in grupos if g not in vencidos), key=lambda g: grupos[g][1])
+            a_remover = list(vencidos)
+            total -= sum(grupos[g][2] for g in vencidos)
+            for g in restantes:
+                if total <= self.limite_bytes:
+                    break
+                a_remover.append(g)
+                total -= grupos[g][2]
+            removidos = set(a_remover)
+            a_remover += [p for p, embutidos in paginas.items() if p not in removidos and embutidos & removidos]
+
+            liberados = 0
+            for g in a_remover:
+                for arquivo in grupos[g][3]:
+                    try:
+                        os.remove(arquivo)
+                    except FileNotFoundError:
+                        pass
+                liberados += grupos[g][2]
+            self.removidos += len(a_remover)
+            self.bytes_liberados += liberados
+        if a_remover:
+            print(f"Cache de mapas: {len(a_remover)} mapas removidos ({liberados / 1024 / 1024:.1f} MB).")
+        return len(a_remover), liberados
+
+    def estatisticas(self):
+        with self._lock:
+            total = self.hits + self.misses
+            return {
+                'hits': self.hits,
+                'misses': self.misses,
+                'taxa_acerto': self.hits / total if total else 0.0,
+                'mapas_removidos': self.removidos,
+                'bytes_liberados': self.bytes_liberados,
+            }
+
+
+_cache_padrao = None
+_cache_padrao_lock = threading.Lock()
+
+
+def cache_mapas_padrao():
+    global _cache_padrao
+    with _cache_padrao_lock:
+        if _cache_padrao is None:
+            _cache_padrao = CacheMapas()
+        return _cache_padrao
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Limpeza da pasta de mapas gerados.")
+    parser.add_argument('--pasta', default=PASTA_MAPAS)
+    parser.add_argument('--idade-maxima-horas', type=float, default=IDADE_MAXIMA_S / 3600)
+    parser.add_argument('--limite-mb', type=float, default=LIMITE_BYTES / 1024 / 1024)
+    args = parser.parse_args()
+    cache = CacheMapas(args.pasta, args.idade_maxima_horas * 3600, int(args.limite_mb * 1024 * 1024))
+    mapas, liberados = cache.limpar()
+    print(f"{mapas} mapas removidos, {liberados / 1024 / 1024:.1f} MB liberados.")
@@ -0,0 +1,158 @@
+# Em cache_planilhas.py
+
+import hashlib
+import os
+import threading
+import uuid
+
+import pandas as pd
+
+from ingestao import COLUNAS_SVO, VERSAO_ESQUEMA, ler_planilha
+from metricas import contar, medir
+
+BASE_DIR = os.path.dirname(os.path.abspath(__file__))
+PASTA_CACHE = os.environ.get('PLANILHAS_CACHE_DIR', os.path.join(BASE_DIR, 'cache_planilhas'))
+# Espaço máximo em disco do cache; os arquivos menos usados saem primeiro
+LIMITE_BYTES = int(float(os.environ.get('PLANILHAS_CACHE_MB', '512')) * 1024 * 1024)
+
+
+def _ler_bytes(origem):
+    """
+    Aceita caminho, bytes ou arquivo aberto (ex.: UploadedFile do Streamlit).
+    Arquivos em memória (BytesIO) viram um memoryview do próprio buffer, sem cópia;
+    quem chama deve liberá-lo (`release`) ao terminar.
+    """
+    if isinstance(origem, (bytes, bytearray, memoryview)):
+        return bytes(origem)
+    if isinstance(origem, (str, os.PathLike)):
+        with open(origem, 'rb') as f:
+            return f.read()
+    if hasattr(origem, 'getbuffer'):
+        return origem.getbuffer()
+    if hasattr(origem, 'getvalue'):
+        return origem.getvalue()
+    origem.seek(0)
+    return origem.read()
+
+
+def hash_conteudo(conteudo):
+    return hashlib.sha256(conteudo).hexdigest()
+
+
+class CachePlanilhas:
+    """
+    Cache de planilhas já interpretadas, indexado pelo hash do conteúdo do arquivo.
+    Cada planilha vira um Parquet em disco; ao passar do limite de tamanho,
+    os arquivos usados há mais tempo são removidos (LRU pela data de modificação).
+    """
+
+    def __init__(self, pasta=PASTA_CACHE, limite_bytes=LIMITE_BYTES):
+        self.pasta = pasta
+        self.limite_bytes = limite_bytes
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        os.makedirs(pasta, exist_ok=True)
+
+    def _caminho(self, chave):
+        return os.path.join(self.pasta, f"{chave}.parquet")
+
+    def carregar(self, origem, colunas=COLUNAS_SVO):
+        """
+        Retorna o DataFrame da planilha (só com `colunas`; None = todas),
+        lendo o .xlsx só se ele ainda não estiver no cache.
+        """
+        return self.carregar_com_chave(origem, colunas)[1]
+
+    def carregar_com_chave(self, origem, colunas=COLUNAS_SVO):
+        """Igual a `carregar`, mas retorna (chave do conteúdo, DataFrame)."""
+        conteudo = _ler_bytes(origem)
+        try:
+            return self._carregar(origem, conteudo, colunas)
+        finally:
+            if isinstance(conteudo, memoryview):
+                conteudo.release()
+
+    def _carregar(self, origem, conteudo, colunas):
+        chave = f"{hash_conteudo(conteudo)}-v{VERSAO_ESQUEMA}"
+        if colunas is not None:
+            chave += '-' + hash_conteudo('|'.join(colunas).encode('utf-8'))[:12]
+        caminho = self._caminho(chave)
+
+        if os.path.exists(caminho):
+            try:
+                df = pd.read_parquet(caminho)
+                os.utime(caminho)  # marca como usado recentemente
+                with self._lock:
+                    self.hits += 1
+                contar('cache_total', cache='planilhas', resultado='hit')
+                return chave, df
+            except (OSError, ValueError):
+                pass  # arquivo removido ou corrompido no meio do caminho: lê de novo
+
+        with self._lock:
+            self.misses += 1
+        contar('cache_total', cache='planilhas', resultado='miss')
+        with medir('carregar_planilha', 'leitura_xlsx'):
+            # Upload em memória: o leitor usa o próprio arquivo, sem copiar o buffer
+            df = ler_planilha(origem if isinstance(conteudo, memoryview) else conteudo, colunas)
+        contar('linhas_processadas_total', len(df), funcao='carregar_planilha')
+        self._gravar(df, caminho)
+        return chave, df
+
+    def _gravar(self, df, caminho):
+        temporario = f"{caminho}.{uuid.uuid4().hex}.tmp"
+        try:
+            df.to_parquet(temporario, index=False)
+            os.replace(temporario, caminho)
+        except Exception as e:
+            # Colunas com tipos misturados não viram Parquet; seguimos sem cache
+            print(f"AVISO: não foi possível guardar a planilha no cache: {e}")
+            if os.path.exists(temporario):
+                os.remove(temporario)
+            return
+        self.limpar()
+
+    def limpar(self):
+        """Remove os Parquets menos usados até o cache caber no limite."""
+        with self._lock:
+            arquivos = []
+            for nome in os.listdir(self.pasta):
+                if nome.endswith('.parquet'):
+                    caminho = os.path.join(self.pasta, nome)
+                    try:
+                        info = os.stat(caminho)
+                    except FileNotFoundError:
+                        continue
+                    arquivos.append((info.st_mtime, info.st_size, caminho))
+            total = sum(tamanho for _, tamanho, _ in arquivos)
+            for _, tamanho, caminho in sorted(arquivos):
+                if total <= self.limite_bytes:
+                    break
+                try:
+                    os.remove(caminho)
+                except FileNotFoundError:
+                    pass
+                total -= tamanho
+
+
+_cache_padrao = None
+_cache_padrao_lock = threading.Lock()
+
+
+def cache_padrao():
+    global _cache_padrao
+    with _cache_padrao_lock:
+        if _cache_padrao is None:
+            _cache_padrao = CachePlanilhas()
+        return _cache_padrao
+
+
+def carregar_planilha(origem, colunas=COLUNAS_SVO):
+    """Atalho: lê a planilha (caminho, bytes ou upload) pelo cache padrão."""
+    return cache_padrao().carregar(origem, colunas)
+
+
+def carregar_planilha_com_chave(origem, colunas=COLUNAS_SVO):
+    """Atalho: (chave do conteúdo, DataFrame) pelo cache padrão; a chave identifica a planilha entre sessões."""
+    return cache_padrao().carregar_com_chave(origem, colunas)
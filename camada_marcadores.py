@@ -0,0 +1,94 @@
+# Em camada_marcadores.py
+
+import os
+
+import pandas as pd
+
+from ingestao import formatar_datas, svos_em_texto
+
+# Até este número de SVOs o mapa mostra um ponto por SVO; acima, só o agregado por bairro e dia
+LIMITE_PONTOS_INDIVIDUAIS = int(os.environ.get('MAPA_LIMITE_PONTOS', '2000'))
+CASAS_DECIMAIS = 5  # ~1 m de precisão, suficiente para bairros
+
+# Cada linha de dados: [lat, lon, contagem, bairro, cidade, data, svo]
+CALLBACK_MARCADOR = """
+function (row) {
+    var escapar = function (texto) {
+        var div = document.createElement('div');
+        div.innerText = texto;
+        return div.innerHTML;
+    };
+    var contagem = row[2];
+    var icone = L.divIcon({
+        html: '<div><span>' + contagem + '</span></div>',
+        className: 'marker-cluster marker-cluster-small',
+        iconSize: new L.Point(30, 30)
+    });
+    var marker = L.marker(new L.LatLng(row[0], row[1]), {icon: icone, contagem: contagem});
+    var popup = '<b>Bairro:</b> ' + escapar(row[3]) + '<br>' +
+                '<b>Cidade:</b> ' + escapar(row[4]) + '<br>' +
+                '<b>Agendado para:</b> ' + escapar(row[5]) + '<br>' +
+                (row[6] ? '<b>SVO:</b> ' + escapar(row[6]) : '<b>Quantidade de OS:</b> ' + contagem);
+    marker.bindPopup(popup, {maxWidth: 250});
+    marker.bindTooltip(row[6] ? 'Clique para ver detalhes' : escapar(row[3]) + ': ' + contagem + ' O.S.');
+    return marker;
+}
+"""
+
+# O número do cluster é a soma das OS dos marcadores, não a quantidade de marcadores
+ICONE_CLUSTER = """
+function (cluster) {
+    var total = 0;
+    cluster.getAllChildMarkers().forEach(function (m) { total += m.options.contagem || 1; });
+    var tamanho = total < 10 ? 'small' : (total < 100 ? 'medium' : 'large');
+    return L.divIcon({
+        html: '<div><span>' + total + '</span></div>',
+        className: 'marker-cluster marker-cluster-' + tamanho,
+        iconSize: new L.Point(40, 40)
+    });
+}
+"""
+
+
+def dados_marcadores(df, limite=LIMITE_PONTOS_INDIVIDUAIS):
+    """
+    Monta as linhas [lat, lon, contagem, bairro, cidade, data, svo] de forma vetorizada.
+    Até `limite` linhas: uma por SVO. Acima: uma por (bairro, cidade, dia) com a contagem.
+    `df` precisa de latitude, longitude, 'Bairro Consumidor', 'Cidade Consumidor' e 'Agendado para'.
+    Bairro, cidade e data ficam como category até o fim: o texto só é montado
+    para as linhas que vão para o mapa.
+    """
+    base = pd.DataFrame({
+        'latitude': df['latitude'].astype(float).round(CASAS_DECIMAIS),
+        'longitude': df['longitude'].astype(float).round(CASAS_DECIMAIS),
+        'bairro': df['Bairro Consumidor'].astype('category'),
+        'cidade': df['Cidade Consumidor'].astype('category'),
+        'data': formatar_datas(df['Agendado para']),
+    })
+    if len(df) <= limite and 'SVO' in df.columns:
+        base.insert(2, 'contagem', 1)
+        base['svo'] = svos_em_texto(df)
+    else:
+        base = (base.groupby(['latitude', 'longitude', 'bairro', 'cidade', 'data'], sort=False, observed=True)
+                .size().reset_index(name='contagem'))
+        base = base[['latitude', 'longitude', 'contagem', 'bairro', 'cidade', 'data']]
+        base['svo'] = ''
+    for coluna in ('bairro', 'cidade', 'data'):
+        base[coluna] = base[coluna].astype(str)
+    return base.values.tolist()
+
+
+def camada_agendamentos(linhas, nome="Agendamentos"):
+    """
+    Camada única de marcadores (um só bloco de dados, desenhado no navegador).
+    `linhas` vem de `dados_marcadores`; pode ser vazia quando os dados são carregados depois.
+    """
+    # Import aqui: quem só precisa do JavaScript dos marcadores (mc_webapp, pagina_mapa) não carrega o folium
+    from folium.plugins import FastMarkerCluster
+
+    return FastMarkerCluster(
+        linhas,
+        callback=CALLBACK_MARCADOR,
+        name=nome,
+        icon_create_function=ICONE_CLUSTER,
+    )
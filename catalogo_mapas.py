@@ -0,0 +1,276 @@
+# Em catalogo_mapas.py
+# Catálogo em memória dos mapas de static/temp_maps, usado pelo mc_webapp.
+# Em vez de listar a pasta a cada acesso, o catálogo só relê a pasta quando o
+# mtime dela muda (arquivo criado, removido ou renomeado) e, mesmo assim, só
+# processa os arquivos novos ou alterados. Cada mapa ganha variantes já
+# comprimidas (.gz e, com o pacote brotli instalado, .br) e um ETag. A compressão
+# roda numa thread em segundo plano: até ela terminar, o mapa novo é servido com
+# as variantes que já existem, sem segurar as requisições.
+
+import gzip
+import os
+import re
+import threading
+import time
+import uuid
+from dataclasses import dataclass, field, replace
+from datetime import date, datetime
+
+try:
+    import brotli
+except ImportError:  # opcional: sem ele, só gzip
+    brotli = None
+
+BASE_DIR = os.path.dirname(os.path.abspath(__file__))
+PASTA_MAPAS = os.environ.get('MAPAS_DIR', os.path.join(BASE_DIR, 'static', 'temp_maps'))
+INTERVALO_VERIFICACAO = float(os.environ.get('MAPAS_INTERVALO_VERIFICACAO', '1.0'))  # segundos
+QUALIDADE_BROTLI = int(os.environ.get('MAPAS_QUALIDADE_BROTLI', '9'))
+
+# 'Campinas_20261018.<chave>.html' (mc_simple) e 'Campinas_geral_20261018.<chave>.html' (mc_geral);
+# a chave do cache_mapas vem depois do primeiro ponto. Nomes antigos: 'Campinas_geral202610181206.html'
+_NOME_GERAL = re.compile(r'^(?P<cidade>.+)_geral_?(?P<carimbo>\d{8}|\d{12})$')
+_NOME_DIA = re.compile(r'^(?P<cidade>.+)_(?P<data>\d{8}|sem_data)$')
+# Página de um lote por período (mc_simple.SVOMapsLote): 'Campinas_periodo_20261018-20261024.<chave>.html'
+_NOME_PERIODO = re.compile(r'^(?P<cidade>.+)_periodo_(?P<inicio>\d{8})-(?P<fim>\d{8})$')
+
+
+@dataclass
+class Recurso:
+    """Um arquivo servido em /mapa/<nome>, com as variantes comprimidas disponíveis."""
+    nome: str
+    cidade: str
+    data: date = None
+    tipo: str = 'outro'  # 'dia' (mc_simple), 'periodo' (lote de dias), 'geral' (mc_geral) ou 'outro'
+    tamanho: int = 0
+    criado_em: float = 0.0
+    etag: str = ''
+    origem: str = ''
+    variantes: dict = field(default_factory=dict)  # codificação ('identity', 'gzip', 'br') -> caminho
+
+    def para_dict(self):
+        return {
+            'nome': self.nome, 'cidade': self.cidade, 'tipo': self.tipo,
+            'data': self.data.isoformat() if self.data else None,
+            'tamanho': self.tamanho,
+            'criado_em': datetime.fromtimestamp(self.criado_em).isoformat(timespec='seconds'),
+        }
+
+
+def interpretar_nome(nome):
+    """'Campinas_20261018.html' -> ('Campinas', date(2026, 10, 18), 'dia')."""
+    base = nome.split('.', 1)[0]
+    encontrado = _NOME_GERAL.match(base)
+    if encontrado:
+        carimbo = datetime.strptime(encontrado['carimbo'][:8], '%Y%m%d')
+        return encontrado['cidade'].replace('_', ' '), carimbo.date(), 'geral'
+    encontrado = _NOME_PERIODO.match(base)
+    if encontrado:
+        return encontrado['cidade'].replace('_', ' '), datetime.strptime(encontrado['inicio'], '%Y%m%d').date(), 'periodo'
+    encontrado = _NOME_DIA.match(base)
+    if encontrado:
+        data = None if encontrado['data'] == 'sem_data' else datetime.strptime(encontrado['data'], '%Y%m%d').date()
+        return encontrado['cidade'].replace('_', ' '), data, 'dia'
+    return base.replace('_', ' '), None, 'outro'
+
+
+def _gravar_atomico(destino, conteudo):
+    temporario = f"{destino}.{uuid.uuid4().hex}.tmp"
+    with open(temporario, 'wb') as f:
+        f.write(conteudo)
+    os.replace(temporario, destino)
+
+
+def _atualizado(variante, origem_mtime):
+    try:
+        return os.stat(variante).st_mtime_ns >= origem_mtime
+    except FileNotFoundError:
+        return False
+
+
+def _variantes(caminho):
+    """{codificação: caminho} de todas as variantes de `caminho`, gravadas ou não."""
+    if caminho.endswith('.json.gz'):
+        base = caminho[:-len('.gz')]
+        variantes = {'gzip': caminho}
+    else:
+        base = caminho
+        variantes = {'identity': caminho, 'gzip': caminho + '.gz'}
+    if brotli is not None:
+        variantes['br'] = base + '.br'
+    return variantes
+
+
+def variantes_prontas(caminho):
+    """As variantes de `caminho` já gravadas e em dia com ele, sem comprimir nada."""
+    origem_mtime = os.stat(caminho).st_mtime_ns
+    return {c: v for c, v in _variantes(caminho).items() if v == caminho or _atualizado(v, origem_mtime)}
+
+
+def precomprimir(caminho):
+    """
+    Gera '<arquivo>.gz' e '<arquivo>.br' ao lado de `caminho` (se faltarem ou
+    estiverem desatualizados). Para os dados '<mapa>.json.gz', gera só o '.json.br'.
+    Retorna {codificação: caminho} com todas as variantes disponíveis.
+    """
+    origem_mtime = os.stat(caminho).st_mtime_ns
+    variantes = _variantes(caminho)
+    conteudo = None
+    if 'identity' in variantes and not _atualizado(variantes['gzip'], origem_mtime):
+        with open(caminho, 'rb') as f:
+            conteudo = f.read()
+        _gravar_atomico(variantes['gzip'], gzip.compress(conteudo, compresslevel=9, mtime=0))
+
+    if 'br' in variantes and not _atualizado(variantes['br'], origem_mtime):
+        if conteudo is None:
+            with open(caminho, 'rb') as f:
+                conteudo = f.read()
+            if caminho.endswith('.json.gz'):
+                conteudo = gzip.decompress(conteudo)
+        _gravar_atomico(variantes['br'], brotli.compress(conteudo, quality=QUALIDADE_BROTLI))
+    return variantes
+
+
+class CatalogoMapas:
+    """Mapas (.html) e arquivos de dados (.json) de `pasta`, atualizados de forma incremental."""
+
+    def __init__(self, pasta=PASTA_MAPAS, intervalo=INTERVALO_VERIFICACAO):
+        self.pasta = pasta
+        self.intervalo = intervalo
+        self._recursos = {}
+        self._assinaturas = {}  # nome -> (mtime_ns, tamanho) do arquivo de origem
+        self._mtime_pasta = None
+        self._ultima_verificacao = 0.0
+        self._lock = threading.Lock()
+        self._a_comprimir = {}  # nome -> caminho, esperando a thread de compressão
+        self._compressor = None
+
+    def atualizar(self, imediato=False, reler=False):
+        """
+        Relê a pasta só se ela mudou desde a última vez (no máximo a cada `intervalo` s,
+        a não ser com `imediato`). `reler` força a releitura mesmo sem mudança na pasta.
+        """
+        agora = time.monotonic()
+        if not (imediato or reler) and agora - self._ultima_verificacao < self.intervalo:
+            return
+        with self._lock:
+            self._ultima_verificacao = agora
+            try:
+                mtime_pasta = os.stat(self.pasta).st_mtime_ns
+            except FileNotFoundError:
+                mtime_pasta = None
+            if not reler and mtime_pasta == self._mtime_pasta:
+                return
+            self._mtime_pasta = mtime_pasta
+            self._reler()
+
+    def _reler(self):
+        encontrados = {}
+        if self._mtime_pasta is not None:
+            for entrada in os.scandir(self.pasta):
+                if entrada.name.endswith('.html'):
+                    encontrados[entrada.name] = entrada
+                elif entrada.name.endswith('.json.gz'):
+                    encontrados[entrada.name[:-len('.gz')]] = entrada
+
+        recursos = {}
+        for nome, entrada in encontrados.items():
+            estado = entrada.stat()
+            assinatura = (estado.st_mtime_ns, estado.st_size)
+            if self._assinaturas.get(nome) == assinatura:
+                recursos[nome] = self._recursos[nome]
+                continue
+            try:
+                variantes = variantes_prontas(entrada.path)
+            except OSError as e:  # arquivo ainda sendo gravado ou já removido
+                print(f"Catálogo: ignorando '{nome}' por enquanto ({e})")
+                continue
+            if len(variantes) < len(_variantes(entrada.path)):
+                self._a_comprimir[nome] = entrada.path
+            cidade, data, tipo = interpretar_nome(nome)
+            recursos[nome] = Recurso(
+                nome=nome, cidade=cidade, data=data, tipo=tipo,
+                tamanho=estado.st_size, criado_em=estado.st_mtime,
+                etag=f"{estado.st_mtime_ns:x}-{estado.st_size:x}", origem=entrada.path,
+                variantes=variantes,
+            )
+            self._assinaturas[nome] = assinatura
+
+        for nome in set(self._assinaturas) - set(recursos):
+            del self._assinaturas[nome]
+        self._recursos = recursos
+        if self._a_comprimir and self._compressor is None:
+            self._compressor = threading.Thread(target=self._comprimir_pendentes, name='catalogo-compressao', daemon=True)
+            self._compressor.start()
+
+    def _comprimir_pendentes(self):
+        """Thread de compressão: grava as variantes que faltam e troca o recurso no índice."""
+        while True:
+            with self._lock:
+                if not self._a_comprimir:
+                    self._compressor = None
+                    return
+                nome, caminho = self._a_comprimir.popitem()
+                assinatura = self._assinaturas.get(nome)
+            try:
+                variantes = precomprimir(caminho)
+            except OSError as e:  # removido ou regravado no meio do caminho: a próxima releitura resolve
+                print(f"Catálogo: não foi possível comprimir '{nome}' ({e})")
+                continue
+            with self._lock:
+                recurso = self._recursos.get(nome)
+                if recurso is not None and recurso.origem == caminho and self._assinaturas.get(nome) == assinatura:
+                    self._recursos = {**self._recursos, nome: replace(recurso, variantes=variantes)}
+
+    def recurso(self, nome):
+        """
+        Recurso pronto para servir, ou None. Um mapa regravado no mesmo arquivo não
+        muda o mtime da pasta, então a origem do recurso pedido é conferida sempre.
+        """
+        self.atualizar()
+        recurso = self._recursos.get(nome)
+        if recurso is None:
+            self.atualizar(imediato=True)  # pode ter acabado de ser gerado
+            return self._recursos.get(nome)
+        try:
+            estado = os.stat(recurso.origem)
+            mudou = (estado.st_mtime_ns, estado.st_size) != self._assinaturas.get(nome)
+        except FileNotFoundError:
+            mudou = True
+        if mudou:
+            self.atualizar(reler=True)
+        return self._recursos.get(nome)
+
+    def listar(self, cidade=None, data=None, tipo=None, pagina=1, por_pagina=50):
+        """
+        Mapas (.html) do mais novo para o mais antigo, filtrados e paginados.
+        Retorna (mapas da página, total após o filtro).
+        """
+        self.atualizar()
+        mapas = [r for r in self._recursos.values() if r.nome.endswith('.html')]
+        if cidade:
+            cidade = cidade.casefold()
+            mapas = [r for r in mapas if cidade in r.cidade.casefold()]
+        if data:
+            mapas = [r for r in mapas if r.data == data]
+        if tipo:
+            mapas = [r for r in mapas if r.tipo == tipo]
+        mapas.sort(key=lambda r: r.criado_em, reverse=True)
+        inicio = (max(pagina, 1) - 1) * por_pagina
+        return mapas[inicio:inicio + por_pagina], len(mapas)
+
+    def cidades(self):
+        self.atualizar()
+        return sorted({r.cidade for r in self._recursos.values() if r.nome.endswith('.html')})
+
+
+_catalogo_padrao = None
+_catalogo_lock = threading.Lock()
+
+
+def catalogo_padrao():
+    """Catálogo compartilhado da pasta padrão de mapas."""
+    global _catalogo_padrao
+    with _catalogo_lock:
+        if _catalogo_padrao is None:
+            _catalogo_padrao = CatalogoMapas()
+        return _catalogo_padrao
@@ -0,0 +1,2 @@
+# Em conftest.py
+# Raiz do repositório no sys.path para os testes (tests/) importarem os módulos soltos.
@@ -0,0 +1,245 @@
+# Em cubo.py
+# Cubo de contagens de SVOs por dia x cidade x bairro x status, montado uma vez
+# por planilha. Um milhão de linhas vira algumas dezenas de milhares de
+# contagens; os mapas por dia ou período e os resumos por data e status saem de
+# recortes do cubo em milissegundos, sem voltar às linhas originais.
+#
+#   cubo = carregar_cubo(chave, lambda: df)       # chave: a do cache_planilhas
+#   cubo.fatiar('2026-10-18', '2026-10-24', status=['Aberta']).por('bairro')
+
+import hashlib
+import os
+import threading
+import uuid
+from collections import OrderedDict
+
+import numpy as np
+import pandas as pd
+
+from enderecos import normalizar_bairros, versao_normalizacao
+from metricas import contar
+
+BASE_DIR = os.path.dirname(os.path.abspath(__file__))
+PASTA_CUBOS = os.environ.get('CUBOS_DIR', os.path.join(BASE_DIR, 'cache_cubos'))
+# Espaço máximo em disco dos cubos e quantos ficam em memória em cada processo
+LIMITE_BYTES = int(float(os.environ.get('CUBOS_CACHE_MB', '64')) * 1024 * 1024)
+MAX_CUBOS_MEMORIA = int(os.environ.get('CUBOS_MEMORIA', '32'))
+
+# Dimensão do cubo -> coluna da planilha
+DIMENSOES = {
+    'dia': 'Agendado para',
+    'cidade': 'Cidade Consumidor',
+    'bairro': 'Bairro Consumidor',
+    'status': 'Status da OS',
+}
+
+
+class CuboAgregado:
+    """
+    Contagens (coluna 'contagem') por 'dia' (datetime64; NaT = sem data),
+    'cidade', 'bairro' e 'status' (category). Recortes devolvem outro cubo.
+    """
+
+    def __init__(self, contagens):
+        self.contagens = contagens
+
+    @classmethod
+    def de_dataframe(cls, df, coluna_bairro=DIMENSOES['bairro']):
+        """Um groupby só sobre a planilha (colunas ausentes viram uma dimensão vazia)."""
+        colunas = {**DIMENSOES, 'bairro': coluna_bairro}
+        agendado = pd.to_datetime(df[colunas['dia']], errors='coerce')
+        if agendado.dt.tz is not None:
+            agendado = agendado.dt.tz_localize(None)
+        chaves = {'dia': agendado.dt.normalize()}
+        for nome in ('cidade', 'bairro', 'status'):
+            if colunas[nome] not in df.columns:
+                chaves[nome] = pd.Series(pd.Categorical([None] * len(df), categories=[]), index=df.index)
+            elif nome == 'bairro':
+                # Variantes de grafia do mesmo bairro somam na mesma contagem
+                chaves[nome] = normalizar_bairros(df[colunas[nome]])
+            else:
+                chaves[nome] = df[colunas[nome]].astype('category')
+        contagens = (pd.DataFrame(chaves)
+                     .groupby(list(chaves), observed=True, dropna=False, sort=False)
+                     .size().reset_index(name='contagem'))
+        contagens['contagem'] = contagens['contagem'].astype('int32')
+        contar('linhas_processadas_total', len(df), funcao='cubo')
+        return cls(contagens)
+
+    def __len__(self):
+        return len(self.contagens)
+
+    @property
+    def vazio(self):
+        return self.contagens.empty
+
+    def total(self):
+        return int(self.contagens['contagem'].sum())
+
+    def dias(self):
+        """Dias com agendamento, em ordem (sem o NaT das SVOs sem data)."""
+        return sorted(self.contagens['dia'].dropna().unique())
+
+    def fatiar(self, inicio=None, fim=None, com_data=True, sem_data=False, cidades=None, bairros=None, status=None):
+        """
+        Recorte do cubo. `inicio` e `fim` (inclusive; None = sem limite) valem para
+        as SVOs com data; `sem_data` inclui as sem data e `com_data=False` deixa só elas.
+        `cidades`, `bairros` e `status`: listas de valores aceitos (None = todos).
+        """
+        dia = self.contagens['dia']
+        mascara = np.zeros(len(dia), dtype=bool)
+        if com_data:
+            com = dia.notna()
+            if inicio is not None:
+                com &= dia >= pd.Timestamp(inicio).normalize()
+            if fim is not None:
+                com &= dia <= pd.Timestamp(fim).normalize()
+            mascara |= com.to_numpy()
+        if sem_data:
+            mascara |= dia.isna().to_numpy()
+        for nome, valores in (('cidade', cidades), ('bairro', bairros), ('status', status)):
+            if valores is not None:
+                mascara &= self.contagens[nome].isin(list(valores)).to_numpy()
+        return CuboAgregado(self.contagens[mascara])
+
+    def por(self, *dimensoes):
+        """Total de SVOs por `dimensoes` (ex.: 'dia', 'bairro'), da maior contagem para a menor."""
+        totais = (self.contagens.groupby(list(dimensoes), observed=True, dropna=False, sort=False)['contagem']
+                  .sum().astype('int64'))
+        return totais.sort_values(ascending=False, kind='stable').reset_index()
+
+
+def ler_parquet(caminho, coluna_bairro=DIMENSOES['bairro']):
+    """Lê do Parquet só as colunas que o cubo usa (das que existirem no arquivo)."""
+    import pyarrow.parquet as pq
+
+    existentes = set(pq.read_schema(caminho).names)
+    colunas = [c for c in {**DIMENSOES, 'bairro': coluna_bairro}.values() if c in existentes]
+    return pd.read_parquet(caminho, columns=colunas)
+
+
+class CacheCubos:
+    """
+    Cubos por chave da planilha: em memória (os mais recentes) e em Parquet no
+    disco, para os processos da fila de mapas reaproveitarem o cubo já montado.
+    """
+
+    def __init__(self, pasta=PASTA_CUBOS, limite_bytes=LIMITE_BYTES, max_memoria=MAX_CUBOS_MEMORIA):
+        self.pasta = pasta
+        self.limite_bytes = limite_bytes
+        self.max_memoria = max_memoria
+        self._memoria = OrderedDict()
+        self._lock = threading.Lock()
+        os.makedirs(pasta, exist_ok=True)
+
+    def _caminho(self, chave):
+        return os.path.join(self.pasta, f"{chave}.parquet")
+
+    def carregar(self, chave, construir, coluna_bairro=DIMENSOES['bairro']):
+        """Cubo da planilha `chave`; `construir()` (que devolve o DataFrame) só é chamado se ele não existir."""
+        if coluna_bairro != DIMENSOES['bairro']:
+            chave = f"{chave}-{hashlib.sha256(coluna_bairro.encode('utf-8')).hexdigest()[:8]}"
+        # Os nomes de bairro do cubo dependem das regras e da tabela de apelidos
+        chave = f"{chave}-{versao_normalizacao()}"
+        with self._lock:
+            if chave in self._memoria:
+                self._memoria.move_to_end(chave)
+                contar('cache_total', cache='cubos', resultado='hit')
+                return self._memoria[chave]
+
+        caminho = self._caminho(chave)
+        cubo = None
+        if os.path.exists(caminho):
+            try:
+                cubo = CuboAgregado(pd.read_parquet(caminho))
+                os.utime(caminho)  # marca como usado recentemente
+                contar('cache_total', cache='cubos', resultado='hit')
+            except (OSError, ValueError):
+                cubo = None  # removido ou corrompido no meio do caminho: monta de novo
+        if cubo is None:
+            contar('cache_total', cache='cubos', resultado='miss')
+            cubo = CuboAgregado.de_dataframe(construir(), coluna_bairro)
+            self._gravar(cubo, caminho)
+
+        with self._lock:
+            self._memoria[chave] = cubo
+            while len(self._memoria) > self.max_memoria:
+                self._memoria.popitem(last=False)
+        return cubo
+
+    def aquecer(self, quantidade=None):
+        """Traz para a memória os cubos do disco usados mais recentemente (até `quantidade`; None = o limite da memória)."""
+        quantidade = self.max_memoria if quantidade is None else min(quantidade, self.max_memoria)
+        arquivos = []
+        for entrada in os.scandir(self.pasta):
+            if entrada.name.endswith('.parquet'):
+                try:
+                    arquivos.append((entrada.stat().st_mtime, entrada.path))
+                except FileNotFoundError:
+                    continue
+        carregados = 0
+        # Do mais antigo para o mais novo: o mais recente fica no fim do LRU
+        for _, caminho in sorted(arquivos)[-quantidade:] if quantidade else []:
+            chave = os.path.splitext(os.path.basename(caminho))[0]
+            with self._lock:
+                if chave in self._memoria:
+                    continue
+            try:
+                cubo = CuboAgregado(pd.read_parquet(caminho))
+            except (OSError, ValueError):
+                continue
+            with self._lock:
+                self._memoria.setdefault(chave, cubo)
+                while len(self._memoria) > self.max_memoria:
+                    self._memoria.popitem(last=False)
+            carregados += 1
+        return carregados
+
+    def _gravar(self, cubo, caminho):
+        temporario = f"{caminho}.{uuid.uuid4().hex}.tmp"
+        try:
+            cubo.contagens.to_parquet(temporario, index=False)
+            os.replace(temporario, caminho)
+        except Exception as e:
+            print(f"AVISO: não foi possível guardar o cubo em disco: {e}")
+            if os.path.exists(temporario):
+                os.remove(temporario)
+            return
+        self.limpar()
+
+    def limpar(self):
+        """Remove os cubos menos usados até a pasta caber no limite."""
+        arquivos = []
+        for entrada in os.scandir(self.pasta):
+            if entrada.name.endswith('.parquet'):
+                try:
+                    info = entrada.stat()
+                except FileNotFoundError:
+                    continue
+                arquivos.append((info.st_mtime, info.st_size, entrada.path))
+        total = sum(tamanho for _, tamanho, _ in arquivos)
+        for _, tamanho, caminho in sorted(arquivos):
+            if total <= self.limite_bytes:
+                break
+            try:
+                os.remove(caminho)
+            except FileNotFoundError:
+                pass
+            total -= tamanho
+
+
+_cache_padrao = None
+_cache_padrao_lock = threading.Lock()
+
+
+def cache_padrao():
+    global _cache_padrao
+    with _cache_padrao_lock:
+        if _cache_padrao is None:
+            _cache_padrao = CacheCubos()
+        return _cache_padrao
+
+
+def carregar_cubo(chave, construir, coluna_bairro=DIMENSOES['bairro']):
+    """Atalho: cubo da planilha `chave` pelo cache padrão (monta com `construir()` na primeira vez)."""
+    return cache_padrao().carregar(chave, construir, coluna_bairro)
@@ -0,0 +1,175 @@
+# Em enderecos.py
+# Normalização dos nomes de bairro antes da geocodificação. Variantes como
+# "Jd. América", "JARDIM AMERICA " e "Jardim América" viram um bairro só: uma
+# consulta ao Nominatim, um ponto de calor e uma linha na tabela do mapa.
+#   - acentos e caixa não contam na comparação;
+#   - abreviações comuns (Jd, Vl, Pq, Res...) são escritas por extenso;
+#   - espaços repetidos e nas pontas saem;
+#   - uma tabela de apelidos opcional (CSV 'variante,bairro', mantida pela
+#     operação) junta o que as regras não juntam e define o nome exibido.
+#
+#   python enderecos.py exportacoes/*.xlsx     # lista as variantes encontradas
+
+import argparse
+import csv
+import hashlib
+import os
+import re
+import threading
+
+import numpy as np
+import pandas as pd
+
+from gazetteer import normalizar_nome
+
+BASE_DIR = os.path.dirname(os.path.abspath(__file__))
+CAMINHO_APELIDOS = os.environ.get('BAIRROS_APELIDOS', os.path.join(BASE_DIR, 'bairros_apelidos.csv'))
+# Muda sempre que as regras abaixo mudam: invalida os cubos já montados
+VERSAO_NORMALIZACAO = 1
+
+# Abreviação (sem acento, sem caixa, sem ponto) -> por extenso
+ABREVIACOES = {
+    'jd': 'Jardim', 'jdm': 'Jardim', 'jard': 'Jardim',
+    'vl': 'Vila',
+    'pq': 'Parque', 'pqe': 'Parque', 'pque': 'Parque',
+    'res': 'Residencial', 'resid': 'Residencial',
+    'cj': 'Conjunto', 'conj': 'Conjunto',
+    'chac': 'Chácara',
+    'lot': 'Loteamento',
+    'cond': 'Condomínio',
+    'nuc': 'Núcleo',
+    'sta': 'Santa', 'sto': 'Santo',
+    'dr': 'Doutor', 'prof': 'Professor', 'cel': 'Coronel', 'gov': 'Governador', 'pres': 'Presidente',
+}
+
+_PONTO_COLADO = re.compile(r'\.(?=\S)')
+
+
+def expandir(texto):
+    """'Jd.América  ' -> 'Jardim América' (abreviações por extenso, espaços simples; o resto como veio)."""
+    palavras = []
+    for palavra in _PONTO_COLADO.sub('. ', str(texto)).split():
+        extenso = ABREVIACOES.get(normalizar_nome(palavra.rstrip('.')))
+        if extenso is None:
+            palavras.append(palavra)
+        elif palavra.isupper():
+            palavras.append(extenso.upper())
+        elif palavra.islower():
+            palavras.append(extenso.lower())
+        else:
+            palavras.append(extenso)
+    return ' '.join(palavras)
+
+
+def chave_bairro(texto):
+    """Chave de comparação: 'JD. AMERICA ' e 'Jardim América' -> 'jardim america'."""
+    return normalizar_nome(expandir(texto))
+
+
+_apelidos = {}
+_apelidos_lock = threading.Lock()
+
+
+def _ler_apelidos(caminho):
+    with open(caminho, 'rb') as f:
+        conteudo = f.read()
+    apelidos = {}
+    linhas = csv.DictReader(conteudo.decode('utf-8-sig').splitlines())
+    for linha in linhas:
+        linha = {normalizar_nome(coluna): valor for coluna, valor in linha.items() if coluna}
+        variante, bairro = linha.get('variante'), linha.get('bairro')
+        if variante and bairro and bairro.strip():
+            apelidos[chave_bairro(variante)] = expandir(bairro)
+    return apelidos, hashlib.sha256(conteudo).hexdigest()[:8]
+
+
+def carregar_apelidos(caminho=CAMINHO_APELIDOS):
+    """
+    Tabela de apelidos: ({chave da variante: nome do bairro}, assinatura do arquivo).
+    Sem arquivo, ({}, ''). Relida só quando o arquivo muda.
+    """
+    try:
+        info = os.stat(caminho)
+    except FileNotFoundError:
+        return {}, ''
+    versao = (info.st_mtime_ns, info.st_size)
+    with _apelidos_lock:
+        if caminho not in _apelidos or _apelidos[caminho][0] != versao:
+            _apelidos[caminho] = (versao, _ler_apelidos(caminho))
+        return _apelidos[caminho][1]
+
+
+def versao_normalizacao(caminho=CAMINHO_APELIDOS):
+    """Identifica as regras e a tabela de apelidos em uso (entra na chave dos caches derivados)."""
+    _, assinatura = carregar_apelidos(caminho)
+    return f"n{VERSAO_NORMALIZACAO}{assinatura}"
+
+
+def normalizar_bairros(bairros, apelidos=None):
+    """
+    Série de bairros (category ou texto) -> category com um nome por bairro. Cada
+    grupo de variantes fica com o nome da tabela de apelidos ou, sem apelido, com a
+    variante por extenso mais frequente (nas empatadas, a acentuada e sem caixa alta).
+    Só os valores distintos passam pelo Python; nomes vazios viram NaN.
+    """
+    if apelidos is None:
+        apelidos, _ = carregar_apelidos()
+    if isinstance(bairros.dtype, pd.CategoricalDtype):
+        codigos, valores = bairros.cat.codes.to_numpy().astype(np.int64), bairros.cat.categories
+    else:
+        codigos, valores = pd.factorize(bairros)
+    contagens = np.bincount(codigos[codigos >= 0], minlength=len(valores))
+
+    escolhidos = {}  # chave -> (pontuação, nome)
+    chaves = []
+    for valor, contagem in zip(valores, contagens):
+        nome = expandir(valor)
+        chave = normalizar_nome(nome)
+        oficial = apelidos.get(chave)
+        if oficial is not None:
+            nome, chave = oficial, normalizar_nome(oficial)
+        if not chave:
+            chaves.append(None)
+            continue
+        acentuado = normalizar_nome(nome) != ' '.join(nome.casefold().split())
+        pontuacao = (oficial is not None, int(contagem), not nome.isupper(), acentuado, nome)
+        if chave not in escolhidos or pontuacao > escolhidos[chave][0]:
+            escolhidos[chave] = (pontuacao, nome)
+        chaves.append(chave)
+
+    # Categorias em ordem alfabética, como num groupby sobre o texto
+    ordem = sorted(escolhidos, key=lambda chave: escolhidos[chave][1])
+    posicao = {chave: i for i, chave in enumerate(ordem)}
+    novos = np.array([posicao.get(chave, -1) for chave in chaves] + [-1], dtype=np.int64)
+    # códigos -1 (NaN) apontam para o -1 acrescentado no fim
+    categorias = pd.Index([escolhidos[chave][1] for chave in ordem], dtype=object)
+    return pd.Series(
+        pd.Categorical.from_codes(novos[codigos], categories=categorias),
+        index=bairros.index, name=bairros.name,
+    )
+
+
+def variantes(bairros, apelidos=None):
+    """Grupos com mais de uma grafia: DataFrame (bairro, variante, ocorrências), para revisar a tabela de apelidos."""
+    bairros = bairros.dropna()
+    normalizados = normalizar_bairros(bairros, apelidos)
+    tabela = pd.DataFrame({'bairro': normalizados.astype(object), 'variante': bairros.astype(object)})
+    tabela = tabela.groupby(['bairro', 'variante']).size().reset_index(name='ocorrencias')
+    grafias = tabela.groupby('bairro')['variante'].transform('size')
+    return tabela[grafias > 1].sort_values(['bairro', 'ocorrencias'], ascending=[True, False], ignore_index=True)
+
+
+if __name__ == '__main__':
+    from cache_planilhas import carregar_planilha
+
+    parser = argparse.ArgumentParser(description="Lista os bairros escritos de mais de um jeito nas planilhas.")
+    parser.add_argument('planilhas', nargs='+', help="Planilhas .xlsx de SVOs")
+    parser.add_argument('--coluna', default='Bairro Consumidor')
+    args = parser.parse_args()
+
+    bairros = pd.concat(
+        [carregar_planilha(caminho, [args.coluna])[args.coluna].astype(object) for caminho in args.planilhas],
+        ignore_index=True,
+    )
+    grupos = variantes(bairros)
+    print(grupos.to_string(index=False) if not grupos.empty else "Nenhum bairro com mais de uma grafia.")
@@ -0,0 +1,100 @@
+# Em fake_nominatim.py
+# Servidor Nominatim falso para testar a geocodificação sem depender da rede.
+# Uso: python fake_nominatim.py --porta 8088 --latencia 0.3
+# e rode a aplicação com NOMINATIM_DOMAIN=localhost:8088 NOMINATIM_SCHEME=http
+
+import argparse
+import hashlib
+import json
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlparse
+
+
+def coordenadas_falsas(consulta):
+    """Coordenadas determinísticas (região de Campinas) a partir do texto da consulta."""
+    h = int(hashlib.md5(consulta.strip().casefold().encode('utf-8')).hexdigest(), 16)
+    return -22.9 + (h % 1000) / 10000, -47.06 + (h // 1000 % 1000) / 10000
+
+
+class _Handler(BaseHTTPRequestHandler):
+    def do_GET(self):
+        servidor = self.server
+        url = urlparse(self.path)
+        if url.path == '/estatisticas':
+            self._responder(servidor.estatisticas())
+            return
+        if url.path != '/search':
+            self.send_error(404)
+            return
+
+        with servidor.lock:
+            servidor.instantes.append(time.monotonic())
+        if servidor.latencia:
+            time.sleep(servidor.latencia)
+
+        consulta = parse_qs(url.query).get('q', [''])[0]
+        if not consulta or consulta.casefold().startswith(servidor.prefixo_inexistente):
+            self._responder([])
+            return
+        lat, lon = coordenadas_falsas(consulta)
+        self._responder([{
+            'place_id': abs(hash(consulta)),
+            'lat': str(lat),
+            'lon': str(lon),
+            'display_name': consulta,
+        }])
+
+    def _responder(self, dados):
+        corpo = json.dumps(dados).encode('utf-8')
+        self.send_response(200)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(corpo)))
+        self.end_headers()
+        self.wfile.write(corpo)
+
+    def log_message(self, *args):
+        pass
+
+
+class FakeNominatim(ThreadingHTTPServer):
+    daemon_threads = True
+
+    def __init__(self, porta=0, latencia=0.0, prefixo_inexistente='inexistente'):
+        super().__init__(('127.0.0.1', porta), _Handler)
+        self.latencia = latencia
+        self.prefixo_inexistente = prefixo_inexistente
+        self.instantes = []
+        self.lock = threading.Lock()
+
+    @property
+    def domain(self):
+        return f"127.0.0.1:{self.server_address[1]}"
+
+    def estatisticas(self):
+        """Total de requisições e o maior número delas dentro de qualquer janela de 1 s."""
+        with self.lock:
+            instantes = sorted(self.instantes)
+        pico = inicio = 0
+        for fim, instante in enumerate(instantes):
+            while instante - instantes[inicio] >= 1.0:
+                inicio += 1
+            pico = max(pico, fim - inicio + 1)
+        duracao = instantes[-1] - instantes[0] if len(instantes) > 1 else 0.0
+        return {'requisicoes': len(instantes), 'pico_por_segundo': pico, 'duracao_s': duracao}
+
+    def iniciar(self):
+        threading.Thread(target=self.serve_forever, daemon=True).start()
+        return self
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Servidor Nominatim falso para testes locais.")
+    parser.add_argument('--porta', type=int, default=8088)
+    parser.add_argument('--latencia', type=float, default=0.0, help="Atraso de cada resposta, em segundos")
+    args = parser.parse_args()
+
+    servidor = FakeNominatim(args.porta, args.latencia)
+    print(f"Nominatim falso em http://{servidor.domain}/search (latência {args.latencia}s)")
+    servidor.serve_forever()
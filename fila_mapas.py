@@ -0,0 +1,480 @@
+# Em fila_mapas.py
+# Fila de geração de mapas em segundo plano. Cada mapa (arquivo, cidade, data)
+# vira um job executado num pool de processos; o estado e o andamento de cada
+# etapa ficam em SQLite, então a página pode ser recarregada (ou outra sessão
+# pode acompanhar o mesmo lote) sem perder o trabalho.
+# Planilhas com várias cidades são separadas por cidade; um job geocodifica os
+# bairros de todas de uma vez e só então os mapas de cada cidade saem em paralelo.
+
+import hashlib
+import json
+import multiprocessing
+import os
+import sqlite3
+import threading
+import time
+import traceback
+import uuid
+from concurrent.futures import ProcessPoolExecutor
+
+import pandas as pd
+
+from catalogo_mapas import PASTA_MAPAS
+from metricas import coletar
+
+BASE_DIR = os.path.dirname(os.path.abspath(__file__))
+CAMINHO_FILA = os.environ.get('FILA_MAPAS_PATH', os.path.join(BASE_DIR, 'fila_mapas.sqlite3'))
+PASTA_ENTRADAS = os.environ.get('FILA_MAPAS_ENTRADAS', os.path.join(BASE_DIR, 'fila_mapas'))
+MAX_PROCESSOS = int(os.environ.get('FILA_MAPAS_PROCESSOS', str(min(os.cpu_count() or 1, 4))))
+# Jobs finalizados mais velhos que isso são apagados
+DIAS_RETENCAO = float(os.environ.get('FILA_MAPAS_DIAS', '2'))
+# Planilha de entrada que nenhum job usa (ex.: gravada, mas o envio falhou) sai depois disso
+CARENCIA_ENTRADAS = float(os.environ.get('FILA_MAPAS_CARENCIA_ENTRADAS', '600'))  # segundos
+
+PENDENTE, EXECUTANDO, CONCLUIDO, ERRO = 'pendente', 'executando', 'concluido', 'erro'
+FINALIZADOS = (CONCLUIDO, ERRO)
+
+
+def _processo_vivo(pid):
+    if os.name == 'nt':
+        return True  # sem verificação barata no Windows: os jobs ficam como estão
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        pass
+    return True
+
+
+class FilaMapas:
+    """
+    Jobs de mapa num SQLite (modo WAL) e um pool de processos, criado só no
+    processo que envia jobs. Os workers gravam estado, etapa e progresso na
+    mesma tabela; a interface só consulta.
+    """
+
+    def __init__(self, caminho=CAMINHO_FILA, max_processos=MAX_PROCESSOS):
+        self.caminho = caminho
+        self.max_processos = max_processos
+        self._local = threading.local()
+        self._lock = threading.Lock()
+        self._executor = None
+        self._encerrada = False
+        self._futuros = {}  # id do job -> Future do pool (só os deste processo, até terminarem)
+        os.makedirs(os.path.dirname(os.path.abspath(caminho)), exist_ok=True)
+        with self._conexao() as conn:
+            conn.execute("""
+                CREATE TABLE IF NOT EXISTS jobs (
+                    id TEXT PRIMARY KEY,
+                    lote TEXT NOT NULL,
+                    tipo TEXT NOT NULL,
+                    titulo TEXT NOT NULL,
+                    parametros TEXT NOT NULL,
+                    estado TEXT NOT NULL,
+                    etapa TEXT,
+                    progresso REAL NOT NULL DEFAULT 0,
+                    resultado TEXT,
+                    erro TEXT,
+                    tempos TEXT,
+                    dono INTEGER,
+                    criado_em REAL NOT NULL,
+                    atualizado_em REAL NOT NULL
+                )
+            """)
+            conn.execute("CREATE INDEX IF NOT EXISTS jobs_lote ON jobs (lote)")
+            # Filas criadas antes da coluna de tempos por etapa
+            colunas = {linha[1] for linha in conn.execute("PRAGMA table_info(jobs)")}
+            if 'tempos' not in colunas:
+                conn.execute("ALTER TABLE jobs ADD COLUMN tempos TEXT")
+        self._marcar_orfaos()
+
+    def _conexao(self):
+        conn = getattr(self._local, 'conn', None)
+        if conn is None:
+            conn = sqlite3.connect(self.caminho, timeout=30)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            conn.row_factory = sqlite3.Row
+            self._local.conn = conn
+        return conn
+
+    def _pool(self):
+        with self._lock:
+            if self._encerrada:
+                raise RuntimeError("A fila de mapas deste processo foi encerrada.")
+            if self._executor is None:
+                # 'spawn': não herda as threads do Streamlit/Flask do processo pai
+                self._executor = ProcessPoolExecutor(
+                    max_workers=self.max_processos, mp_context=multiprocessing.get_context('spawn'),
+                    initializer=_iniciar_processo,
+                )
+            return self._executor
+
+    def aquecer(self):
+        """Sobe os processos do pool antes do primeiro job (cada um já carrega os módulos dos mapas ao iniciar)."""
+        pool = self._pool()
+        # Cada envio sem processo livre cria um processo novo, até o máximo do pool
+        return [pool.submit(os.getpid) for _ in range(self.max_processos)]
+
+    def encerrar(self, forcar=False):
+        """
+        Fecha o pool deste processo; jobs encadeados que ainda não entraram nele falham.
+        Com `forcar`, cancela o que não começou e mata os workers no meio de um job
+        (ex.: presos num Nominatim que não responde), sem esperar por eles.
+        """
+        with self._lock:
+            self._encerrada = True
+            executor, self._executor = self._executor, None
+        if executor is None:
+            return
+        # _processes é interno do ProcessPoolExecutor, mas é o único jeito de matar um worker preso
+        processos = list((executor._processes or {}).values()) if forcar else []
+        executor.shutdown(wait=not forcar, cancel_futures=forcar)
+        for processo in processos:
+            processo.terminate()
+
+    def _marcar_orfaos(self):
+        """Jobs de um processo que já morreu (ex.: servidor reiniciado) não vão terminar."""
+        with self._conexao() as conn:
+            linhas = conn.execute(
+                "SELECT DISTINCT dono FROM jobs WHERE estado IN (?, ?)", (PENDENTE, EXECUTANDO),
+            ).fetchall()
+            for (dono,) in linhas:
+                if dono != os.getpid() and not _processo_vivo(dono):
+                    conn.execute(
+                        "UPDATE jobs SET estado = ?, erro = ?, atualizado_em = ? WHERE dono = ? AND estado IN (?, ?)",
+                        (ERRO, "Interrompido: o servidor foi reiniciado.", time.time(), dono, PENDENTE, EXECUTANDO),
+                    )
+
+    def enviar(self, lote, tipo, titulo, parametros, depois_de=None):
+        """
+        Registra o job e o coloca no pool. `tipo`: 'dia' (SVOMaps), 'periodo'
+        (SVOMapsLote), 'geral' (mapa dos próximos dias; 'inicio' e 'dias' opcionais)
+        ou 'geocodificacao' (bairros de várias cidades de uma vez). Com `depois_de` (id de um job
+        enviado por este processo), só entra no pool quando aquele terminar.
+        """
+        anterior = self._futuros.get(depois_de) if depois_de else None
+        etapa = 'Aguardando a geocodificação' if anterior is not None else 'Na fila'
+        id_job = self._registrar(lote, tipo, titulo, parametros, etapa)
+        if anterior is None:
+            self._submeter(id_job)
+        else:
+            self._encadear(anterior, id_job)
+        return id_job
+
+    def _registrar(self, lote, tipo, titulo, parametros, etapa='Na fila'):
+        """Grava o job como pendente, sem colocá-lo no pool."""
+        id_job = uuid.uuid4().hex
+        agora = time.time()
+        with self._conexao() as conn:
+            conn.execute(
+                "INSERT INTO jobs (id, lote, tipo, titulo, parametros, estado, etapa, dono, criado_em, atualizado_em) "
+                "VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                (id_job, lote, tipo, titulo, json.dumps(parametros), PENDENTE, etapa, os.getpid(), agora, agora),
+            )
+        return id_job
+
+    def _encadear(self, anterior, id_job):
+        # Terminando com erro ou não: sem as coordenadas prontas, o job geocodifica o que faltar
+        anterior.add_done_callback(lambda _futuro: self._submeter_depois(id_job))
+
+    def enviar_regional(self, lote, entradas, mapas_da_cidade, coluna_bairro='Bairro Consumidor', estado='SP'):
+        """
+        Mapas de todas as cidades de uma planilha (`entradas`: {cidade: entrada},
+        de salvar_por_cidade). Um job geocodifica de uma vez os bairros de todas as
+        cidades; quando termina, os mapas de cada cidade (`mapas_da_cidade(cidade, entrada)`
+        -> [(tipo, título, parâmetros), ...]) rodam em paralelo, já com as coordenadas no cache.
+        Retorna {cidade: [ids dos jobs de mapa]}.
+        """
+        if not entradas:
+            return {}
+        # Todos os jobs do lote são gravados antes de a geocodificação entrar no pool: se ela
+        # terminasse antes, limpar_entradas veria as entradas sem nenhum job pendente e as apagaria
+        geocodificacao = self._registrar(lote, 'geocodificacao', f"Bairros de {', '.join(map(str, entradas))}", {
+            'entradas': list(entradas.values()), 'coluna_bairro': coluna_bairro, 'estado': estado,
+        })
+        mapas = {}
+        try:
+            for cidade, entrada in entradas.items():
+                mapas[cidade] = [
+                    self._registrar(lote, tipo, titulo, parametros, 'Aguardando a geocodificação')
+                    for tipo, titulo, parametros in mapas_da_cidade(cidade, entrada)
+                ]
+        except Exception as e:
+            for id_job in [geocodificacao, *(id_job for ids in mapas.values() for id_job in ids)]:
+                self.atualizar(id_job, estado=ERRO, etapa='Falhou', erro=f"{type(e).__name__}: {e}")
+            raise
+        futuro = self._submeter(geocodificacao)
+        for ids in mapas.values():
+            for id_job in ids:
+                self._encadear(futuro, id_job)
+        return mapas
+
+    def _submeter(self, id_job):
+        futuro = self._pool().submit(executar_job, self.caminho, id_job)
+        self._futuros[id_job] = futuro
+        futuro.add_done_callback(lambda futuro: self._terminou(id_job, futuro))
+        return futuro
+
+    def _terminou(self, id_job, futuro):
+        self._futuros.pop(id_job, None)
+        erro = None if futuro.cancelled() else futuro.exception()
+        if erro is not None:  # o processo do worker morreu antes de gravar o resultado
+            self._falhar(id_job, f"{type(erro).__name__}: {erro}")
+
+    def _submeter_depois(self, id_job):
+        try:
+            self.atualizar(id_job, etapa='Na fila')
+            self._submeter(id_job)
+        except Exception as e:  # ex.: pool encerrado junto com o servidor
+            self._falhar(id_job, f"{type(e).__name__}: {e}")
+
+    def _falhar(self, id_job, erro):
+        """Marca o job como falho, a não ser que já tenha terminado (e guardado o próprio erro)."""
+        with self._conexao() as conn:
+            conn.execute(
+                f"UPDATE jobs SET estado = ?, etapa = ?, erro = ?, atualizado_em = ? "
+                f"WHERE id = ? AND estado NOT IN ({', '.join('?' * len(FINALIZADOS))})",
+                (ERRO, 'Falhou', erro, time.time(), id_job, *FINALIZADOS),
+            )
+
+    def atualizar(self, id_job, **campos):
+        campos['atualizado_em'] = time.time()
+        colunas = ', '.join(f"{nome} = ?" for nome in campos)
+        with self._conexao() as conn:
+            conn.execute(f"UPDATE jobs SET {colunas} WHERE id = ?", (*campos.values(), id_job))
+
+    def obter(self, id_job):
+        linha = self._conexao().execute("SELECT * FROM jobs WHERE id = ?", (id_job,)).fetchone()
+        return _como_dict(linha) if linha else None
+
+    def jobs_do_lote(self, lote):
+        linhas = self._conexao().execute(
+            "SELECT * FROM jobs WHERE lote = ? ORDER BY criado_em, titulo", (lote,),
+        ).fetchall()
+        return [_como_dict(linha) for linha in linhas]
+
+    def limpar(self, dias=DIAS_RETENCAO, pasta_entradas=PASTA_ENTRADAS):
+        """Apaga jobs finalizados mais velhos que `dias` e as planilhas de entrada que não servem mais."""
+        limite = time.time() - dias * 86400
+        with self._conexao() as conn:
+            conn.execute(
+                f"DELETE FROM jobs WHERE atualizado_em < ? AND estado IN ({', '.join('?' * len(FINALIZADOS))})",
+                (limite, *FINALIZADOS),
+            )
+        self.limpar_entradas(pasta_entradas)
+
+    def limpar_entradas(self, pasta_entradas=PASTA_ENTRADAS, carencia=CARENCIA_ENTRADAS):
+        """
+        Apaga as planilhas de entrada cujos jobs já terminaram todos. Uma entrada
+        reaproveitada depois disso (salvar_entrada renova o mtime) fica para o job novo.
+        Entradas sem nenhum job saem depois de `carencia` segundos.
+        """
+        if not os.path.isdir(pasta_entradas):
+            return
+        termino = {}  # entrada -> quando terminou o último job que a usa (None: algum ainda não terminou)
+        for linha in self._conexao().execute("SELECT parametros, estado, atualizado_em FROM jobs"):
+            for entrada in _entradas(json.loads(linha['parametros'])):
+                entrada = os.path.abspath(entrada)
+                if linha['estado'] not in FINALIZADOS:
+                    termino[entrada] = None
+                elif termino.get(entrada, 0) is not None:
+                    termino[entrada] = max(termino.get(entrada, 0), linha['atualizado_em'])
+
+        agora = time.time()
+        for arquivo in os.scandir(pasta_entradas):
+            caminho = os.path.abspath(arquivo.path)
+            try:
+                mtime = arquivo.stat().st_mtime
+                if caminho in termino:
+                    apagar = termino[caminho] is not None and mtime < termino[caminho]
+                else:
+                    apagar = mtime < agora - carencia
+                if apagar:
+                    os.remove(caminho)
+            except FileNotFoundError:
+                pass
+
+
+def _como_dict(linha):
+    job = dict(linha)
+    job['parametros'] = json.loads(job['parametros'])
+    job['tempos'] = json.loads(job['tempos']) if job['tempos'] else []
+    return job
+
+
+def _entradas(parametros):
+    """Planilhas de entrada de um job (o de geocodificação usa várias)."""
+    if 'entradas' in parametros:
+        return parametros['entradas']
+    return [parametros['entrada']] if parametros.get('entrada') else []
+
+
+def salvar_entrada(df, pasta=PASTA_ENTRADAS, chave=None):
+    """
+    Grava a planilha já carregada em Parquet para os workers lerem. Com `chave`
+    (a do conteúdo, do cache_planilhas), a mesma planilha enviada de novo, por
+    qualquer sessão, reaproveita o arquivo já gravado.
+    """
+    os.makedirs(pasta, exist_ok=True)
+    caminho = os.path.join(pasta, f"{chave or uuid.uuid4().hex}.parquet")
+    if chave and os.path.exists(caminho):
+        try:
+            os.utime(caminho)  # em uso de novo: limpar_entradas espera os próximos jobs
+            return caminho
+        except FileNotFoundError:
+            pass  # apagado pela limpeza agora mesmo: grava de novo
+    temporario = f"{caminho}.{uuid.uuid4().hex}.tmp"
+    df.to_parquet(temporario, index=False)
+    os.replace(temporario, caminho)
+    return caminho
+
+
+def salvar_por_cidade(df, pasta=PASTA_ENTRADAS, chave=None):
+    """
+    Separa a planilha por cidade (um groupby só) e grava uma entrada para cada.
+    Com `chave` (a da planilha), cada entrada é endereçada pela chave e pela cidade.
+    Retorna {cidade: caminho}; vazio se não houver a coluna 'Cidade Consumidor'.
+    """
+    if 'Cidade Consumidor' not in df.columns:
+        return {}
+    entradas = {}
+    for cidade, df_cidade in df.groupby('Cidade Consumidor', observed=True):
+        chave_cidade = hashlib.sha256(f"{chave}|{cidade}".encode('utf-8')).hexdigest()[:32] if chave else None
+        entradas[cidade] = salvar_entrada(df_cidade.reset_index(drop=True), pasta, chave_cidade)
+    return entradas
+
+
+def _geocodificar_entradas(parametros, progresso):
+    """Geocodifica numa leva só os pares (bairro, cidade) de todas as entradas; as coordenadas ficam no cache."""
+    from cubo import carregar_cubo, ler_parquet
+    from geocodificador import geocodificar_bairros
+
+    coluna_bairro, estado = parametros['coluna_bairro'], parametros['estado']
+    pares, cubos = [], []
+    for entrada in parametros['entradas']:
+        # O cubo fica pronto no cache para os jobs de mapa da mesma entrada
+        cubo = carregar_cubo(
+            os.path.splitext(os.path.basename(entrada))[0],
+            lambda entrada=entrada: ler_parquet(entrada, coluna_bairro),
+            coluna_bairro,
+        )
+        cubos.append(cubo)
+        pares_entrada = cubo.por('cidade', 'bairro').dropna()
+        pares += list(zip(pares_entrada['bairro'], pares_entrada['cidade']))
+    progresso("Geocodificando os bairros", 0.3)
+    coordenadas = geocodificar_bairros(pares, lambda bairro, cidade: f"{bairro}, {cidade}, {estado}")
+    _publicar_ao_vivo(cubos, coordenadas, progresso)
+    return sum(lat is not None for lat, _ in coordenadas.values())
+
+
+def _publicar_ao_vivo(cubos, coordenadas, progresso):
+    """Manda as contagens novas das cidades para as telas de despacho abertas (/ao-vivo)."""
+    from ao_vivo import agregados_padrao
+
+    progresso("Atualizando as telas ao vivo", 0.9)
+    try:
+        agregados = agregados_padrao()
+        mudancas = sum(agregados.publicar_cubo(cubo, coordenadas) for cubo in cubos)
+    except sqlite3.Error as e:
+        # As telas ao vivo são um extra: os mapas seguem mesmo sem elas
+        print(f"AVISO: não foi possível atualizar as contagens ao vivo: {e}")
+        return
+    print(f"{mudancas} contagens ao vivo atualizadas")
+
+
+def _gerar(tipo, parametros, progresso):
+    # Import aqui: o processo pai (Streamlit) não precisa carregar o folium só para enfileirar
+    from cubo import carregar_cubo, ler_parquet
+    from mc_geral import DIAS_GERAL, filtro_futuro, mapa
+    from mc_simple import SVOMaps, SVOMapsLote
+
+    if tipo == 'geocodificacao':
+        return _geocodificar_entradas(parametros, progresso)
+    entrada = parametros['entrada']
+    if tipo in ('dia', 'periodo'):
+        # Mapas por dia só precisam das contagens: o cubo da planilha é montado uma
+        # vez (o nome da entrada é a chave do conteúdo) e os jobs seguintes só recortam
+        cubo = carregar_cubo(
+            os.path.splitext(os.path.basename(entrada))[0],
+            lambda: ler_parquet(entrada, parametros['coluna_bairro']),
+            parametros['coluna_bairro'],
+        )
+    if tipo == 'dia':
+        return SVOMaps(
+            cubo, parametros['coluna_bairro'], parametros['cidade_estado'], parametros['mapa_html'],
+            parametros.get('data_filtro'), progresso=progresso,
+        )
+    if tipo == 'periodo':
+        resultado, _ = SVOMapsLote(
+            cubo, parametros['coluna_bairro'], parametros['cidade_estado'],
+            parametros['data_inicio'], parametros['data_fim'], parametros['incluir_sem_data'],
+            parametros['pasta'], progresso=progresso,
+        )
+        return resultado
+    # 'geral': janela de `dias` dias a partir de `inicio` (padrão: os próximos dias a partir de hoje)
+    inicio, dias = parametros.get('inicio'), parametros.get('dias', DIAS_GERAL)
+    df = pd.read_parquet(entrada)
+    filtrado = filtro_futuro(df, inicio, dias)
+    if filtrado is None or filtrado.empty:
+        return None
+    _, resultado = mapa(filtrado, progresso=progresso, pasta=parametros.get('pasta', PASTA_MAPAS),
+                        inicio=inicio, dias=dias)
+    return resultado
+
+
+def _iniciar_processo():
+    """Roda uma vez em cada processo do pool: carrega os módulos dos mapas e abre os caches de coordenadas."""
+    try:
+        import mc_geral, mc_simple  # noqa: F401
+        from gazetteer import gazetteer_padrao
+        from geo_cache import cache_padrao
+        from geocodificador import servico_padrao
+
+        cache_padrao()
+        servico_padrao()
+        gazetteer_padrao().aquecer()
+    except Exception as e:
+        # Um erro aqui quebraria o pool inteiro: o job que precisar disso falha sozinho depois
+        print(f"AVISO: não foi possível aquecer o processo de mapas: {e}")
+
+
+def executar_job(caminho_fila, id_job):
+    """Roda dentro do processo do pool: gera o mapa e grava cada etapa (e o tempo de cada uma) na fila."""
+    fila = FilaMapas(caminho_fila)
+    job = fila.obter(id_job)
+
+    def progresso(etapa, fracao):
+        fila.atualizar(id_job, etapa=etapa, progresso=fracao)
+
+    fila.atualizar(id_job, estado=EXECUTANDO, etapa='Lendo a planilha', progresso=0.05)
+    try:
+        with coletar() as tempos:
+            resultado = _gerar(job['tipo'], job['parametros'], progresso)
+    except Exception as e:
+        traceback.print_exc()
+        fila.atualizar(id_job, estado=ERRO, etapa='Falhou', erro=f"{type(e).__name__}: {e}", tempos=json.dumps(tempos))
+        fila.limpar_entradas(os.path.dirname(_entradas(job['parametros'])[0]))
+        return None
+
+    if job['tipo'] == 'geocodificacao':
+        etapa, resultado = f"{resultado} bairros geocodificados", None
+    else:
+        etapa = 'Mapa pronto' if resultado else 'Nenhum agendamento para este filtro'
+    fila.atualizar(id_job, estado=CONCLUIDO, etapa=etapa, progresso=1.0, resultado=resultado, tempos=json.dumps(tempos))
+    fila.limpar_entradas(os.path.dirname(_entradas(job['parametros'])[0]))
+    return resultado
+
+
+_fila_padrao = None
+_fila_padrao_lock = threading.Lock()
+
+
+def fila_padrao():
+    """Fila única do processo (o Streamlit a compartilha entre sessões e recarregamentos)."""
+    global _fila_padrao
+    with _fila_padrao_lock:
+        if _fila_padrao is None:
+            _fila_padrao = FilaMapas()
+        return _fila_padrao
@@ -0,0 +1,203 @@
+# Em gazetteer.py
+
+import argparse
+import csv
+import difflib
+import json
+import os
+import sqlite3
+import threading
+import unicodedata
+
+BASE_DIR = os.path.dirname(os.path.abspath(__file__))
+CAMINHO_GAZETTEER = os.environ.get('GAZETTEER_PATH', os.path.join(BASE_DIR, 'gazetteer.sqlite3'))
+
+# Similaridade mínima (0 a 1) para aceitar um nome aproximado
+CORTE_APROXIMADO = 0.85
+
+# Nomes de coluna aceitos nos arquivos de origem
+COLUNAS_BAIRRO = ('bairro', 'bairro consumidor', 'nome', 'name')
+COLUNAS_CIDADE = ('cidade', 'cidade consumidor', 'municipio', 'município', 'city')
+COLUNAS_LATITUDE = ('latitude', 'lat')
+COLUNAS_LONGITUDE = ('longitude', 'lon', 'lng')
+
+
+def normalizar_nome(texto):
+    """'  Jardim  América ' -> 'jardim america' (sem acento, sem caixa, espaços simples)."""
+    texto = unicodedata.normalize('NFKD', str(texto))
+    texto = ''.join(c for c in texto if not unicodedata.combining(c))
+    return ' '.join(texto.casefold().split())
+
+
+def _primeira_coluna(registro, candidatos):
+    chaves = {normalizar_nome(k): k for k in registro}
+    for candidato in candidatos:
+        chave = chaves.get(normalizar_nome(candidato))
+        if chave is not None and registro[chave] not in (None, ''):
+            return registro[chave]
+    return None
+
+
+def _centroide(geometria):
+    """Centroide de um Point, Polygon ou MultiPolygon GeoJSON (área ponderada)."""
+    tipo = geometria.get('type')
+    coords = geometria.get('coordinates')
+    if tipo == 'Point':
+        return coords[1], coords[0]
+    if tipo == 'Polygon':
+        aneis = [coords[0]]
+    elif tipo == 'MultiPolygon':
+        aneis = [poligono[0] for poligono in coords]
+    else:
+        return None
+
+    area_total = cx_total = cy_total = 0.0
+    for anel in aneis:
+        for (x0, y0), (x1, y1) in zip(anel, anel[1:] + anel[:1]):
+            cruz = x0 * y1 - x1 * y0
+            area_total += cruz
+            cx_total += (x0 + x1) * cruz
+            cy_total += (y0 + y1) * cruz
+    if area_total == 0:
+        pontos = [p for anel in aneis for p in anel]
+        return sum(p[1] for p in pontos) / len(pontos), sum(p[0] for p in pontos) / len(pontos)
+    area_total /= 2
+    return cy_total / (6 * area_total), cx_total / (6 * area_total)
+
+
+class Gazetteer:
+    """
+    Índice local de centroides de bairros por cidade.
+    Fica em disco como uma tabela SQLite (cidade, bairro) -> (lat, lon) com nomes já
+    normalizados; cada cidade é carregada em memória na primeira consulta.
+    """
+
+    def __init__(self, caminho=CAMINHO_GAZETTEER):
+        self.caminho = caminho
+        self._cidades = {}
+        self._lock = threading.Lock()
+
+    def _conectar(self):
+        conn = sqlite3.connect(self.caminho, timeout=30)
+        conn.execute("""
+            CREATE TABLE IF NOT EXISTS bairros (
+                cidade TEXT NOT NULL,
+                bairro TEXT NOT NULL,
+                latitude REAL NOT NULL,
+                longitude REAL NOT NULL,
+                PRIMARY KEY (cidade, bairro)
+            ) WITHOUT ROWID
+        """)
+        return conn
+
+    def _bairros_da_cidade(self, cidade):
+        cidade = normalizar_nome(cidade)
+        with self._lock:
+            if cidade not in self._cidades:
+                if not os.path.exists(self.caminho):
+                    self._cidades[cidade] = {}
+                else:
+                    conn = self._conectar()
+                    try:
+                        linhas = conn.execute(
+                            "SELECT bairro, latitude, longitude FROM bairros WHERE cidade = ?", (cidade,)
+                        ).fetchall()
+                    finally:
+                        conn.close()
+                    self._cidades[cidade] = {bairro: (lat, lon) for bairro, lat, lon in linhas}
+            return self._cidades[cidade]
+
+    def aquecer(self):
+        """Carrega todas as cidades do índice de uma vez (em vez de cada uma na primeira consulta)."""
+        if not os.path.exists(self.caminho):
+            return 0
+        conn = self._conectar()
+        try:
+            cidades = [cidade for (cidade,) in conn.execute("SELECT DISTINCT cidade FROM bairros")]
+        finally:
+            conn.close()
+        for cidade in cidades:
+            self._bairros_da_cidade(cidade)
+        return len(cidades)
+
+    def localizar(self, bairro, cidade):
+        """Retorna (lat, lon) do bairro ou None. Tenta o nome exato e depois o mais parecido."""
+        bairros = self._bairros_da_cidade(cidade)
+        if not bairros:
+            return None
+        nome = normalizar_nome(bairro)
+        if nome in bairros:
+            return bairros[nome]
+        parecidos = difflib.get_close_matches(nome, bairros.keys(), n=1, cutoff=CORTE_APROXIMADO)
+        return bairros[parecidos[0]] if parecidos else None
+
+    def gravar(self, registros):
+        """Grava registros (bairro, cidade, lat, lon) no índice, substituindo os existentes."""
+        linhas = [
+            (normalizar_nome(cidade), normalizar_nome(bairro), float(lat), float(lon))
+            for bairro, cidade, lat, lon in registros
+        ]
+        conn = self._conectar()
+        try:
+            with conn:
+                conn.executemany("INSERT OR REPLACE INTO bairros VALUES (?, ?, ?, ?)", linhas)
+        finally:
+            conn.close()
+        with self._lock:
+            self._cidades.clear()
+        return len(linhas)
+
+    def importar_csv(self, caminho, cidade=None):
+        """CSV com colunas bairro, cidade, latitude, longitude (cidade pode vir por parâmetro)."""
+        registros = []
+        with open(caminho, 'r', encoding='utf-8-sig', newline='') as f:
+            for linha in csv.DictReader(f):
+                bairro = _primeira_coluna(linha, COLUNAS_BAIRRO)
+                cidade_linha = cidade or _primeira_coluna(linha, COLUNAS_CIDADE)
+                lat = _primeira_coluna(linha, COLUNAS_LATITUDE)
+                lon = _primeira_coluna(linha, COLUNAS_LONGITUDE)
+                if bairro and cidade_linha and lat and lon:
+                    registros.append((bairro, cidade_linha, lat, lon))
+        return self.gravar(registros)
+
+    def importar_geojson(self, caminho, cidade=None):
+        """FeatureCollection de pontos ou polígonos de bairros; polígonos viram centroides."""
+        with open(caminho, 'r', encoding='utf-8') as f:
+            dados = json.load(f)
+        registros = []
+        for feature in dados.get('features', []):
+            propriedades = feature.get('properties') or {}
+            bairro = _primeira_coluna(propriedades, COLUNAS_BAIRRO)
+            cidade_feature = cidade or _primeira_coluna(propriedades, COLUNAS_CIDADE)
+            centro = _centroide(feature.get('geometry') or {})
+            if bairro and cidade_feature and centro:
+                registros.append((bairro, cidade_feature, centro[0], centro[1]))
+        return self.gravar(registros)
+
+    def importar(self, caminho, cidade=None):
+        if caminho.lower().endswith(('.geojson', '.json')):
+            return self.importar_geojson(caminho, cidade)
+        return self.importar_csv(caminho, cidade)
+
+
+_gazetteer_padrao = None
+_gazetteer_padrao_lock = threading.Lock()
+
+
+def gazetteer_padrao():
+    global _gazetteer_padrao
+    with _gazetteer_padrao_lock:
+        if _gazetteer_padrao is None:
+            _gazetteer_padrao = Gazetteer()
+        return _gazetteer_padrao
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Importa centroides de bairros para o gazetteer local.")
+    parser.add_argument('arquivos', nargs='+', help="Arquivos .csv ou .geojson")
+    parser.add_argument('--cidade', help="Cidade de todos os bairros do arquivo, se não houver coluna de cidade")
+    args = parser.parse_args()
+
+    gazetteer = gazetteer_padrao()
+    for arquivo in args.arquivos:
+        print(f"{gazetteer.importar(arquivo, args.cidade)} bairros importados de {arquivo}")
@@ -0,0 +1,164 @@
+# Em geo_cache.py
+
+import argparse
+import json
+import os
+import sqlite3
+import threading
+import time
+
+BASE_DIR = os.path.dirname(os.path.abspath(__file__))
+CAMINHO_CACHE = os.environ.get('GEO_CACHE_PATH', os.path.join(BASE_DIR, 'geo_cache.sqlite3'))
+
+# SQLite limita a quantidade de parâmetros por consulta; buscamos em blocos
+TAMANHO_BLOCO = 500
+
+
+def chave_endereco(bairro, cidade):
+    """Chave canônica de um bairro no cache: 'bairro|cidade' sem espaços extras e sem caixa."""
+    return f"{str(bairro).strip().casefold()}|{str(cidade).strip().casefold()}"
+
+
+class GeoCache:
+    """
+    Cache persistente de coordenadas em SQLite (modo WAL).
+    Pode ser usado por várias sessões do Streamlit ao mesmo tempo: cada thread
+    tem a sua conexão e as gravações são upserts atômicos.
+    Endereços não encontrados ficam gravados com latitude/longitude nulas.
+    """
+
+    def __init__(self, caminho=CAMINHO_CACHE):
+        self.caminho = caminho
+        self._local = threading.local()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        pasta = os.path.dirname(os.path.abspath(caminho))
+        os.makedirs(pasta, exist_ok=True)
+        with self._conexao() as conn:
+            conn.execute("""
+                CREATE TABLE IF NOT EXISTS geocache (
+                    chave TEXT PRIMARY KEY,
+                    latitude REAL,
+                    longitude REAL,
+                    atualizado_em REAL NOT NULL
+                )
+            """)
+
+    def _conexao(self):
+        conn = getattr(self._local, 'conn', None)
+        if conn is None:
+            conn = sqlite3.connect(self.caminho, timeout=30)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            self._local.conn = conn
+        return conn
+
+    def buscar_varios(self, chaves):
+        """Retorna {chave: (lat, lon)} apenas para as chaves que já estão no cache."""
+        chaves = list(dict.fromkeys(chaves))
+        encontrados = {}
+        conn = self._conexao()
+        for i in range(0, len(chaves), TAMANHO_BLOCO):
+            bloco = chaves[i:i + TAMANHO_BLOCO]
+            marcadores = ','.join('?' * len(bloco))
+            cursor = conn.execute(
+                f"SELECT chave, latitude, longitude FROM geocache WHERE chave IN ({marcadores})", bloco
+            )
+            for chave, lat, lon in cursor:
+                encontrados[chave] = (lat, lon)
+        with self._lock:
+            self.hits += len(encontrados)
+            self.misses += len(chaves) - len(encontrados)
+        return encontrados
+
+    def buscar(self, chave):
+        return self.buscar_varios([chave]).get(chave)
+
+    def gravar_varios(self, itens):
+        """Grava {chave: (lat, lon)} numa única transação (insert ou update)."""
+        agora = time.time()
+        linhas = [(chave, lat, lon, agora) for chave, (lat, lon) in itens.items()]
+        if not linhas:
+            return
+        with self._conexao() as conn:
+            conn.executemany("""
+                INSERT INTO geocache (chave, latitude, longitude, atualizado_em)
+                VALUES (?, ?, ?, ?)
+                ON CONFLICT(chave) DO UPDATE SET
+                    latitude = excluded.latitude,
+                    longitude = excluded.longitude,
+                    atualizado_em = excluded.atualizado_em
+            """, linhas)
+
+    def gravar(self, chave, latitude, longitude):
+        self.gravar_varios({chave: (latitude, longitude)})
+
+    def estatisticas(self):
+        total = self._conexao().execute("SELECT COUNT(*) FROM geocache").fetchone()[0]
+        with self._lock:
+            consultas = self.hits + self.misses
+            return {
+                'entradas': total,
+                'hits': self.hits,
+                'misses': self.misses,
+                'taxa_acerto': self.hits / consultas if consultas else 0.0,
+            }
+
+
+_cache_padrao = None
+_cache_padrao_lock = threading.Lock()
+
+
+def cache_padrao():
+    """Instância única do cache para o processo (compartilhada entre sessões)."""
+    global _cache_padrao
+    with _cache_padrao_lock:
+        if _cache_padrao is None:
+            _cache_padrao = GeoCache()
+        return _cache_padrao
+
+
+# --- Aquecimento offline do cache ---
+def importar_json_legado(caminho_json, cache=None):
+    """Importa o antigo 'location_cache.json' ('Bairro, Cidade, São Paulo, Brazil' -> [lat, lon])."""
+    cache = cache or cache_padrao()
+    with open(caminho_json, 'r', encoding='utf-8') as f:
+        conteudo = f.read().strip()
+    dados = json.loads(conteudo) if conteudo else {}
+    itens = {}
+    for endereco, (lat, lon) in dados.items():
+        partes = [p.strip() for p in endereco.split(',')]
+        if len(partes) >= 2:
+            itens[chave_endereco(partes[0], partes[1])] = (lat, lon)
+    cache.gravar_varios(itens)
+    return len(itens)
+
+
+def aquecer_com_planilhas(caminhos, cache=None):
+    """Geocodifica antecipadamente todos os bairros das planilhas informadas."""
+    import pandas as pd
+    from geocodificador import servico_padrao
+
+    cache = cache or cache_padrao()
+    pares = []
+    for caminho in caminhos:
+        df = pd.read_excel(caminho, usecols=['Bairro Consumidor', 'Cidade Consumidor'])
+        df = df.dropna().drop_duplicates()
+        pares.extend(zip(df['Bairro Consumidor'], df['Cidade Consumidor']))
+    resultado = servico_padrao().resolver_bairros(pares, lambda b, c: f"{b}, {c}, SP", cache=cache)
+    return len(resultado)
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Aquece o cache de geocodificação offline.")
+    parser.add_argument('--json', help="Arquivo location_cache.json antigo para importar")
+    parser.add_argument('planilhas', nargs='*', help="Planilhas .xlsx cujos bairros serão geocodificados")
+    args = parser.parse_args()
+
+    cache = cache_padrao()
+    if args.json:
+        print(f"{importar_json_legado(args.json, cache)} endereços importados de {args.json}")
+    if args.planilhas:
+        print(f"{aquecer_com_planilhas(args.planilhas, cache)} bairros resolvidos")
+    print(cache.estatisticas())
@@ -0,0 +1,251 @@
+# Em geocodificador.py
+
+import asyncio
+import os
+import sqlite3
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, wait
+from functools import partial
+
+from geopy.adapters import RequestsAdapter
+from geopy.exc import GeocoderRateLimited, GeocoderTimedOut, GeocoderUnavailable
+from geopy.geocoders import Nominatim
+
+from gazetteer import gazetteer_padrao
+from geo_cache import CAMINHO_CACHE, cache_padrao, chave_endereco
+from metricas import contar, medir
+
+# Configuração do provedor (pode apontar para um Nominatim local/falso em testes)
+NOMINATIM_DOMAIN = os.environ.get('NOMINATIM_DOMAIN', 'nominatim.openstreetmap.org')
+NOMINATIM_SCHEME = os.environ.get('NOMINATIM_SCHEME', 'https')
+# Limite do provedor em requisições por segundo (a política do Nominatim público é 1/s)
+TAXA_MAXIMA = float(os.environ.get('NOMINATIM_TAXA', '1'))
+# Requisições simultâneas: esconde a latência da rede sem passar da taxa máxima
+MAX_PARALELO = int(os.environ.get('NOMINATIM_PARALELO', '4'))
+USER_AGENT = 'HeatMap'
+TENTATIVAS = 2
+ESPERA_ERRO = 5
+
+
+class LimitadorTokens:
+    """
+    Token bucket thread-safe. Com capacidade 1, nenhuma janela de T segundos
+    recebe mais do que 1 + taxa * T requisições.
+    """
+
+    def __init__(self, taxa, capacidade=1):
+        self.taxa = taxa
+        self.capacidade = capacidade
+        self._tokens = capacidade
+        self._ultimo = time.monotonic()
+        self._lock = threading.Lock()
+
+    def adquirir(self):
+        while True:
+            with self._lock:
+                agora = time.monotonic()
+                self._tokens = min(self.capacidade, self._tokens + (agora - self._ultimo) * self.taxa)
+                self._ultimo = agora
+                if self._tokens >= 1:
+                    self._tokens -= 1
+                    return
+                espera = (1 - self._tokens) / self.taxa
+            time.sleep(espera)
+
+
+class LimitadorCompartilhado:
+    """
+    O mesmo token bucket, mas com o estado numa tabela SQLite (no arquivo do cache
+    de coordenadas): vale para todos os processos que usam o arquivo, como os
+    workers da fila de mapas, e não só para as threads deste processo.
+    """
+
+    def __init__(self, taxa, caminho=CAMINHO_CACHE, nome='nominatim', capacidade=1):
+        self.taxa = taxa
+        self.caminho = caminho
+        self.nome = nome
+        self.capacidade = capacidade
+        self._local = threading.local()
+        os.makedirs(os.path.dirname(os.path.abspath(caminho)), exist_ok=True)
+        self._conexao().execute("""
+            CREATE TABLE IF NOT EXISTS limitador (
+                nome TEXT PRIMARY KEY,
+                tokens REAL NOT NULL,
+                ultimo REAL NOT NULL
+            )
+        """)
+
+    def _conexao(self):
+        conn = getattr(self._local, 'conn', None)
+        if conn is None:
+            conn = sqlite3.connect(self.caminho, timeout=30, isolation_level=None)
+            conn.execute("PRAGMA journal_mode=WAL")
+            self._local.conn = conn
+        return conn
+
+    def adquirir(self):
+        conn = self._conexao()
+        while True:
+            conn.execute("BEGIN IMMEDIATE")  # um processo por vez lê e atualiza o balde
+            try:
+                linha = conn.execute("SELECT tokens, ultimo FROM limitador WHERE nome = ?", (self.nome,)).fetchone()
+                agora = time.time()
+                tokens, ultimo = linha if linha else (self.capacidade, agora)
+                tokens = min(self.capacidade, tokens + max(agora - ultimo, 0) * self.taxa)
+                espera = 0 if tokens >= 1 else (1 - tokens) / self.taxa
+                if not espera:
+                    tokens -= 1
+                conn.execute(
+                    "INSERT INTO limitador (nome, tokens, ultimo) VALUES (?, ?, ?) "
+                    "ON CONFLICT(nome) DO UPDATE SET tokens = excluded.tokens, ultimo = excluded.ultimo",
+                    (self.nome, tokens, agora),
+                )
+                conn.execute("COMMIT")
+            except BaseException:
+                conn.execute("ROLLBACK")
+                raise
+            if not espera:
+                return
+            time.sleep(espera)
+
+
+class ServicoGeocodificacao:
+    """
+    Camada única de geocodificação do processo:
+    - um limitador de taxa compartilhado por todas as sessões, threads e processos;
+    - deduplicação de consultas em andamento (mesmo endereço = uma só requisição);
+    - conexões HTTP reaproveitadas (pool do requests);
+    - API em lote, síncrona ou asyncio.
+    """
+
+    def __init__(self, domain=NOMINATIM_DOMAIN, scheme=NOMINATIM_SCHEME, taxa=TAXA_MAXIMA,
+                 max_paralelo=MAX_PARALELO, timeout=10, limitador=None):
+        self.limitador = limitador or LimitadorCompartilhado(taxa)
+        self.geolocator = Nominatim(
+            user_agent=USER_AGENT,
+            domain=domain,
+            scheme=scheme,
+            timeout=timeout,
+            adapter_factory=partial(RequestsAdapter, pool_connections=1, pool_maxsize=max_paralelo),
+        )
+        self._executor = ThreadPoolExecutor(max_workers=max_paralelo, thread_name_prefix='geocode')
+        self._em_andamento = {}
+        self._lock = threading.Lock()
+        self.requisicoes = 0
+
+    def _consultar(self, consulta):
+        for tentativa in range(TENTATIVAS + 1):
+            self.limitador.adquirir()
+            with self._lock:
+                self.requisicoes += 1
+            try:
+                return self.geolocator.geocode(consulta)
+            except (GeocoderTimedOut, GeocoderUnavailable, GeocoderRateLimited):
+                if tentativa == TENTATIVAS:
+                    raise
+                time.sleep(ESPERA_ERRO)
+
+    def _liberar(self, consulta, futuro):
+        with self._lock:
+            if self._em_andamento.get(consulta) is futuro:
+                del self._em_andamento[consulta]
+
+    def geocodificar(self, consulta):
+        """Agenda a consulta e devolve um Future; chamadas repetidas em andamento compartilham o mesmo."""
+        with self._lock:
+            futuro = self._em_andamento.get(consulta)
+            novo = futuro is None
+            if novo:
+                futuro = self._executor.submit(self._consultar, consulta)
+                self._em_andamento[consulta] = futuro
+        if novo:
+            futuro.add_done_callback(partial(self._liberar, consulta))
+        return futuro
+
+    def geocodificar_lote(self, consultas):
+        """Retorna {consulta: Location | None | Exception}, bloqueando até todas terminarem."""
+        futuros = {consulta: self.geocodificar(consulta) for consulta in dict.fromkeys(consultas)}
+        wait(futuros.values())
+        return {consulta: futuro.exception() or futuro.result() for consulta, futuro in futuros.items()}
+
+    async def geocodificar_lote_async(self, consultas):
+        """Versão asyncio de `geocodificar_lote`."""
+        consultas = list(dict.fromkeys(consultas))
+        resultados = await asyncio.gather(
+            *(asyncio.wrap_future(self.geocodificar(consulta)) for consulta in consultas),
+            return_exceptions=True,
+        )
+        return dict(zip(consultas, resultados))
+
+    def resolver_bairros(self, pares, montar_consulta, cache=None, gazetteer=None):
+        """
+        Resolve coordenadas para pares (bairro, cidade) únicos.
+        Ordem: gazetteer local, cache persistente e só então a rede (em lote).
+        Retorna {(bairro, cidade): (lat, lon)}; (None, None) quando não encontrado.
+        """
+        cache = cache or cache_padrao()
+        gazetteer = gazetteer or gazetteer_padrao()
+        pares = list(dict.fromkeys(pares))
+
+        resultado = {}
+        for par in pares:
+            centro = gazetteer.localizar(*par)
+            if centro is not None:
+                resultado[par] = centro
+        faltantes = [par for par in pares if par not in resultado]
+
+        chaves = {par: chave_endereco(*par) for par in faltantes}
+        encontrados = cache.buscar_varios(chaves.values())
+        for par in faltantes:
+            if chaves[par] in encontrados:
+                resultado[par] = encontrados[chaves[par]]
+
+        consultas = {par: montar_consulta(*par) for par in faltantes if par not in resultado}
+        with medir('geocodificador', 'nominatim'):
+            respostas = self.geocodificar_lote(consultas.values())
+
+        novos = {}
+        erros = 0
+        for par, consulta in consultas.items():
+            location = respostas[consulta]
+            if isinstance(location, Exception):
+                # Erros de conexão não vão para o cache, para tentarmos de novo na próxima vez
+                print(f" -> ERRO de conexão ao buscar '{consulta}': {location}")
+                resultado[par] = (None, None)
+                erros += 1
+                continue
+            if location:
+                coordenadas = (location.latitude, location.longitude)
+                print(f"[ + ] Encontrado: {consulta} -> ({location.latitude:.4f}, {location.longitude:.4f})")
+            else:
+                coordenadas = (None, None)
+                print(f" -> Localização não encontrada para '{consulta}'.")
+            resultado[par] = coordenadas
+            novos[chaves[par]] = coordenadas
+
+        cache.gravar_varios(novos)
+        contar('geocodificacoes_total', len(pares) - len(faltantes), origem='gazetteer')
+        contar('geocodificacoes_total', len(encontrados), origem='cache')
+        contar('geocodificacoes_total', len(consultas) - erros, origem='rede')
+        contar('geocodificacoes_total', erros, origem='erro')
+        print(f"Geocodificação: {len(pares) - len(faltantes)} do gazetteer, "
+              f"{len(encontrados)} do cache, {len(consultas)} consultados na rede.")
+        return resultado
+
+
+_servico_padrao = None
+_servico_padrao_lock = threading.Lock()
+
+
+def servico_padrao():
+    """Instância única do serviço para o processo (compartilhada entre sessões)."""
+    global _servico_padrao
+    with _servico_padrao_lock:
+        if _servico_padrao is None:
+            _servico_padrao = ServicoGeocodificacao()
+        return _servico_padrao
+
+
+def geocodificar_bairros(pares, montar_consulta):
+    return servico_padrao().resolver_bairros(pares, montar_consulta)
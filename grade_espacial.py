@@ -0,0 +1,166 @@
+# Em grade_espacial.py
+# Agrega pontos (lat, lon, peso) em células de uma grade quadrada ou hexagonal,
+# de forma vetorizada, em vários tamanhos de célula. Cada tamanho vira um "nível"
+# do mapa de calor com um zoom mínimo; o navegador troca de nível ao dar zoom.
+# Assim o mapa de calor recebe no máximo LIMITE_PONTOS_CALOR pontos por nível,
+# qualquer que seja o tamanho da planilha.
+
+import math
+import os
+
+import numpy as np
+
+from camada_marcadores import CASAS_DECIMAIS
+
+FORMA_PADRAO = os.environ.get('MAPA_GRADE', 'hexagonal')  # 'hexagonal' ou 'quadrada'
+LIMITE_PONTOS_CALOR = int(os.environ.get('MAPA_LIMITE_CALOR', '2000'))
+TAMANHOS_CELULA_M = (8000, 4000, 2000, 1000, 500, 250)  # do mais grosso ao mais fino
+PIXELS_POR_CELULA = 10  # a célula de um nível deve ocupar ao menos isso na tela
+
+METROS_POR_GRAU = 111320.0
+METROS_POR_PIXEL_ZOOM_0 = 156543.03  # Web Mercator, no equador
+RAIZ_3 = math.sqrt(3)
+
+
+def _projetar(lat, lon, lat_ref):
+    """Lat/lon -> metros num plano local (equiretangular em torno de `lat_ref`)."""
+    return lon * math.cos(math.radians(lat_ref)) * METROS_POR_GRAU, lat * METROS_POR_GRAU
+
+
+def _celulas_quadradas(x, y, tamanho):
+    return np.floor(x / tamanho).astype('int64'), np.floor(y / tamanho).astype('int64')
+
+
+def _celulas_hexagonais(x, y, tamanho):
+    """Coordenadas axiais (q, r) de hexágonos com `tamanho` metros entre centros vizinhos."""
+    raio = tamanho / RAIZ_3
+    q = (RAIZ_3 / 3 * x - y / 3) / raio
+    r = (2 / 3 * y) / raio
+    s = -q - r
+    rq, rr, rs = np.round(q), np.round(r), np.round(s)
+    dq, dr, ds = np.abs(rq - q), np.abs(rr - r), np.abs(rs - s)
+    corrige_q = (dq > dr) & (dq > ds)
+    corrige_r = ~corrige_q & (dr > ds)
+    rq = np.where(corrige_q, -rr - rs, rq)
+    rr = np.where(corrige_r, -rq - rs, rr)
+    return rq.astype('int64'), rr.astype('int64')
+
+
+def agregar_em_celulas(lat, lon, peso=None, tamanho_m=1000, forma=FORMA_PADRAO, grupo=None, lat_ref=None):
+    """
+    Soma o `peso` (1 por ponto, se omitido) dos pontos que caem em cada célula.
+    `grupo` (inteiros, ex.: índice do dia) separa as contagens sem mudar a grade,
+    para que as células de dias diferentes coincidam.
+    Retorna (grupo, lat, lon, soma) por célula; a posição é o centroide ponderado
+    dos pontos da célula, o que evita o "serrilhado" da grade no mapa de calor.
+    """
+    lat = np.asarray(lat, dtype='float64')
+    lon = np.asarray(lon, dtype='float64')
+    peso = np.ones(len(lat)) if peso is None else np.asarray(peso, dtype='float64')
+    grupo = np.zeros(len(lat), dtype='int64') if grupo is None else np.asarray(grupo, dtype='int64')
+    if len(lat) == 0:
+        vazio = np.empty(0)
+        return grupo[:0], vazio, vazio, vazio
+
+    lat_ref = float(np.mean(lat)) if lat_ref is None else lat_ref
+    x, y = _projetar(lat, lon, lat_ref)
+    if forma == 'quadrada':
+        a, b = _celulas_quadradas(x, y, tamanho_m)
+    elif forma == 'hexagonal':
+        a, b = _celulas_hexagonais(x, y, tamanho_m)
+    else:
+        raise ValueError(f"Forma de grade desconhecida: {forma!r} (use 'hexagonal' ou 'quadrada')")
+
+    # (grupo, a, b) numa chave int64 só: np.unique em 1D é bem mais rápido que por linhas
+    a, b = a - a.min(), b - b.min()
+    largura_a, largura_b = int(a.max()) + 1, int(b.max()) + 1
+    chave = (grupo * largura_a + a) * largura_b + b
+    celulas, indice = np.unique(chave, return_inverse=True)
+    soma = np.bincount(indice, weights=peso, minlength=len(celulas))
+    # Centroide ponderado pelo peso (média simples se o peso total da célula for zero)
+    pesos_posicao = np.where(soma[indice] > 0, peso, 1.0)
+    divisor = np.bincount(indice, weights=pesos_posicao, minlength=len(celulas))
+    lat_c = np.bincount(indice, weights=lat * pesos_posicao, minlength=len(celulas)) / divisor
+    lon_c = np.bincount(indice, weights=lon * pesos_posicao, minlength=len(celulas)) / divisor
+    return celulas // (largura_a * largura_b), lat_c, lon_c, soma
+
+
+def zoom_minimo(tamanho_m, lat_ref):
+    """Menor zoom do Leaflet em que uma célula de `tamanho_m` ocupa PIXELS_POR_CELULA pixels."""
+    metros_por_pixel_0 = METROS_POR_PIXEL_ZOOM_0 * math.cos(math.radians(lat_ref))
+    return max(0, math.ceil(math.log2(PIXELS_POR_CELULA * metros_por_pixel_0 / tamanho_m)))
+
+
+def _pontos(lat, lon, soma):
+    return np.column_stack([
+        np.round(lat, CASAS_DECIMAIS), np.round(lon, CASAS_DECIMAIS), soma,
+    ]).tolist()
+
+
+def _tamanhos(maior_nivel, limite, calcular):
+    """
+    Percorre os tamanhos de célula do mais grosso ao mais fino, guardando os que
+    respeitam `limite` e separam mais células que o nível anterior.
+    Se nem o mais grosso couber, dobra o tamanho até caber.
+    """
+    niveis = []
+    tamanho = TAMANHOS_CELULA_M[0]
+    resultado = calcular(tamanho)
+    while maior_nivel(resultado) > limite:
+        tamanho *= 2
+        resultado = calcular(tamanho)
+    niveis.append((tamanho, resultado))
+    for tamanho in TAMANHOS_CELULA_M[1:]:
+        resultado = calcular(tamanho)
+        if maior_nivel(resultado) > limite:
+            break
+        if len(resultado[3]) > len(niveis[-1][1][3]):
+            niveis.append((tamanho, resultado))
+    return niveis
+
+
+def niveis_calor(lat, lon, peso=None, limite=LIMITE_PONTOS_CALOR, forma=FORMA_PADRAO):
+    """
+    Níveis para o HeatMap: [{'zoom': z, 'pontos': [[lat, lon, soma], ...]}, ...],
+    em ordem crescente de zoom, cada um com no máximo `limite` pontos.
+    """
+    lat = np.asarray(lat, dtype='float64')
+    if len(lat) == 0:
+        return [{'zoom': 0, 'pontos': []}]
+    lat_ref = float(np.mean(lat))
+    niveis = _tamanhos(
+        lambda r: len(r[3]), limite,
+        lambda tamanho: agregar_em_celulas(lat, lon, peso, tamanho, forma, lat_ref=lat_ref),
+    )
+    return [
+        {'zoom': 0 if i == 0 else zoom_minimo(tamanho, lat_ref), 'pontos': _pontos(*r[1:])}
+        for i, (tamanho, r) in enumerate(niveis)
+    ]
+
+
+def niveis_calor_por_dia(dia, n_dias, lat, lon, peso=None, limite=LIMITE_PONTOS_CALOR, forma=FORMA_PADRAO):
+    """
+    Níveis para o HeatMapWithTime: [{'zoom': z, 'pontos': [pontos_dia_0, ...]}, ...].
+    `dia` é o índice (0..n_dias-1) de cada ponto; todos os dias usam a mesma grade
+    e cada dia tem no máximo `limite` pontos por nível.
+    """
+    lat = np.asarray(lat, dtype='float64')
+    if len(lat) == 0:
+        return [{'zoom': 0, 'pontos': [[] for _ in range(n_dias)]}]
+    lat_ref = float(np.mean(lat))
+    maior_dia = lambda r: int(np.bincount(r[0], minlength=n_dias).max())
+    niveis = _tamanhos(
+        maior_dia, limite,
+        lambda tamanho: agregar_em_celulas(lat, lon, peso, tamanho, forma, grupo=dia, lat_ref=lat_ref),
+    )
+
+    resultado = []
+    for i, (tamanho, (grupo, lat_c, lon_c, soma)) in enumerate(niveis):
+        ordem = np.argsort(grupo, kind='stable')
+        cortes = np.searchsorted(grupo[ordem], np.arange(n_dias + 1))
+        pontos = _pontos(lat_c[ordem], lon_c[ordem], soma[ordem])
+        resultado.append({
+            'zoom': 0 if i == 0 else zoom_minimo(tamanho, lat_ref),
+            'pontos': [pontos[cortes[d]:cortes[d + 1]] for d in range(n_dias)],
+        })
+    return resultado
@@ -0,0 +1,13 @@
+# Em gunicorn.conf.py
+# Servidor dos mapas em produção: gunicorn -c gunicorn.conf.py mc_webapp:app
+
+import multiprocessing
+import os
+
+bind = os.environ.get('MAPAS_BIND', '0.0.0.0:5000')
+workers = int(os.environ.get('WEB_CONCURRENCY', min(multiprocessing.cpu_count() * 2 + 1, 8)))
+threads = int(os.environ.get('MAPAS_THREADS', '4'))  # arquivos grandes não prendem o worker inteiro
+# Streams das telas ao vivo: no máximo AO_VIVO_MAX_STREAMS destas threads por worker (mc_webapp)
+worker_class = 'gthread'
+keepalive = 5
+accesslog = '-'
@@ -1,8 +1,7 @@
 # Em Home.py
 
 import streamlit as st
-from analyzer_app import run_analyzer_app
-from mapper_app import run_mapper_app
+from aquecimento import iniciar_aquecimento
 
 # --- Configuração da Página ---
 st.set_page_config(
@@ -10,6 +9,12 @@ st.set_page_config(
     layout="wide"
 )
 
+# As ferramentas só são importadas quando abertas; enquanto isso, o aquecimento
+# (uma vez por processo) as carrega em segundo plano. Os processos da fila de
+# mapas (spawn) reexecutam este script como __mp_main__: neles, não aquece
+if __name__ == '__main__':
+    iniciar_aquecimento()
+
 # --- Controle de Navegação ---
 if 'app_mode' not in st.session_state:
     st.session_state.app_mode = 'home'
@@ -40,9 +45,11 @@ if st.session_state.app_mode == 'home':
 elif st.session_state.app_mode == 'analyzer':
     create_back_button()
     st.markdown("---")
+    from analyzer_app import run_analyzer_app
     run_analyzer_app()
 
 elif st.session_state.app_mode == 'mapper':
     create_back_button()
     st.markdown("---")
+    from mapper_app import run_mapper_app
     run_mapper_app()
\ No newline at end of file
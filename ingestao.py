@@ -0,0 +1,207 @@
+# Em ingestao.py
+
+import io
+import os
+
+import numpy as np
+import pandas as pd
+
+try:
+    import python_calamine  # noqa: F401  (leitor em Rust, bem mais rápido que o openpyxl)
+    CALAMINE_DISPONIVEL = True
+except ImportError:
+    CALAMINE_DISPONIVEL = False
+
+# Únicas colunas usadas pelo analisador e pelos mapas
+COLUNAS_SVO = ['SVO', 'Status da OS', 'Agendado para', 'Cidade Consumidor', 'Bairro Consumidor']
+COLUNAS_DATA = ['Agendado para']
+COLUNAS_CATEGORIA = ['Status da OS', 'Cidade Consumidor', 'Bairro Consumidor']
+# SVOs fora do padrão 'SVO-<número>' guardam aqui o texto original (ver converter_tipos)
+COLUNA_SVO_ORIGINAL = 'SVO original'
+_SVO_CANONICA = r'SVO-(?:0|[1-9][0-9]{0,17})'  # até 18 dígitos: cabe em int64
+# Muda sempre que o esquema normalizado (converter_tipos) muda: invalida o cache de planilhas
+VERSAO_ESQUEMA = 3
+# 'calamine' é bem mais rápido; 'openpyxl' (streaming) usa bem menos memória
+BACKEND_PADRAO = os.environ.get('INGESTAO_BACKEND') or ('calamine' if CALAMINE_DISPONIVEL else 'openpyxl')
+
+
+def _como_arquivo(origem):
+    """openpyxl e pandas aceitam caminho ou arquivo binário; bytes viram BytesIO."""
+    if isinstance(origem, (bytes, bytearray, memoryview)):
+        return io.BytesIO(origem)
+    if hasattr(origem, 'seek'):
+        origem.seek(0)
+    return origem
+
+
+def _blocos_openpyxl(origem, colunas, tamanho_bloco=None):
+    """
+    Lê a primeira aba em modo streaming, guardando só as colunas pedidas.
+    Gera DataFrames de até `tamanho_bloco` linhas (None = um único bloco).
+    """
+    # Import aqui: o openpyxl é pesado e só é preciso quando uma planilha é lida por ele
+    from openpyxl import load_workbook
+
+    wb = load_workbook(_como_arquivo(origem), read_only=True, data_only=True)
+    try:
+        linhas = wb.worksheets[0].iter_rows(values_only=True)
+        cabecalho = next(linhas, ())
+        nomes = [str(c).strip() if c is not None else '' for c in cabecalho]
+        if colunas is None:
+            indices = {nome: i for i, nome in enumerate(nomes) if nome}
+        else:
+            indices = {nome: nomes.index(nome) for nome in colunas if nome in nomes}
+
+        valores = {nome: [] for nome in indices}
+        quantidade = 0
+        largura = len(nomes)
+        for linha in linhas:
+            if len(linha) < largura:
+                linha = tuple(linha) + (None,) * (largura - len(linha))
+            for nome, i in indices.items():
+                valores[nome].append(linha[i])
+            quantidade += 1
+            if tamanho_bloco and quantidade == tamanho_bloco:
+                yield pd.DataFrame(valores)
+                valores = {nome: [] for nome in indices}
+                quantidade = 0
+        if quantidade or tamanho_bloco is None:
+            yield pd.DataFrame(valores)
+    finally:
+        wb.close()
+
+
+def _ler_openpyxl(origem, colunas):
+    return next(_blocos_openpyxl(origem, colunas))
+
+
+def _ler_calamine(origem, colunas):
+    filtro = None if colunas is None else (lambda nome: str(nome).strip() in colunas)
+    df = pd.read_excel(_como_arquivo(origem), engine='calamine', usecols=filtro)
+    df.columns = [str(c).strip() for c in df.columns]
+    if colunas is not None:
+        df = df.reindex(columns=[c for c in colunas if c in df.columns])
+    return df
+
+
+def chave_svo(svos):
+    """
+    SVO -> chave int64, de forma vetorizada:
+    - 'SVO-12345' -> 12345;
+    - outro texto 'SVO-...' (ex.: 'SVO-001', 'SVO-12A') -> chave negativa estável (< -1),
+      tirada do próprio texto, para não se confundir com 'SVO-1';
+    - vazio ou fora do padrão -> -1.
+    Uma coluna já normalizada (inteira) volta como está.
+    """
+    if pd.api.types.is_integer_dtype(svos):
+        return svos.to_numpy(dtype='int64')
+    if _tem_inteiros(svos):
+        svos = texto_svo(svos)
+    texto = svos.astype('string')
+    canonica = texto.str.fullmatch(_SVO_CANONICA).fillna(False).to_numpy()
+    if canonica.all():
+        return pd.to_numeric(texto.str.slice(4)).to_numpy(dtype='int64')
+    chaves = np.full(len(texto), -1, dtype='int64')
+    chaves[canonica] = pd.to_numeric(texto[canonica].str.slice(4)).to_numpy(dtype='int64')
+    outras = ~canonica & (texto.str.startswith('SVO-') & (texto.str.len() > 4)).fillna(False).to_numpy()
+    if outras.any():
+        hashes = pd.util.hash_array(texto[outras].to_numpy(dtype=object)) >> np.uint64(2)  # cabe em int64
+        chaves[outras] = -hashes.astype('int64') - 2
+    return chaves
+
+
+def _tem_inteiros(svos):
+    """Coluna de objetos com SVOs já normalizadas, ex.: planilhas juntadas em que só algumas viraram int."""
+    return svos.dtype == object and pd.api.types.infer_dtype(svos, skipna=True) in ('integer', 'mixed-integer')
+
+
+def texto_svo(svos, originais=None):
+    """
+    Coluna SVO para exibição: inteiros voltam a ser 'SVO-12345'. Chaves negativas
+    (SVOs fora do padrão) voltam ao texto de `originais` (a COLUNA_SVO_ORIGINAL) ou ficam vazias.
+    """
+    if pd.api.types.is_integer_dtype(svos):
+        # Um texto por linha, montado de uma vez (sem a cópia intermediária do astype(str))
+        textos = pd.Series([f'SVO-{numero}' for numero in svos.tolist()], index=svos.index, dtype=object)
+        negativas = svos.to_numpy() < 0
+        if negativas.any():
+            textos[negativas] = None if originais is None else originais.astype(object).to_numpy()[negativas]
+        return textos
+    if _tem_inteiros(svos):
+        origem = [None] * len(svos) if originais is None else originais.astype(object).tolist()
+        textos = [(f'SVO-{v}' if v >= 0 else o) if isinstance(v, (int, np.integer)) else str(v)
+                  for v, o in zip(svos.tolist(), origem)]
+        return pd.Series(textos, index=svos.index, dtype=object)
+    return svos.astype(str)
+
+
+def svos_em_texto(df, selecao=None):
+    """Coluna SVO de `df` (só as linhas de `selecao`, se houver) em texto, com o original das SVOs fora do padrão."""
+    svos, originais = df['SVO'], df.get(COLUNA_SVO_ORIGINAL)
+    if selecao is not None:
+        svos = svos[selecao]
+        originais = None if originais is None else originais[selecao]
+    return texto_svo(svos, originais)
+
+
+def formatar_datas(datas, formato='%d/%m/%Y', vazio='Sem Data'):
+    """
+    Datas -> texto (category), formatando só as datas distintas: uma planilha
+    de um milhão de linhas costuma ter poucas dezenas de dias.
+    """
+    codigos, unicas = pd.factorize(pd.to_datetime(datas, errors='coerce'))
+    textos = np.append(unicas.strftime(formato).to_numpy(dtype=object), vazio)
+    codigos = np.where(codigos < 0, len(textos) - 1, codigos)
+    # Horários diferentes do mesmo dia viram o mesmo texto: uma categoria só
+    remapeamento, categorias = pd.factorize(textos)
+    formatadas = pd.Categorical.from_codes(remapeamento[codigos], categorias)
+    return pd.Series(formatadas, index=datas.index).cat.remove_unused_categories()
+
+
+def converter_tipos(df):
+    """
+    Esquema normalizado, aplicado já na leitura e usado pelo pipeline todo:
+    datas em datetime64, colunas repetitivas em category e SVO como chave int64
+    (ver `chave_svo`). O texto das SVOs fora do padrão (vazias, 'SVO-001'...) fica na
+    COLUNA_SVO_ORIGINAL, uma category nula nas demais linhas, que só existe quando há alguma.
+    """
+    if 'SVO' in df.columns and not pd.api.types.is_integer_dtype(df['SVO']) and len(df):
+        chaves = chave_svo(df['SVO'])
+        excecoes = chaves < 0
+        if excecoes.any():
+            df[COLUNA_SVO_ORIGINAL] = df['SVO'].astype(object).where(excecoes).astype('category')
+        df['SVO'] = chaves
+    for coluna in COLUNAS_DATA:
+        if coluna in df.columns:
+            df[coluna] = pd.to_datetime(df[coluna], errors='coerce')
+    for coluna in COLUNAS_CATEGORIA:
+        if coluna in df.columns:
+            df[coluna] = df[coluna].astype('category')
+    return df
+
+
+def ler_planilha(origem, colunas=COLUNAS_SVO, backend=None):
+    """
+    Lê uma planilha .xlsx trazendo só as colunas informadas (por nome do cabeçalho).
+    `colunas=None` traz todas. Colunas ausentes simplesmente não aparecem no resultado,
+    para que cada chamador mostre o próprio erro.
+    `backend`: 'calamine', 'openpyxl' ou None (BACKEND_PADRAO).
+    """
+    backend = backend or BACKEND_PADRAO
+    if backend == 'calamine':
+        df = _ler_calamine(origem, colunas)
+    elif backend == 'openpyxl':
+        df = _ler_openpyxl(origem, colunas)
+    else:
+        raise ValueError(f"Backend de leitura desconhecido: {backend}")
+    return converter_tipos(df)
+
+
+def ler_planilha_em_blocos(origem, colunas=COLUNAS_SVO, tamanho_bloco=50_000):
+    """
+    Igual a `ler_planilha`, mas entrega a planilha em blocos de `tamanho_bloco` linhas,
+    sempre pelo openpyxl em streaming, para manter a memória limitada.
+    Atenção: as categorias (e o tipo da coluna SVO) de cada bloco são independentes.
+    """
+    for bloco in _blocos_openpyxl(origem, colunas, tamanho_bloco):
+        yield converter_tipos(bloco)
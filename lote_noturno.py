@@ -0,0 +1,261 @@
+# Em lote_noturno.py
+# Geração em lote, sem interface (ex.: cron de madrugada). Lê todas as
+# exportações de uma pasta ou glob, separa por cidade e gera, para cada cidade,
+# o relatório de SVOs pendentes, os mapas de cada dia do período e o mapa dos
+# próximos 10 dias. Os mapas vão para a mesma fila do Streamlit (pool de
+# processos, limitador do Nominatim compartilhado). No fim, grava um manifesto
+# com tudo o que foi gerado, servido pelo mc_webapp em /api/lote.
+# Como os mapas são endereçados pelo conteúdo (cache_mapas), quem enviar a mesma
+# planilha de manhã recebe o mapa já pronto. Mapas que não terminarem em
+# --tempo-maximo minutos contam como falhos, e o cron recebe o código de erro.
+#
+#   python lote_noturno.py exportacoes/ --relatorios 'relatorios/*.xlsx' --dias 7 --tempo-maximo 180
+
+import argparse
+import glob
+import json
+import os
+import sys
+import time
+import uuid
+from datetime import date, datetime, timedelta
+
+from catalogo_mapas import PASTA_MAPAS
+
+BASE_DIR = os.path.dirname(os.path.abspath(__file__))
+PASTA_RELATORIOS = os.environ.get('RELATORIOS_DIR', os.path.join(BASE_DIR, 'relatorios'))
+CAMINHO_MANIFESTO = os.environ.get('LOTE_MANIFESTO', os.path.join(PASTA_RELATORIOS, 'manifesto.json'))
+DIAS_PADRAO = int(os.environ.get('LOTE_DIAS', '7'))
+# Passando disso, os jobs que faltam contam como falhos e o lote termina mesmo assim
+TEMPO_MAXIMO_S = float(os.environ.get('LOTE_TEMPO_MAXIMO_HORAS', '3')) * 3600
+COLUNA_BAIRRO = 'Bairro Consumidor'
+
+
+def encontrar_planilhas(entradas):
+    """Pastas (todos os .xlsx dentro) ou globs -> caminhos, sem repetir e sem os arquivos de trava do Excel."""
+    caminhos = []
+    for entrada in entradas:
+        if os.path.isdir(entrada):
+            encontrados = glob.glob(os.path.join(entrada, '*.xlsx'))
+        else:
+            encontrados = glob.glob(entrada)
+        for caminho in sorted(encontrados):
+            caminho = os.path.abspath(caminho)
+            if not os.path.basename(caminho).startswith('~$') and caminho not in caminhos:
+                caminhos.append(caminho)
+    return caminhos
+
+
+def _nome_cidade(cidade):
+    return str(cidade).replace(' ', '_')
+
+
+def _gravar_atomico(destino, escrever):
+    os.makedirs(os.path.dirname(os.path.abspath(destino)), exist_ok=True)
+    temporario = f"{destino}.{uuid.uuid4().hex}.tmp"
+    escrever(temporario)
+    os.replace(temporario, destino)
+
+
+def _ler(caminhos, colunas=None):
+    from cache_planilhas import carregar_planilha
+    from ingestao import COLUNAS_SVO
+
+    planilhas = []
+    for caminho in caminhos:
+        try:
+            planilhas.append((caminho, carregar_planilha(caminho, colunas or COLUNAS_SVO)))
+        except Exception as e:
+            print(f"ERRO: não foi possível ler '{caminho}': {e}")
+    return planilhas
+
+
+def gerar_relatorios(fontes, relatorios, pasta, dia):
+    """
+    Relatório de SVOs pendentes por cidade, em CSV (o mesmo do Analisador).
+    Sem planilhas de relatório, todas as SVOs das exportações contam como pendentes
+    e o snapshot do modo delta não é gravado.
+    Retorna {cidade: {'arquivo': nome do CSV, 'pendentes': quantidade}}.
+    """
+    from reconciliacao import CIDADE_DESCONHECIDA, formatar_pendentes, reconciliar
+    from snapshots import gravar_snapshot
+
+    resultado = reconciliar(fontes, relatorios)
+    if relatorios:
+        gravar_snapshot(
+            resultado['pendentes'], dia,
+            outras_cidades=resultado['resolvidas']['Cidade Consumidor'].unique(),
+        )
+
+    pendentes = formatar_pendentes(resultado['pendentes'])
+    cidades = pendentes['Cidade Consumidor'].astype(object).fillna(CIDADE_DESCONHECIDA)
+    todas = set(cidades) | set(resultado['resolvidas']['Cidade Consumidor'])
+    gerados = {}
+    for cidade in sorted(todas, key=str):
+        da_cidade = pendentes[(cidades == cidade).to_numpy()]
+        nome = f"{_nome_cidade(cidade)}_pendentes_{dia.strftime('%Y%m%d')}.csv"
+        _gravar_atomico(
+            os.path.join(pasta, nome),
+            lambda temporario: da_cidade.to_csv(temporario, index=False, encoding='utf-8'),
+        )
+        gerados[str(cidade)] = {'arquivo': nome, 'pendentes': len(da_cidade)}
+    print(f"Relatórios de pendências: {len(gerados)} cidades, {len(pendentes)} SVOs pendentes.")
+    if len(resultado['invalidas']):
+        print(f"Aviso: {len(resultado['invalidas'])} linhas sem SVO válida ficaram fora do relatório.")
+    return gerados
+
+
+def enviar_mapas(fila, lote, df, inicio, fim, pasta):
+    """
+    Um job 'periodo' (um mapa por dia) e um 'geral' (10 dias a partir de `inicio`) por cidade,
+    depois de uma geocodificação única dos bairros de todas. Retorna {cidade: [ids]}.
+    """
+    from fila_mapas import salvar_por_cidade
+
+    def mapas_da_cidade(cidade, entrada):
+        return [
+            ('periodo', f"{cidade} (por dia)", {
+                'entrada': entrada, 'coluna_bairro': COLUNA_BAIRRO, 'cidade_estado': f"{cidade}, SP",
+                'data_inicio': inicio.isoformat(), 'data_fim': fim.isoformat(),
+                'incluir_sem_data': True, 'pasta': pasta,
+            }),
+            ('geral', f"{cidade} (Futuros 10 dias)", {'entrada': entrada, 'pasta': pasta, 'inicio': inicio.isoformat()}),
+        ]
+
+    jobs = fila.enviar_regional(lote, salvar_por_cidade(df), mapas_da_cidade, COLUNA_BAIRRO)
+    return {str(cidade): ids for cidade, ids in jobs.items()}
+
+
+def aguardar(fila, lote, intervalo=2.0, tempo_maximo=TEMPO_MAXIMO_S):
+    """
+    Espera todos os jobs do lote terminarem, mostrando o andamento. Passados
+    `tempo_maximo` segundos, os que faltam são marcados como falhos (ex.: um worker
+    preso num Nominatim parado). Retorna ({id: job}, se o tempo esgotou).
+    """
+    from fila_mapas import ERRO, FINALIZADOS
+
+    prazo = time.monotonic() + tempo_maximo
+    ultimo = None
+    while True:
+        jobs = fila.jobs_do_lote(lote)
+        prontos = sum(job['estado'] in FINALIZADOS for job in jobs)
+        if prontos != ultimo:
+            print(f"Mapas: {prontos} de {len(jobs)} jobs finalizados.")
+            ultimo = prontos
+        if prontos == len(jobs):
+            return {job['id']: job for job in jobs}, False
+        if time.monotonic() >= prazo:
+            break
+        time.sleep(intervalo)
+
+    print(f"ERRO: tempo esgotado ({tempo_maximo / 60:g} min); {len(jobs) - prontos} jobs não terminaram.")
+    for job in jobs:
+        if job['estado'] not in FINALIZADOS:
+            fila.atualizar(job['id'], estado=ERRO, etapa='Falhou',
+                           erro=f"Tempo esgotado: não terminou em {tempo_maximo / 60:g} min ({job['etapa']}).")
+    return {job['id']: job for job in fila.jobs_do_lote(lote)}, True
+
+
+def ler_manifesto(caminho=CAMINHO_MANIFESTO):
+    """Manifesto da última execução, ou None."""
+    try:
+        with open(caminho, encoding='utf-8') as f:
+            return json.load(f)
+    except FileNotFoundError:
+        return None
+
+
+def executar(entradas, relatorios=(), dias=DIAS_PADRAO, inicio=None, pasta=PASTA_MAPAS,
+             pasta_relatorios=PASTA_RELATORIOS, manifesto=CAMINHO_MANIFESTO, processos=None,
+             tempo_maximo=TEMPO_MAXIMO_S):
+    """Roda o lote inteiro e grava o manifesto. Retorna o manifesto (dict)."""
+    import pandas as pd
+    from fila_mapas import CONCLUIDO, ERRO, MAX_PROCESSOS, FilaMapas
+    from reconciliacao import COLUNAS_RELATORIO
+
+    t0 = time.perf_counter()
+    inicio = inicio or date.today()
+    fim = inicio + timedelta(days=dias - 1)
+    caminhos = encontrar_planilhas(entradas)
+    if not caminhos:
+        raise FileNotFoundError(f"Nenhuma planilha .xlsx encontrada em: {', '.join(entradas)}")
+    print(f"{len(caminhos)} planilhas; mapas de {inicio:%d/%m/%Y} a {fim:%d/%m/%Y}.")
+
+    planilhas = _ler(caminhos)
+    if not planilhas:
+        raise ValueError("Nenhuma das planilhas pôde ser lida.")
+    df = pd.concat([df for _, df in planilhas], ignore_index=True)
+
+    # Os mapas saem primeiro, para o pool trabalhar enquanto os relatórios são montados
+    fila = FilaMapas(max_processos=processos or MAX_PROCESSOS)
+    fila.limpar()
+    lote = f"noturno-{uuid.uuid4().hex[:8]}"
+    jobs_por_cidade = enviar_mapas(fila, lote, df, inicio, fim, pasta)
+
+    rel = _ler(encontrar_planilhas(relatorios), COLUNAS_RELATORIO) if relatorios else []
+    gerados = gerar_relatorios([df], [df_rel for _, df_rel in rel], pasta_relatorios, inicio)
+
+    jobs, esgotado = aguardar(fila, lote, tempo_maximo=tempo_maximo)
+    # Com o tempo esgotado, os workers presos são mortos: senão o processo não sai
+    fila.encerrar(forcar=esgotado)
+    cidades = {}
+    for cidade in sorted(set(gerados) | set(jobs_por_cidade)):
+        mapas, erros = {}, []
+        for id_job in jobs_por_cidade.get(cidade, []):
+            job = jobs[id_job]
+            if job['estado'] == CONCLUIDO and job['resultado']:
+                mapas[job['tipo']] = os.path.basename(job['resultado'])
+            elif job['estado'] == ERRO:
+                erros.append(f"{job['titulo']}: {job['erro']}")
+        cidades[cidade] = {'relatorio': gerados.get(cidade), 'mapas': mapas, 'erros': erros}
+
+    dados = {
+        'gerado_em': datetime.now().isoformat(timespec='seconds'),
+        'inicio': inicio.isoformat(), 'fim': fim.isoformat(), 'lote': lote,
+        'planilhas': [os.path.basename(c) for c, _ in planilhas] + [os.path.basename(c) for c, _ in rel],
+        'duracao_s': round(time.perf_counter() - t0, 1),
+        'tempo_esgotado': esgotado,
+        'cidades': cidades,
+    }
+
+    def escrever(temporario):
+        with open(temporario, 'w', encoding='utf-8') as f:
+            json.dump(dados, f, ensure_ascii=False, indent=2)
+    _gravar_atomico(manifesto, escrever)
+    print(f"Lote concluído em {dados['duracao_s']} s: {len(cidades)} cidades; manifesto em '{manifesto}'.")
+    return dados
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(
+        description="Gera relatórios de pendências e mapas de todas as cidades das exportações, sem interface.",
+    )
+    parser.add_argument('entradas', nargs='+', help="Pastas ou globs com as planilhas .xlsx de SVOs abertas")
+    parser.add_argument('--relatorios', nargs='*', default=[],
+                        help="Pastas ou globs com as planilhas de relatório (para o cruzamento de pendências)")
+    parser.add_argument('--dias', type=int, default=DIAS_PADRAO, help="Quantos dias de mapas, a partir de --inicio")
+    parser.add_argument('--inicio', type=date.fromisoformat, default=None, help="Primeiro dia (AAAA-MM-DD); padrão: hoje")
+    parser.add_argument('--pasta', default=PASTA_MAPAS, help="Pasta dos mapas")
+    parser.add_argument('--pasta-relatorios', default=PASTA_RELATORIOS)
+    parser.add_argument('--manifesto', default=CAMINHO_MANIFESTO)
+    parser.add_argument('--processos', type=int, default=None, help="Processos gerando mapas em paralelo")
+    parser.add_argument('--tempo-maximo', '--timeout', type=float, default=TEMPO_MAXIMO_S / 60,
+                        help="Minutos de espera pelos mapas; os que não terminarem contam como falhos")
+    args = parser.parse_args(argv)
+    if args.dias < 1:
+        parser.error("--dias deve ser pelo menos 1")
+
+    try:
+        dados = executar(
+            args.entradas, args.relatorios, args.dias, args.inicio, args.pasta,
+            args.pasta_relatorios, args.manifesto, args.processos, args.tempo_maximo * 60,
+        )
+    except (FileNotFoundError, ValueError) as e:
+        print(f"ERRO: {e}")
+        return 2
+    # Código de saída diferente de zero se algum mapa falhou, para o cron avisar
+    return 1 if any(c['erros'] for c in dados['cidades'].values()) else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,162 @@
+# Em mapa_dados.py
+# Mapas em duas partes: um HTML pequeno (só a "casca" do Leaflet) e um arquivo
+# <mapa>.json.gz com os pontos, marcadores e a tabela de resumo. A página busca
+# '<mapa>.json' ao abrir e o mc_webapp entrega o .gz com Content-Encoding: gzip.
+
+import gzip
+import json
+import os
+import uuid
+
+from branca.element import MacroElement
+from jinja2 import Template
+
+from camada_marcadores import CALLBACK_MARCADOR, CASAS_DECIMAIS
+
+
+def caminho_dados(caminho_html):
+    """'static/temp_maps/X.html' -> 'static/temp_maps/X.json.gz'"""
+    return os.path.splitext(caminho_html)[0] + '.json.gz'
+
+
+def url_dados(caminho_html):
+    """URL relativa ao HTML ('X.json'); o servidor responde com o .json.gz comprimido."""
+    return os.path.splitext(os.path.basename(caminho_html))[0] + '.json'
+
+
+def arredondar_pontos(df, colunas):
+    """Lista [[lat, lon, ...], ...] com coordenadas arredondadas (arquivo menor)."""
+    valores = df[colunas].copy()
+    valores[['latitude', 'longitude']] = valores[['latitude', 'longitude']].astype(float).round(CASAS_DECIMAIS)
+    return valores.values.tolist()
+
+
+def gravar_dados(dados, caminho_html):
+    """Grava `dados` como JSON comprimido ao lado do HTML, de forma atômica."""
+    destino = caminho_dados(caminho_html)
+    os.makedirs(os.path.dirname(os.path.abspath(destino)), exist_ok=True)
+    temporario = f"{destino}.{uuid.uuid4().hex}.tmp"
+    with gzip.open(temporario, 'wt', encoding='utf-8', compresslevel=6) as f:
+        json.dump(dados, f, ensure_ascii=False, separators=(',', ':'))
+    os.replace(temporario, destino)
+    return destino
+
+
+class FonteDados(MacroElement):
+    """Dispara o fetch do arquivo de dados uma única vez; as camadas esperam a mesma Promise."""
+
+    _template = Template("""
+        {% macro script(this, kwargs) %}
+            var {{ this.get_name() }} = fetch({{ this.url|tojson }}).then(function (resposta) {
+                if (!resposta.ok) { throw new Error('Falha ao carregar ' + resposta.url); }
+                return resposta.json();
+            });
+            {{ this.get_name() }}.catch(function (erro) { console.error(erro); });
+        {% endmacro %}
+    """)
+
+    def __init__(self, url):
+        super().__init__()
+        self._name = 'DadosMapa'
+        self.url = url
+
+
+class _Preenchimento(MacroElement):
+    """Preenche uma camada (criada vazia) quando os dados chegarem."""
+
+    def __init__(self, fonte, camada, chave):
+        super().__init__()
+        self.fonte = fonte
+        self.camada = camada
+        self.chave = chave
+
+
+# Escolhe o nível de agregação (ver grade_espacial) pelo zoom atual do mapa
+# e chama `aplicar(pontos)` sempre que o nível muda
+_TROCA_DE_NIVEL = """
+            var mapa = {{ this._parent.get_name() }};
+            var niveis = dados[{{ this.chave|tojson }}];
+            var atual = null;
+            var atualizar = function () {
+                var escolhido = niveis[0];
+                niveis.forEach(function (nivel) { if (nivel.zoom <= mapa.getZoom()) { escolhido = nivel; } });
+                if (escolhido !== atual) { atual = escolhido; aplicar(escolhido.pontos); }
+            };
+            mapa.on('zoomend', atualizar);
+            atualizar();
+"""
+
+
+class PreencherCalor(_Preenchimento):
+    """HeatMap: os dados são níveis {'zoom', 'pontos'} de `grade_espacial.niveis_calor`."""
+
+    _template = Template("""
+        {% macro script(this, kwargs) %}
+            {{ this.fonte.get_name() }}.then(function (dados) {
+                var aplicar = function (pontos) { {{ this.camada.get_name() }}.setLatLngs(pontos); };
+""" + _TROCA_DE_NIVEL + """
+            });
+        {% endmacro %}
+    """)
+
+
+class PreencherCalorTempo(_Preenchimento):
+    """HeatMapWithTime: níveis de `grade_espacial.niveis_calor_por_dia` (uma lista de pontos por dia)."""
+
+    _template = Template("""
+        {% macro script(this, kwargs) %}
+            {{ this.fonte.get_name() }}.then(function (dados) {
+                var camada = {{ this.camada.get_name() }};
+                var aplicar = function (pontos) {
+                    camada.data = pontos;
+                    if (camada._map && camada._timeDimension) {
+                        camada._getDataForTime(camada._timeDimension.getCurrentTime());
+                    }
+                };
+""" + _TROCA_DE_NIVEL + """
+            });
+        {% endmacro %}
+    """)
+
+
+class PreencherMarcadores(_Preenchimento):
+    _template = Template("""
+        {% macro script(this, kwargs) %}
+            {{ this.fonte.get_name() }}.then(function (dados) {
+                var callback = {{ this.callback }};
+                {{ this.camada.get_name() }}.addLayers(dados[{{ this.chave|tojson }}].map(callback));
+            });
+        {% endmacro %}
+    """)
+
+    def __init__(self, fonte, camada, chave, callback=CALLBACK_MARCADOR):
+        super().__init__(fonte, camada, chave)
+        self.callback = callback.strip()
+
+
+class PreencherTabela(MacroElement):
+    """Preenche o <tbody> da tabela de resumo com as linhas [bairro, quantidade]."""
+
+    _template = Template("""
+        {% macro script(this, kwargs) %}
+            {{ this.fonte.get_name() }}.then(function (dados) {
+                var corpo = document.querySelector({{ this.seletor|tojson }});
+                if (!corpo) { return; }
+                dados[{{ this.chave|tojson }}].forEach(function (linha) {
+                    var tr = document.createElement('tr');
+                    linha.forEach(function (valor) {
+                        var td = document.createElement('td');
+                        td.textContent = valor;
+                        tr.appendChild(td);
+                    });
+                    corpo.appendChild(tr);
+                });
+            });
+        {% endmacro %}
+    """)
+
+    def __init__(self, fonte, seletor, chave):
+        super().__init__()
+        self.fonte = fonte
+        self.seletor = seletor
+        self.chave = chave
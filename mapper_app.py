@@ -2,19 +2,87 @@
 
 import streamlit as st
 import pandas as pd
-from datetime import datetime
+from datetime import datetime, timedelta
 import os
-import shutil
-from mc_simple import SVOMaps
-from mc_geral import filtro_futuro, mapa
+import time
+import uuid
+from cache_planilhas import carregar_planilha_com_chave
+from cubo import CuboAgregado, carregar_cubo
+from fila_mapas import CONCLUIDO, ERRO, FINALIZADOS, fila_padrao, salvar_por_cidade
+from metricas import tabela_tempos
 import warnings
 
 warnings.filterwarnings("ignore", category=UserWarning, module="openpyxl")
 
+def planilha_da_sessao(uploaded_file):
+    """
+    Upload -> (chave do conteúdo, DataFrame), lido direto do buffer em memória
+    (nada é copiado para disco) e só uma vez por sessão, mesmo com os reruns.
+    """
+    planilhas = st.session_state.setdefault('planilhas_enviadas', {})
+    if uploaded_file.file_id not in planilhas:
+        planilhas[uploaded_file.file_id] = carregar_planilha_com_chave(uploaded_file)
+    return planilhas[uploaded_file.file_id]
+
+
+def cubo_da_sessao(uploaded_files):
+    """Cubo de contagens (dia x cidade x bairro x status) de todas as planilhas enviadas, montado uma vez por planilha."""
+    cubos = []
+    for uploaded_file in uploaded_files:
+        chave, df = planilha_da_sessao(uploaded_file)
+        cubos.append(carregar_cubo(chave, lambda: df).contagens)
+    return CuboAgregado(pd.concat(cubos, ignore_index=True))
+
+
+def mostrar_resumo(uploaded_files):
+    """Resumo dos agendamentos por período e status, recortado do cubo (sem reler as planilhas)."""
+    try:
+        cubo = cubo_da_sessao(uploaded_files)
+    except Exception as e:
+        st.error(f"Erro ao montar o resumo: {e}")
+        return
+    dias = cubo.dias()
+    if not dias:
+        st.info("Nenhuma SVO com data agendada nas planilhas.")
+        return
+    periodo = st.date_input(
+        "Período do resumo:", value=(dias[0].date(), dias[-1].date()), key="periodo_resumo",
+    )
+    status_disponiveis = sorted(cubo.contagens['status'].dropna().unique(), key=str)
+    status = st.multiselect("Status da OS:", status_disponiveis, default=status_disponiveis, key="status_resumo")
+    if len(periodo) != 2:
+        st.info("Escolha a data inicial e a data final do período.")
+        return
+    fatia = cubo.fatiar(periodo[0], periodo[1], status=status)
+    st.metric("SVOs no período", fatia.total())
+    if fatia.vazio:
+        return
+    por_dia = fatia.por('dia').sort_values('dia')
+    st.bar_chart(por_dia.set_index('dia')['contagem'])
+    por_cidade = fatia.por('cidade', 'status').pivot_table(
+        index='cidade', columns='status', values='contagem', aggfunc='sum', fill_value=0, observed=True,
+    )
+    # Rótulos simples (o Streamlit não serializa índices category)
+    por_cidade.index = por_cidade.index.astype(str).rename('Cidade')
+    por_cidade.columns = por_cidade.columns.astype(str).rename(None)
+    st.dataframe(por_cidade, use_container_width=True)
+    bairros = fatia.por('cidade', 'bairro').head(20)
+    bairros.columns = ['Cidade', 'Bairro', 'SVOs']
+    st.dataframe(bairros, use_container_width=True, hide_index=True)
+
+
+def esquecer_planilhas_removidas(uploaded_files):
+    """Solta da sessão as planilhas que saíram do campo de upload."""
+    planilhas = st.session_state.get('planilhas_enviadas', {})
+    atuais = {uploaded_file.file_id for uploaded_file in uploaded_files or []}
+    for file_id in set(planilhas) - atuais:
+        del planilhas[file_id]
+
+
 # --- Função Principal que Desenha a Interface ---
 def run_mapper_app():
-    if 'mapas_gerados' not in st.session_state:
-        st.session_state.mapas_gerados = []
+    if 'lote_mapas' not in st.session_state:
+        st.session_state.lote_mapas = None
 
     col1, col2, col3 = st.columns([1, 2, 1])
     with col2:
@@ -26,12 +94,23 @@ def run_mapper_app():
         type="xlsx",
         accept_multiple_files=True
     )
+    esquecer_planilhas_removidas(uploaded_files)
 
-    selected_date = st.date_input(
-        "Filtrar por data específica (Passe o mouse em '?'):",
-        value=None,
-        help="""Escolha uma data para gerar um mapa para aquele dia. Se deixar em branco, o mapa será gerado para as ordens SEM data agendada."""
+    modo_periodo = st.checkbox(
+        "Gerar um mapa por dia em um período",
+        help="Lê e geocodifica as planilhas uma vez só e gera os mapas de todos os dias, com uma página reunindo todos."
     )
+    if modo_periodo:
+        hoje = datetime.now().date()
+        periodo = st.date_input("Período:", value=(hoje, hoje + timedelta(days=6)))
+        incluir_sem_data = st.checkbox("Incluir também o mapa das SVOs sem data", value=True)
+        selected_date = None
+    else:
+        selected_date = st.date_input(
+            "Filtrar por data específica (Passe o mouse em '?'):",
+            value=None,
+            help="""Escolha uma data para gerar um mapa para aquele dia. Se deixar em branco, o mapa será gerado para as ordens SEM data agendada."""
+        )
 
     st.markdown("---")
 
@@ -45,7 +124,13 @@ def run_mapper_app():
             st.error("No máximo dois arquivos, por favor!")
             st.stop()
         
-        if selected_date is None:
+        if modo_periodo:
+            if len(periodo) != 2:
+                st.error("Escolha a data inicial e a data final do período.")
+                st.stop()
+            data_filtro = None
+            st.success(f"Gerando um mapa por dia de {periodo[0].strftime('%d/%m/%Y')} a {periodo[1].strftime('%d/%m/%Y')}.")
+        elif selected_date is None:
             st.warning("Nenhuma data foi selecionada. Gerando mapas para SVOs sem data definida!")
             data_filtro = None
         else:
@@ -53,67 +138,102 @@ def run_mapper_app():
             data_br = selected_date.strftime('%d/%m/%Y')
             st.success(f"A data selecionada foi: {data_br}. Gerando mapas para esta data.")
         
-        temp_dir = os.path.join(os.getcwd(), "temp_uploads")
-        os.makedirs(temp_dir, exist_ok=True)
         maps_dir = os.path.join(os.getcwd(), "static", "temp_maps")
         os.makedirs(maps_dir, exist_ok=True)
-            
-        caminhos_arquivos = []
-        for uploaded_file in uploaded_files:
-            temp_path = os.path.join(temp_dir, uploaded_file.name)
-            with open(temp_path, "wb") as f:
-                shutil.copyfileobj(uploaded_file, f)
-            caminhos_arquivos.append(temp_path)
-            st.success(f"Arquivo Processado: '{uploaded_file.name}'")
         
-        mapas_gerados = []
         coluna_bairro = 'Bairro Consumidor'
         
-        with st.spinner("Gerando mapas, isso pode levar alguns instantes..."):
-            for caminho_arquivo in caminhos_arquivos:
+        with st.spinner("Enviando os mapas para a fila..."):
+            # Cada planilha é interpretada uma única vez (e reaproveitada do cache entre cliques)
+            planilhas = []
+            for uploaded_file in uploaded_files:
+                try:
+                    chave, df_planilha = planilha_da_sessao(uploaded_file)
+                    planilhas.append((uploaded_file.name, chave, df_planilha))
+                    st.success(f"Arquivo Processado: '{uploaded_file.name}'")
+                except Exception as e:
+                    st.error(f"Ocorreu um erro ao ler o arquivo {uploaded_file.name}: {e}")
+
+            # Cada mapa vira um job no pool de processos: rodam em paralelo e continuam
+            # mesmo se a página for recarregada
+            fila = fila_padrao()
+            fila.limpar()
+            lote = uuid.uuid4().hex[:12]
+            data_suffix = pd.to_datetime(data_filtro).strftime('%Y%m%d') if data_filtro else "sem_data"
+
+            def mapas_da_cidade(cidade_nome, entrada):
+                cidade_estado = f"{cidade_nome}, SP"
+                if modo_periodo:
+                    mapas = [('periodo', f"{cidade_nome} (por dia)", {
+                        'entrada': entrada, 'coluna_bairro': coluna_bairro, 'cidade_estado': cidade_estado,
+                        'data_inicio': periodo[0].isoformat(), 'data_fim': periodo[1].isoformat(),
+                        'incluir_sem_data': incluir_sem_data, 'pasta': maps_dir,
+                    })]
+                    # O mapa geral cobre o mesmo período
+                    return mapas + [('geral', f"{cidade_nome} (Geral do período)", {
+                        'entrada': entrada, 'inicio': periodo[0].isoformat(),
+                        'dias': (periodo[1] - periodo[0]).days + 1,
+                    })]
+                else:
+                    nome_mapa = os.path.join(maps_dir, f'{cidade_nome.replace(" ", "_")}_{data_suffix}.html')
+                    mapas = [('dia', cidade_nome, {
+                        'entrada': entrada, 'coluna_bairro': coluna_bairro, 'cidade_estado': cidade_estado,
+                        'mapa_html': nome_mapa, 'data_filtro': data_filtro,
+                    })]
+                return mapas + [('geral', f"{cidade_nome} (Futuros 10 dias)", {'entrada': entrada})]
+
+            for nome_arquivo, chave, df_planilha in planilhas:
                 try:
-                    df_temp = pd.read_excel(caminho_arquivo)
-                    if 'Cidade Consumidor' in df_temp.columns and not df_temp['Cidade Consumidor'].empty:
-                        cidade_nome = df_temp['Cidade Consumidor'].dropna().unique()[0]
-                        cidade_estado = f"{cidade_nome}, SP"
-                        data_suffix = pd.to_datetime(data_filtro).strftime('%Y%m%d') if data_filtro else "sem_data"
-                        nome_mapa = f'static/temp_maps/{cidade_nome.replace(" ", "_")}_{data_suffix}.html'
-                        st.info(f"Gerando mapa para {cidade_nome}...")
-                        resultado = SVOMaps(arquivo_excel=caminho_arquivo, coluna_bairro=coluna_bairro, cidade_estado=cidade_estado, mapa_html=nome_mapa, data_filtro=data_filtro)
-                        if resultado:
-                            mapas_gerados.append((cidade_nome, nome_mapa))
-                    else:
-                        st.warning(f"Não foi possível encontrar a coluna 'Cidade Consumidor' no arquivo {os.path.basename(caminho_arquivo)}.")
+                    # Uma entrada por cidade da planilha (mesmo conteúdo, nesta ou em outra
+                    # sessão, reaproveita os arquivos já gravados para os workers)
+                    entradas = salvar_por_cidade(df_planilha, chave=chave)
+                    if not entradas:
+                        st.warning(f"Não foi possível encontrar a coluna 'Cidade Consumidor' no arquivo {nome_arquivo}.")
+                        continue
+                    if len(entradas) > 1:
+                        st.info(f"{nome_arquivo}: {len(entradas)} cidades, um mapa de cada.")
+                    fila.enviar_regional(lote, entradas, mapas_da_cidade, coluna_bairro)
                 except Exception as e:
-                    st.error(f"Ocorreu um erro ao processar o arquivo {os.path.basename(caminho_arquivo)}: {e}")
-
-            for caminho_arquivo in caminhos_arquivos:
-                df_filtrado = filtro_futuro(caminho_arquivo)
-                if df_filtrado is not None and not df_filtrado.empty:
-                    mapa_gerado, nome_arquivo_mapa = mapa(df_filtrado)
-                    if mapa_gerado:
-                        cidade = df_filtrado['Cidade Consumidor'].iloc[0] if not df_filtrado.empty else "Desconhecida"
-                        mapas_gerados.append((f"{cidade} (Futuros 10 dias)", nome_arquivo_mapa))
-                        st.success(f"Mapa de agendamentos futuros gerado para {cidade}.")
-                    
-        st.session_state.mapas_gerados = mapas_gerados if mapas_gerados else []
-
-    if st.session_state.mapas_gerados:
-        # ... (copie o resto do código da interface aqui)
+                    st.error(f"Ocorreu um erro ao processar o arquivo {nome_arquivo}: {e}")
+
+        # O lote vai também para a URL: recarregar a página reconecta aos mesmos jobs
+        st.session_state.lote_mapas = lote
+        st.query_params['lote'] = lote
+
+    lote = st.session_state.get('lote_mapas') or st.query_params.get('lote')
+    jobs = fila_padrao().jobs_do_lote(lote) if lote else []
+    if jobs:
         st.header("Visualização dos Mapas Gerados")
-        for cidade_nome, mapa_path in st.session_state.mapas_gerados:
-            mapa_nome_arquivo = os.path.basename(mapa_path)
-            flask_url = f"http://localhost:5000/mapa/{mapa_nome_arquivo}"
-            st.markdown(f"""<a href="{flask_url}" target="_blank" style="text-decoration: none;"><button style="background-color: #003366; color: white; font-size: 16px; padding: 10px 24px; border-radius: 8px; border: none; cursor: pointer; margin: 5px 0;">Visualizar Mapa: {cidade_nome}</button></a>""", unsafe_allow_html=True)
+        mostrar_tempos = st.checkbox("Mostrar o tempo de cada etapa", key="mostrar_tempos_mapas")
+        for job in jobs:
+            if job['estado'] == CONCLUIDO and job['resultado']:
+                mapa_nome_arquivo = os.path.basename(job['resultado'])
+                flask_url = f"http://localhost:5000/mapa/{mapa_nome_arquivo}"
+                st.markdown(f"""<a href="{flask_url}" target="_blank" style="text-decoration: none;"><button style="background-color: #003366; color: white; font-size: 16px; padding: 10px 24px; border-radius: 8px; border: none; cursor: pointer; margin: 5px 0;">Visualizar Mapa: {job['titulo']}</button></a>""", unsafe_allow_html=True)
+            elif job['estado'] == CONCLUIDO:
+                st.info(f"{job['titulo']}: {job['etapa']}.")
+            elif job['estado'] == ERRO:
+                st.error(f"Ocorreu um erro ao gerar o mapa {job['titulo']}: {job['erro']}")
+            else:
+                st.progress(job['progresso'], text=f"{job['titulo']}: {job['etapa']}...")
+            if mostrar_tempos and job['tempos']:
+                with st.expander(f"Tempo de cada etapa: {job['titulo']}"):
+                    st.dataframe(tabela_tempos(job['tempos']), use_container_width=True, hide_index=True)
         if st.button("Limpar Mapas Gerados", type="secondary"):
-            st.session_state.mapas_gerados = []
+            st.session_state.lote_mapas = None
+            st.query_params.clear()
+            st.rerun()
+        if any(job['estado'] not in FINALIZADOS for job in jobs):
+            time.sleep(1)  # acompanha o andamento: a página se atualiza até todos terminarem
             st.rerun()
 
     if uploaded_files:
+        with st.expander("Resumo dos agendamentos"):
+            mostrar_resumo(uploaded_files)
         with st.expander("Mostrar prévia dos arquivos carregados"):
             for uploaded_file in uploaded_files:
                 try:
-                    df = pd.read_excel(uploaded_file)
+                    _, df = planilha_da_sessao(uploaded_file)
                     st.write(f"Prévia do arquivo {uploaded_file.name}:")
                     st.dataframe(df.head())
                 except Exception as e:
@@ -1,158 +1,63 @@
+import argparse
+import numpy as np
 import pandas as pd
 import folium
-from datetime import date, datetime, timedelta
-from folium.plugins import HeatMapWithTime, MarkerCluster
-from geopy.geocoders import Nominatim
-from geopy.extra.rate_limiter import RateLimiter
-import json
+from datetime import date, timedelta
+from folium.plugins import HeatMapWithTime
 import os
-import uuid
-
-def filtro_futuro(caminho_do_arquivo):
+from cache_mapas import cache_mapas_padrao, caminho_artefato, chave_mapa
+from cache_planilhas import carregar_planilha
+from catalogo_mapas import PASTA_MAPAS
+from camada_marcadores import LIMITE_PONTOS_INDIVIDUAIS, camada_agendamentos, dados_marcadores
+from mapa_dados import (FonteDados, PreencherCalorTempo, PreencherMarcadores, PreencherTabela,
+                        gravar_dados, url_dados)
+from enderecos import normalizar_bairros
+from geocodificador import geocodificar_bairros
+from grade_espacial import niveis_calor_por_dia
+from metricas import contar, contar_bytes, etapa, instrumentar
+from pagina_mapa import salvar_pagina_mapa, usar_folium
+
+# Janela padrão do mapa geral: os próximos 10 dias
+DIAS_GERAL = 10
+
+@instrumentar('filtro_futuro')
+def filtro_futuro(dados, inicio=None, dias=DIAS_GERAL):
+    # Janela de `dias` dias a partir de `inicio` (padrão: hoje)
     print("Iniciando o processo de filtro...")
+    etapa('leitura')
 
-    try:
-        df = pd.read_excel(caminho_do_arquivo)
-        print("Planilha lida com sucesso!")
-    except FileNotFoundError:
-        print(f"Erro: O arquivo '{caminho_do_arquivo}' não foi encontrado.")
-        return None
-
-    df['Agendado para'] = pd.to_datetime(df['Agendado para'], errors='coerce')
+    if isinstance(dados, pd.DataFrame):
+        df = dados
+    else:
+        try:
+            df = carregar_planilha(dados)
+            print("Planilha lida com sucesso!")
+        except FileNotFoundError:
+            print(f"Erro: O arquivo '{dados}' não foi encontrado.")
+            return None
+
+    etapa('filtro')
+    contar('linhas_processadas_total', len(df), funcao='filtro_futuro')
+    agendado = pd.to_datetime(df['Agendado para'], errors='coerce')
     print("Coluna 'Agendado para' convertida para o formato de data.")
-    hoje = pd.Timestamp(date.today())
-    futuro = hoje + timedelta(days=10)
+    hoje = pd.Timestamp(inicio or date.today()).normalize()
+    futuro = hoje + timedelta(days=dias)
     
     print(f"Filtrando entre {hoje.strftime('%d/%m/%Y')} e {futuro.strftime('%d/%m/%Y')}")
-    condicao_inicio = (df['Agendado para'] >= hoje)
-    condicao_fim = (df['Agendado para'] <= futuro)
+    condicao_inicio = (agendado >= hoje)
+    condicao_fim = (agendado <= futuro)
     mascara_final = condicao_inicio & condicao_fim
     
-    df_filtrado = df[mascara_final]
-    df_final = df_filtrado[['Agendado para', 'Bairro Consumidor', 'Cidade Consumidor', 'SVO']]
+    # Não altera o DataFrame recebido: a data convertida vai só para o recorte
+    df_filtrado = df.loc[mascara_final, ['Agendado para', 'Bairro Consumidor', 'Cidade Consumidor', 'SVO']]
+    df_final = df_filtrado.assign(**{'Agendado para': agendado[mascara_final]})
     
     print("Filtro aplicado! Veja o resultado:")
     print(df_final.head())
     return df_final
 
-def mapa(dados):
-    # Verifica se 'dados' é um DataFrame válido
-    if not isinstance(dados, pd.DataFrame):
-        print("Erro: Os dados fornecidos não são um DataFrame.")
-        return None, None
-    
-    # Verifica se as colunas necessárias estão presentes
-    colunas_necessarias = ['Agendado para', 'Bairro Consumidor', 'Cidade Consumidor', 'SVO']
-    if not all(coluna in dados.columns for coluna in colunas_necessarias):
-        print("Erro: O DataFrame não contém todas as colunas necessárias.")
-        return None, None
-    
-    # Criar uma cópia do DataFrame para evitar modificações no original
-    df_filtrado = dados[['Agendado para', 'Bairro Consumidor', 'Cidade Consumidor', 'SVO']].copy()
-    df_filtrado['Agendado para'] = pd.to_datetime(df_filtrado['Agendado para'], errors='coerce')
-
-    # Tratar valores nulos
-    df_filtrado = df_filtrado.dropna(subset=['Bairro Consumidor', 'Cidade Consumidor', 'Agendado para'])
-    if df_filtrado.empty:
-        print("Erro: Nenhum dado válido após remoção de valores nulos.")
-        return None, None
-
-    # ==============================================================================
-    # ETAPA 1: GEOCODIFICAÇÃO (OBTER COORDENADAS DOS ENDEREÇOS)
-    # ==============================================================================
-    print("Iniciando a geocodificação dos endereços. Isso pode levar um momento...")
-
-    geolocator = Nominatim(user_agent="gerador_mapa_calor_v1")
-    geocode = RateLimiter(geolocator.geocode, min_delay_seconds=1, error_wait_seconds=10)
-
-    # Carregar cache de geocodificação, se existir
-    try:
-        with open('location_cache.json', 'r') as f:
-            content = f.read().strip()
-            if not content:
-                location_cache = {}
-            else:
-                location_cache = json.loads(content)
-    except FileNotFoundError:
-        location_cache = {}
-    except json.JSONDecodeError:
-        print("Erro: O arquivo 'location_cache.json' contém dados inválidos. Inicializando cache vazio.")
-        location_cache = {}
-
-    # Criar endereços únicos
-    df_filtrado['endereco'] = df_filtrado['Bairro Consumidor'] + ', ' + df_filtrado['Cidade Consumidor'] + ', São Paulo, Brazil'
-    enderecos_unicos = df_filtrado['endereco'].unique()
-
-    # Geocodificar apenas endereços únicos
-    for address in enderecos_unicos:
-        if address not in location_cache:
-            try:
-                location = geocode(address)
-                if location:
-                    location_cache[address] = (location.latitude, location.longitude)
-                    print(f"Sucesso: {address} -> {location_cache[address]}")
-                else:
-                    location_cache[address] = (None, None)
-                    print(f"Falha: Endereço não encontrado para {address}")
-            except Exception as e:
-                print(f"Erro de conexão ao buscar {address}: {e}")
-                location_cache[address] = (None, None)
-
-    # Salvar cache
-    with open('location_cache.json', 'w') as f:
-        json.dump(location_cache, f)
-
-    # Mapear coordenadas para o DataFrame
-    df_filtrado['latitude'] = df_filtrado['endereco'].map(lambda x: location_cache[x][0])
-    df_filtrado['longitude'] = df_filtrado['endereco'].map(lambda x: location_cache[x][1])
-
-    # Remover linhas com coordenadas inválidas
-    df_filtrado = df_filtrado.dropna(subset=['latitude', 'longitude'])
-    if df_filtrado.empty:
-        print("Nenhum endereço pôde ser geocodificado. Encerrando o script.")
-        return None, None
-
-    print("\nGeocodificação concluída.\n")
-
-    # ==============================================================================
-    # ETAPA 2: AGRUPAR DADOS POR DIA E LOCALIZAÇÃO
-    # ==============================================================================
-    df_filtrado['Agendado para'] = df_filtrado['Agendado para'].dt.tz_localize(None)
-    df_agrupado = df_filtrado.groupby(
-        [df_filtrado['Agendado para'].dt.date, 'latitude', 'longitude']
-    ).size().reset_index(name='contagem')
-
-    print("\nDados agrupados para o mapa:\n")
-    print(df_agrupado.head())
-
-    # ==============================================================================
-    # ETAPA 3: PREPARAR OS DADOS PARA O PLUGIN DO FOLIUM
-    # ==============================================================================
-    dados_para_mapa = []
-    datas_unicas = sorted(df_agrupado['Agendado para'].unique())
-    for data_unica in datas_unicas:
-        df_dia = df_agrupado[df_agrupado['Agendado para'] == data_unica]
-        lista_dia = df_dia[['latitude', 'longitude', 'contagem']].values.tolist()
-        dados_para_mapa.append(lista_dia)
-
-    indice_tempo = [d.strftime('%d/%m/%Y') for d in datas_unicas]
-
-    # ==============================================================================
-    # ETAPA 4: CRIAR E SALVAR O MAPA
-    # ==============================================================================
-    print("Criando mapa customizado...")
-
-    if not df_filtrado.empty:
-        cidade = df_filtrado['Cidade Consumidor'].iloc[0]
-    else:
-        cidade = "Localidade não definida"
-
-    data_hoje = date.today()
-    data_futuro = data_hoje + timedelta(days=10)
-    hoje_formatado = data_hoje.strftime('%d/%m/%Y')
-    futuro_formatado = data_futuro.strftime('%d/%m/%Y')
-    titulo = f"Mapa de Calor Geral | {cidade} | {hoje_formatado} à {futuro_formatado}"
-
+def _mapa_folium(titulo, mapa_centro, nome_arquivo_saida, indice_tempo, nome_camada):
+    """Caminho antigo (MAPAS_RENDERIZADOR=folium): a mesma página montada com os objetos do folium."""
     html_content = f"""
         <div class="map-title-container">
             <h1>{titulo}</h1>
@@ -177,21 +82,14 @@ def mapa(dados):
         </style>
     """
 
-    mapa_centro = [df_filtrado['latitude'].mean(), df_filtrado['longitude'].mean()]
     mapa_customizado = folium.Map(location=mapa_centro, zoom_start=12, tiles="OpenStreetMap")
+    # Pontos, marcadores e tabela ficam em <mapa>.json.gz, carregado pela página ao abrir
+    fonte_dados = FonteDados(url_dados(nome_arquivo_saida)).add_to(mapa_customizado)
     mapa_customizado.get_root().header.add_child(folium.Element(css_style))
     mapa_customizado.get_root().html.add_child(folium.Element(html_content))
 
-    # ==============================================================================
-    # ETAPA 5: ADICIONAR TABELA DE RESUMO POR BAIRRO
-    # ==============================================================================
-    print("Criando tabela de resumo por bairro...")
-
-    contagem_bairros = df_filtrado.groupby('Bairro Consumidor').size().reset_index(name='Quantidade')
-    contagem_bairros.columns = ['Bairro', 'Quantidade']
-    print(contagem_bairros)
-
-    tabela_html = contagem_bairros.to_html(
+    # Só o cabeçalho vai no HTML; as linhas chegam com o arquivo de dados
+    tabela_html = pd.DataFrame(columns=['Bairro', 'Quantidade']).to_html(
         classes="table table-striped table-hover table-condensed table-responsive",
         index=False
     )
@@ -235,9 +133,10 @@ def mapa(dados):
 
     mapa_customizado.get_root().header.add_child(folium.Element(css_tabela))
     mapa_customizado.get_root().html.add_child(folium.Element(html_final_tabela))
+    PreencherTabela(fonte_dados, '.summary-table-container tbody', 'tabela').add_to(mapa_customizado)
 
     heatmap_layer = HeatMapWithTime(
-        data=dados_para_mapa,
+        data=[[] for _ in indice_tempo],
         index=indice_tempo,
         name="Mapa de Calor por Dia",
         auto_play=False,
@@ -245,39 +144,191 @@ def mapa(dados):
         radius=35
     )
     heatmap_layer.add_to(mapa_customizado)
+    PreencherCalorTempo(fonte_dados, heatmap_layer, 'calor_por_dia').add_to(mapa_customizado)
 
-    marker_group = folium.FeatureGroup(name="Agendamentos Individuais (Cluster)")
-    marker_cluster = MarkerCluster().add_to(marker_group)
-
-    for idx, row in df_filtrado.iterrows():
-        html_popup = f"""
-        <b>Bairro:</b> {row['Bairro Consumidor']}<br>
-        <b>Cidade:</b> {row['Cidade Consumidor']}<br>
-        <b>Agendado para:</b> {row['Agendado para'].strftime('%d/%m/%Y')}
-        """
-        folium.Marker(
-            location=[row['latitude'], row['longitude']],
-            popup=folium.Popup(html_popup, max_width=250),
-            tooltip="Clique para ver detalhes"
-        ).add_to(marker_cluster)
-
-    marker_group.add_to(mapa_customizado)
+    # Marcadores: um único bloco de dados desenhado no navegador
+    camada_marcadores = camada_agendamentos([], nome=nome_camada).add_to(mapa_customizado)
+    PreencherMarcadores(fonte_dados, camada_marcadores, 'marcadores').add_to(mapa_customizado)
     folium.LayerControl(collapsed=False, position='bottomright').add_to(mapa_customizado)
+    return mapa_customizado
 
-    BASE_DIR = os.path.dirname(os.path.abspath(__file__)) 
-    MAPAS_DIR = os.path.join(BASE_DIR, 'static', 'temp_maps')
+@instrumentar('mapa')
+def mapa(dados, progresso=None, pasta=PASTA_MAPAS, inicio=None, dias=DIAS_GERAL):
+    # progresso(etapa, fração) é opcional: a fila de mapas usa para mostrar o andamento.
+    # `inicio` e `dias`: a mesma janela passada ao filtro_futuro (título, nome e chave do mapa)
+    progresso = progresso or (lambda etapa, fracao: None)
+    # Verifica se 'dados' é um DataFrame válido
+    if not isinstance(dados, pd.DataFrame):
+        print("Erro: Os dados fornecidos não são um DataFrame.")
+        return None, None
+    
+    # Verifica se as colunas necessárias estão presentes
+    colunas_necessarias = ['Agendado para', 'Bairro Consumidor', 'Cidade Consumidor', 'SVO']
+    if not all(coluna in dados.columns for coluna in colunas_necessarias):
+        print("Erro: O DataFrame não contém todas as colunas necessárias.")
+        return None, None
+    
+    # Um único recorte com as 4 colunas (o original não é alterado), sem fuso horário nas datas
+    etapa('preparacao')
+    contar('linhas_processadas_total', len(dados), funcao='mapa')
+    agendado = pd.to_datetime(dados['Agendado para'], errors='coerce')
+    if agendado.dt.tz is not None:
+        agendado = agendado.dt.tz_localize(None)
+    # Bairros com a grafia normalizada (enderecos.py): uma consulta e um ponto por bairro
+    df_filtrado = dados[colunas_necessarias].assign(**{
+        'Agendado para': agendado, 'Bairro Consumidor': normalizar_bairros(dados['Bairro Consumidor']),
+    })
+
+    # Tratar valores nulos (só recorta de novo se houver algum)
+    validas = df_filtrado[['Bairro Consumidor', 'Cidade Consumidor', 'Agendado para']].notna().all(axis=1)
+    if not validas.all():
+        df_filtrado = df_filtrado[validas]
+    if df_filtrado.empty:
+        print("Erro: Nenhum dado válido após remoção de valores nulos.")
+        return None, None
+
+    # Mapa já gerado com exatamente estes dados e este período? Reaproveita sem geocodificar
+    etapa('cache')
+    # Título e nome do arquivo com a cidade dos dados (ou todas, numa planilha regional)
+    nomes_cidades = sorted(map(str, df_filtrado['Cidade Consumidor'].unique()))
+    if len(nomes_cidades) == 1:
+        cidade, titulo_cidade = nomes_cidades[0], nomes_cidades[0]
+    else:
+        cidade = 'Regional'
+        titulo_cidade = ', '.join(nomes_cidades) if len(nomes_cidades) <= 3 else f"{len(nomes_cidades)} cidades"
+    data_inicio = pd.Timestamp(inicio or date.today()).date()
+
+    os.makedirs(pasta, exist_ok=True)
+
+    chave = chave_mapa(df_filtrado, inicio=data_inicio, dias=dias)
+    nome_arquivo_saida = caminho_artefato(os.path.join(pasta, f"{cidade}_geral_{data_inicio.strftime('%Y%m%d')}.html"), chave)
+    cache_mapas = cache_mapas_padrao()
+    if cache_mapas.buscar(nome_arquivo_saida):
+        print(f"\nMapa: '{nome_arquivo_saida}' reaproveitado do cache (mesmos dados e período).\n")
+        return None, nome_arquivo_saida  # Sem objeto do folium: o mapa já está salvo
+
+    # ==============================================================================
+    # ETAPA 1: GEOCODIFICAÇÃO (OBTER COORDENADAS DOS ENDEREÇOS)
+    # ==============================================================================
+    print("Iniciando a geocodificação dos endereços. Isso pode levar um momento...")
+    progresso("Geocodificando os bairros", 0.3)
+    etapa('geocodificacao')
+
+    # Geocodificar apenas os pares (bairro, cidade) únicos, pelo serviço compartilhado.
+    # Os pares saem dos códigos das categorias, sem montar texto linha a linha
+    codigos_bairro, bairros = pd.factorize(df_filtrado['Bairro Consumidor'])
+    codigos_cidade, cidades = pd.factorize(df_filtrado['Cidade Consumidor'])
+    pares, par_da_linha = np.unique(codigos_bairro * len(cidades) + codigos_cidade, return_inverse=True)
+    pares_unicos = list(zip(np.asarray(bairros)[pares // len(cidades)], np.asarray(cidades)[pares % len(cidades)]))
+    location_cache = geocodificar_bairros(
+        pares_unicos,
+        lambda bairro, cidade: f"{bairro}, {cidade}, São Paulo, Brazil",
+    )
+
+    # Mapear coordenadas para o DataFrame (None vira NaN)
+    coordenadas = np.array([location_cache[par] for par in pares_unicos], dtype=float).reshape(-1, 2)
+    df_filtrado = df_filtrado.assign(
+        latitude=coordenadas[par_da_linha, 0], longitude=coordenadas[par_da_linha, 1],
+    )
+
+    # Remover linhas com coordenadas inválidas
+    geocodificadas = ~np.isnan(coordenadas[par_da_linha, 0])
+    if not geocodificadas.all():
+        df_filtrado = df_filtrado[geocodificadas]
+    if df_filtrado.empty:
+        print("Nenhum endereço pôde ser geocodificado. Encerrando o script.")
+        return None, None
+
+    print("\nGeocodificação concluída.\n")
+
+    # ==============================================================================
+    # ETAPA 2: AGRUPAR DADOS POR DIA E LOCALIZAÇÃO
+    # ==============================================================================
+    etapa('agrupamento')
+    df_agrupado = df_filtrado.groupby(
+        [df_filtrado['Agendado para'].dt.normalize(), 'latitude', 'longitude']
+    ).size().reset_index(name='contagem')
 
-    os.makedirs(MAPAS_DIR, exist_ok=True)
+    print("\nDados agrupados para o mapa:\n")
+    print(df_agrupado.head())
 
-    nome_arquivo_saida = os.path.join(MAPAS_DIR, f"{cidade}_geral{datetime.now().strftime('%Y%m%d%H%M')}.html")
+    # ==============================================================================
+    # ETAPA 3: PREPARAR OS DADOS PARA O PLUGIN DO FOLIUM
+    # ==============================================================================
+    # Cada dia agregado na mesma grade, em vários níveis de zoom (pontos limitados por dia)
+    datas_unicas = sorted(df_agrupado['Agendado para'].unique())
+    indice_dia = pd.Categorical(df_agrupado['Agendado para'], categories=datas_unicas).codes
+    dados_para_mapa = niveis_calor_por_dia(
+        indice_dia, len(datas_unicas),
+        df_agrupado['latitude'], df_agrupado['longitude'], df_agrupado['contagem'],
+    )
+
+    indice_tempo = [d.strftime('%d/%m/%Y') for d in datas_unicas]
 
-    mapa_customizado.save(nome_arquivo_saida)
+    # ==============================================================================
+    # ETAPA 4: CRIAR E SALVAR O MAPA
+    # ==============================================================================
+    print("Criando mapa customizado...")
+    progresso("Desenhando o mapa", 0.7)
+    etapa('desenho')
+
+    data_futuro = data_inicio + timedelta(days=dias)
+    inicio_formatado = data_inicio.strftime('%d/%m/%Y')
+    futuro_formatado = data_futuro.strftime('%d/%m/%Y')
+    titulo = f"Mapa de Calor Geral | {titulo_cidade} | {inicio_formatado} à {futuro_formatado}"
+    mapa_centro = [df_filtrado['latitude'].mean(), df_filtrado['longitude'].mean()]
+
+    # ==============================================================================
+    # ETAPA 5: ADICIONAR TABELA DE RESUMO POR BAIRRO
+    # ==============================================================================
+    print("Criando tabela de resumo por bairro...")
+
+    contagem_bairros = df_filtrado.groupby('Bairro Consumidor', observed=True).size().reset_index(name='Quantidade')
+    contagem_bairros.columns = ['Bairro', 'Quantidade']
+    print(contagem_bairros)
+
+    # Marcadores: um único bloco de dados desenhado no navegador; acima do limite,
+    # um marcador por bairro e dia com a contagem de OS
+    if len(df_filtrado) > LIMITE_PONTOS_INDIVIDUAIS:
+        print(f"{len(df_filtrado)} agendamentos: marcadores agregados por bairro e dia.")
+        nome_camada = "Agendamentos por Bairro e Dia (Cluster)"
+    else:
+        nome_camada = "Agendamentos Individuais (Cluster)"
+
+    progresso("Salvando o mapa", 0.9)
+    etapa('dados')
+    # Pontos, marcadores e tabela ficam em <mapa>.json.gz, carregado pela página ao abrir
+    dados_mapa = {
+        'calor_por_dia': dados_para_mapa,
+        'marcadores': dados_marcadores(df_filtrado),
+        'tabela': contagem_bairros.values.tolist(),
+    }
+    etapa('gravacao')
+    contar_bytes('dados', gravar_dados(dados_mapa, nome_arquivo_saida))
+    mapa_customizado = None
+    if usar_folium():
+        mapa_customizado = _mapa_folium(titulo, mapa_centro, nome_arquivo_saida, indice_tempo, nome_camada)
+        mapa_customizado.save(nome_arquivo_saida)
+    else:
+        # Só a casca do Leaflet, direto do template (sem a árvore de objetos do folium)
+        salvar_pagina_mapa(
+            nome_arquivo_saida, titulo, mapa_centro, url_dados(nome_arquivo_saida), nome_marcadores=nome_camada,
+            indice_tempo=indice_tempo, nome_calor="Mapa de Calor por Dia", tabela=True,
+        )
+    contar_bytes('html', nome_arquivo_saida)
+    cache_mapas.registrar()
 
     print(f"\nMapa: '{nome_arquivo_saida}' criado com sucesso!\n")
-    return mapa_customizado, nome_arquivo_saida  # Retorna o mapa e o caminho
+    return mapa_customizado, nome_arquivo_saida  # Retorna o mapa e o caminho (o mapa é None se veio do cache ou do template)
 
 if __name__ == "__main__":
-    baseSVO = r"C:\Users\Data_Analyst\Desktop\Projetos\0.xlsx"
-    resultado = filtro_futuro(baseSVO)
-    if resultado is not None:
-        mapa(resultado)
\ No newline at end of file
+    # Uma planilha avulsa; para todas as cidades de uma vez, use lote_noturno.py
+    parser = argparse.ArgumentParser(description="Mapa dos agendamentos dos próximos dias de uma planilha.")
+    parser.add_argument('planilha', help="Planilha .xlsx de SVOs")
+    parser.add_argument('--pasta', default=PASTA_MAPAS, help="Pasta onde o mapa é salvo")
+    parser.add_argument('--inicio', type=date.fromisoformat, default=None, help="Primeiro dia (AAAA-MM-DD; padrão: hoje)")
+    parser.add_argument('--dias', type=int, default=DIAS_GERAL, help="Tamanho da janela, em dias")
+    args = parser.parse_args()
+    resultado = filtro_futuro(args.planilha, args.inicio, args.dias)
+    if resultado is not None and not resultado.empty:
+        mapa(resultado, pasta=args.pasta, inicio=args.inicio, dias=args.dias)
\ No newline at end of file
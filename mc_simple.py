@@ -1,199 +1,355 @@
 import pandas as pd
-from geopy.geocoders import Nominatim
-from geopy.extra.rate_limiter import RateLimiter
 import folium
 from datetime import date
 from folium.plugins import HeatMap
-import time
 import os  # Adicionei isso pra checar se pasta existe
+import uuid
+from cache_mapas import cache_mapas_padrao, caminho_artefato, chave_mapa, chave_pagina
+from catalogo_mapas import PASTA_MAPAS
+from cache_planilhas import carregar_planilha
+from cubo import CuboAgregado
+from camada_marcadores import camada_agendamentos
+from geocodificador import geocodificar_bairros
+from ingestao import formatar_datas
+from grade_espacial import niveis_calor
+from mapa_dados import FonteDados, PreencherCalor, PreencherMarcadores, arredondar_pontos, gravar_dados, url_dados
+from pagina_mapa import salvar_pagina_mapa, usar_folium
+from metricas import contar, contar_bytes, etapa, instrumentar
 
-def SVOMaps(arquivo_excel: str, coluna_bairro: str, cidade_estado: str, mapa_html: str, data_filtro: str = None):
+def _mapa_folium(titulo, mapa_centro, mapa_html):
+    """Caminho antigo (MAPAS_RENDERIZADOR=folium): a mesma página montada com os objetos do folium."""
+    mapa_calor = folium.Map(location=mapa_centro, zoom_start=12)  # Ajustei o zoom inicial
+
+    # Agora cria o html_content com o título
+    html_content = f"""
+    <div class="map-title-container">
+        <h1>{titulo}</h1>
+    </div>
+    """
+    # Adicionei o CSS aqui para ficar mais organizado
+    css_style = """
+    <style>
+      .map-title-container {
+          position: fixed; top: 0; left: 0; width: 100%; height: 60px;
+          background-color: #ffffff; display: flex; align-items: center;
+          padding: 0 20px; border-bottom: 2px solid #f0f0f0; z-index: 1000; box-sizing: border-box;
+      }
+      .map-title-container h1 {
+          position: absolute; left: 50%; transform: translateX(-50%);
+          font-family: Arial, sans-serif; color: #003366; font-size: 20px; margin: 0;
+      }
+      .map-title-container img {
+          position: absolute; right: 20px;
+          max-height: 40px; width: auto;
+      }
+    </style>
+    """
+    mapa_calor.get_root().header.add_child(folium.Element(css_style))
+    mapa_calor.get_root().html.add_child(folium.Element(html_content))
+
+    # Adiciona a camada de calor e os marcadores, vazios: os dados ficam em <mapa>.json.gz
+    fonte_dados = FonteDados(url_dados(mapa_html)).add_to(mapa_calor)
+    camada_calor = HeatMap([], radius=25, blur=15).add_to(mapa_calor)
+    PreencherCalor(fonte_dados, camada_calor, 'calor').add_to(mapa_calor)
+    camada_bairros = camada_agendamentos([], nome="Bairros").add_to(mapa_calor)
+    PreencherMarcadores(fonte_dados, camada_bairros, 'marcadores').add_to(mapa_calor)
+    return mapa_calor
+
+def _salvar_mapa_bairros(contagem_bairros, cidade, data_correta, mapa_html, progresso):
+    """Desenha e salva o mapa (HTML + <mapa>.json.gz) de bairros já geocodificados e contados."""
+    etapa('desenho')
+    mapa_centro = [contagem_bairros['latitude'].mean(), contagem_bairros['longitude'].mean()]
+    titulo = f"Mapa de Calor | {cidade} | {data_correta}"
+
+    marcadores = contagem_bairros.assign(cidade=cidade, data=data_correta, svo='')[
+        ['latitude', 'longitude', 'contagem', 'Bairro Consumidor', 'cidade', 'data', 'svo']
+    ]
+    dados_mapa = {
+        # Calor agregado em grade, um nível por faixa de zoom (pontos limitados)
+        'calor': niveis_calor(contagem_bairros['latitude'], contagem_bairros['longitude'],
+                              contagem_bairros['contagem']),
+        'marcadores': arredondar_pontos(marcadores, list(marcadores.columns)),
+    }
+
+    # --- 6. Salvar o Mapa (HTML + dados comprimidos) ---
+    progresso("Salvando o mapa", 0.9)
+    etapa('gravacao')
+    contar_bytes('dados', gravar_dados(dados_mapa, mapa_html))
+    if usar_folium():
+        _mapa_folium(titulo, mapa_centro, mapa_html).save(mapa_html)
+    else:
+        # A página é só a casca do Leaflet: sai direto do template, sem a árvore do folium
+        salvar_pagina_mapa(mapa_html, titulo, mapa_centro, url_dados(mapa_html), nome_marcadores="Bairros")
+    contar_bytes('html', mapa_html)
+
+def _cubo(dados, coluna_bairro, funcao):
+    """Cubo pronto, ou montado de um DataFrame ou do caminho do Excel (None se o arquivo não existe)."""
+    if isinstance(dados, CuboAgregado):
+        return dados  # montado com a coluna de bairros padrão
+    if isinstance(dados, pd.DataFrame):
+        df = dados
+    else:
+        try:
+            df = carregar_planilha(dados)
+            print("Arquivo do Excel lido com sucesso.")
+        except FileNotFoundError:
+            print(f"ERRO: Arquivo '{dados}' não encontrado.")
+            return None
+    contar('linhas_processadas_total', len(df), funcao=funcao)
+    return CuboAgregado.de_dataframe(df, coluna_bairro)
+
+def _contagem_por_bairro(contagem):
+    """Contagens do cubo -> ['Bairro Consumidor', 'contagem'], com os mesmos tipos em todo mapa (a chave do cache depende deles)."""
+    return pd.DataFrame({
+        'Bairro Consumidor': contagem['bairro'].astype(object).to_numpy(),
+        'contagem': contagem['contagem'].astype('int64').to_numpy(),
+    }).dropna(subset=['Bairro Consumidor']).reset_index(drop=True)
+
+@instrumentar('SVOMaps')
+def SVOMaps(dados, coluna_bairro: str, cidade_estado: str, mapa_html: str, data_filtro: str = None,
+            progresso=None):
+    # progresso(etapa, fração) é opcional: a fila de mapas usa para mostrar o andamento
+    # dados: CuboAgregado (cubo.py), DataFrame ou caminho do Excel
+    progresso = progresso or (lambda etapa, fracao: None)
     print(f"\n[ + ] Iniciando o processo para {cidade_estado}...")
 
-    # --- 1. Ler e Preparar os Dados ---
-    try:
-        df = pd.read_excel(arquivo_excel)
-        print("Arquivo do Excel lido com sucesso.")
-    except FileNotFoundError:
-        print(f"ERRO: Arquivo '{arquivo_excel}' não encontrado.")
+    # --- 1. Ler e Preparar os Dados (cubo, DataFrame já carregado ou caminho do Excel) ---
+    etapa('leitura')
+    cubo = _cubo(dados, coluna_bairro, 'SVOMaps')
+    if cubo is None:
         return None
 
-    # --- 2. Filtrar os Dados pela Data ---
-    df['Agendado para'] = pd.to_datetime(df['Agendado para'], errors='coerce')
-
+    # --- 2. Filtrar os Dados pela Data (um recorte do cubo) ---
+    progresso("Filtrando os agendamentos", 0.1)
+    etapa('filtro')
     data_filtro_dt = None  # Inicializa como None
     if data_filtro:
         try:
             data_filtro_dt = pd.to_datetime(data_filtro)
-            df_filtrado = df[df['Agendado para'].dt.date == data_filtro_dt.date()]
         except ValueError:
             print(f"ERRO: A data '{data_filtro}' não é válida. Use o formato 'YYYY-MM-DD'.")
             return None
+        fatia = cubo.fatiar(data_filtro_dt, data_filtro_dt)
     else:
-        df_filtrado = df[df['Agendado para'].isna()]
+        fatia = cubo.fatiar(com_data=False, sem_data=True)
 
-    if df_filtrado.empty:
+    if fatia.vazio:
         print(f"AVISO: Nenhum agendamento encontrado para {data_filtro or 'sem data'} em {cidade_estado}.")
         return None
 
-    print(f"{len(df_filtrado)} agendamentos encontrados para {data_filtro or 'sem data'}.")
+    print(f"{fatia.total()} agendamentos encontrados para {data_filtro or 'sem data'}.")
 
     # --- 3. Agregar os Dados dos Bairros (APÓS o filtro) ---
-    contagem_bairros = df_filtrado[coluna_bairro].value_counts().reset_index()
-    contagem_bairros.columns = ['Bairro Consumidor', 'contagem']
-    
+    etapa('agregacao')
+    contagem_bairros = _contagem_por_bairro(fatia.por('bairro'))
+
+    # Mapa já gerado com estas mesmas contagens, cidade e data? Reaproveita sem geocodificar
+    etapa('cache')
+    chave = chave_mapa(contagem_bairros, cidade_estado=cidade_estado, data_filtro=data_filtro)
+    mapa_html = caminho_artefato(mapa_html, chave)
+    cache_mapas = cache_mapas_padrao()
+    if cache_mapas.buscar(mapa_html):
+        print(f"Mapa reaproveitado do cache: '{mapa_html}'")
+        return mapa_html
+
     print(f"Dados agregados com sucesso. {len(contagem_bairros)} bairros únicos encontrados para a data.")
     print(contagem_bairros.head())  # Mostra os primeiros bairros
 
-    # --- 4. Geocodificar os Bairros ÚNICOS ---
+    # --- 4. Geocodificar os Bairros ÚNICOS (cache compartilhado primeiro) ---
+    progresso("Geocodificando os bairros", 0.3)
+    etapa('geocodificacao')
     print("\nIniciando geocodificação dos bairros...")
-    geolocator = Nominatim(user_agent="HeatMap", timeout=10)
-    geocode = RateLimiter(geolocator.geocode, min_delay_seconds=1, error_wait_seconds=5)
-
-    contagem_bairros['latitude'] = None
-    contagem_bairros['longitude'] = None
-
-    for index, row in contagem_bairros.iterrows():
-        query = f"{row['Bairro Consumidor']}, {cidade_estado}"
-        print(f"Buscando coordenadas para: '{query}'")
-        
-        try:
-            location = geocode(query)
-            if location:
-                contagem_bairros.loc[index, 'latitude'] = location.latitude
-                contagem_bairros.loc[index, 'longitude'] = location.longitude
-                print(f"[ + ] Encontrado: ({location.latitude:.4f}, {location.longitude:.4f})")
-            else:
-                print(" -> Localização não encontrada.")
-        except Exception as e:
-            print(f" -> ERRO de conexão ao buscar '{query}'. Pulando.")
+    cidade = cidade_estado.split(',')[0]
+    coordenadas = geocodificar_bairros(
+        [(bairro, cidade) for bairro in contagem_bairros['Bairro Consumidor']],
+        lambda bairro, _cidade: f"{bairro}, {cidade_estado}",
+    )
+    contagem_bairros['latitude'] = [coordenadas[(b, cidade)][0] for b in contagem_bairros['Bairro Consumidor']]
+    contagem_bairros['longitude'] = [coordenadas[(b, cidade)][1] for b in contagem_bairros['Bairro Consumidor']]
 
     contagem_bairros.dropna(subset=['latitude', 'longitude'], inplace=True)
     
     # --- 5. Criar e Salvar o Mapa de Calor ---
+    progresso("Desenhando o mapa", 0.7)
     print("\nCriando o mapa de calor...")
     
     if contagem_bairros.empty:
         print("ERRO: Nenhum bairro foi geocodificado com sucesso. O mapa não pode ser gerado.")
         return None
         
-    mapa_centro = [contagem_bairros['latitude'].mean(), contagem_bairros['longitude'].mean()]
-    mapa_calor = folium.Map(location=mapa_centro, zoom_start=12)  # Ajustei o zoom inicial
-
-    # Adiciona o título e a logo (seu código original)
-    cidade = cidade_estado.split(',')[0]
-
-    # Antes de criar o título, define data_correta
+    # Título do mapa: a data escolhida ou "Sem Data"
     if data_filtro_dt is not None:
         data_correta = data_filtro_dt.strftime('%d/%m/%Y')
     else:
         data_correta = "Sem Data"
 
-    # Agora cria o html_content com o título
-    html_content = f"""
-    <div class="map-title-container">
-        <h1>Mapa de Calor | {cidade} | {data_correta}</h1>
-    </div>
+    _salvar_mapa_bairros(contagem_bairros, cidade, data_correta, mapa_html, progresso)
+    cache_mapas.registrar()
+    print(f"\nProcesso concluído! Mapa de calor salvo em '{mapa_html}'")
+    return mapa_html  # Retorna o caminho do mapa pra mostrar no Streamlit
+
+@instrumentar('SVOMapsLote')
+def SVOMapsLote(dados, coluna_bairro: str, cidade_estado: str, data_inicio, data_fim,
+                incluir_sem_data: bool = True, pasta: str = PASTA_MAPAS, progresso=None):
     """
-    # Adicionei o CSS aqui para ficar mais organizado
-    css_style = """
-    <style>
-      .map-title-container {
-          position: fixed; top: 0; left: 0; width: 100%; height: 60px;
-          background-color: #ffffff; display: flex; align-items: center;
-          padding: 0 20px; border-bottom: 2px solid #f0f0f0; z-index: 1000; box-sizing: border-box;
-      }
-      .map-title-container h1 {
-          position: absolute; left: 50%; transform: translateX(-50%);
-          font-family: Arial, sans-serif; color: #003366; font-size: 20px; margin: 0;
-      }
-      .map-title-container img {
-          position: absolute; right: 20px;
-          max-height: 40px; width: auto;
-      }
-    </style>
+    Um mapa por dia de `data_inicio` a `data_fim` (e um para as SVOs sem data),
+    lendo e geocodificando uma vez só, mais uma página com todos os mapas.
+    `dados`: CuboAgregado, DataFrame ou caminho do Excel, como no SVOMaps.
+    Os mapas de cada dia têm a mesma chave de cache do SVOMaps daquele dia.
+    Retorna (caminho da página, [(data, caminho do mapa), ...]) ou (None, []).
     """
-    mapa_calor.get_root().header.add_child(folium.Element(css_style))
-    mapa_calor.get_root().html.add_child(folium.Element(html_content))
+    progresso = progresso or (lambda etapa, fracao: None)
+    print(f"\n[ + ] Iniciando o lote de {data_inicio} a {data_fim} para {cidade_estado}...")
+    etapa('leitura')
+    cubo = _cubo(dados, coluna_bairro, 'SVOMapsLote')
+    if cubo is None:
+        return None, []
 
-    # Adiciona a camada de calor e os marcadores
-    dados_heatmap = contagem_bairros[['latitude', 'longitude', 'contagem']].values.tolist()
-    HeatMap(dados_heatmap, radius=25, blur=15).add_to(mapa_calor)
+    # --- 1. Um recorte do cubo para o período inteiro ---
+    progresso("Filtrando os agendamentos", 0.1)
+    etapa('filtro')
+    fatia = cubo.fatiar(data_inicio, data_fim, sem_data=incluir_sem_data)
+    contagem = fatia.por('dia', 'bairro')
+    contagem = contagem[contagem['bairro'].notna()]
+    dias = formatar_datas(contagem['dia'], '%Y-%m-%d', 'sem_data').to_numpy()
+    contagem_por_dia = {chave_dia: _contagem_por_bairro(grupo) for chave_dia, grupo in contagem.groupby(dias)}
+    if not contagem_por_dia:
+        print(f"AVISO: Nenhum agendamento encontrado no período para {cidade_estado}.")
+        return None, []
 
-    for index, row in contagem_bairros.iterrows():
-        folium.Marker(
-            location=[row['latitude'], row['longitude']],
-            tooltip=f"{row['Bairro Consumidor']}: {row['contagem']} O.S.",
-            icon=None
-        ).add_to(mapa_calor)
+    # --- 2. Dias cujo mapa já existe saem direto do cache ---
+    etapa('cache')
+    cidade = cidade_estado.split(',')[0]
+    cache_mapas = cache_mapas_padrao()
+    mapas, a_desenhar = {}, {}
+    for chave_dia, contagem_bairros in contagem_por_dia.items():
+        data_filtro = None if chave_dia == 'sem_data' else chave_dia
+        sufixo = chave_dia.replace('-', '')
+        chave = chave_mapa(contagem_bairros, cidade_estado=cidade_estado, data_filtro=data_filtro)
+        caminho = caminho_artefato(os.path.join(pasta, f"{cidade.replace(' ', '_')}_{sufixo}.html"), chave)
+        if cache_mapas.buscar(caminho):
+            mapas[chave_dia] = caminho
+        else:
+            a_desenhar[chave_dia] = caminho
+    print(f"{len(contagem_por_dia)} mapas no período: {len(mapas)} do cache, {len(a_desenhar)} a desenhar.")
 
-    # --- 6. Salvar o Mapa ---
-    mapa_calor.save(mapa_html)
-    print(f"\nProcesso concluído! Mapa de calor salvo em '{mapa_html}'")
-    return mapa_html  # Retorna o caminho do mapa pra mostrar no Streamlit
+    # --- 3. Geocodificação única dos bairros de todos os dias que faltam ---
+    if a_desenhar:
+        progresso("Geocodificando os bairros", 0.3)
+        etapa('geocodificacao')
+        bairros = pd.unique(pd.concat([contagem_por_dia[d]['Bairro Consumidor'] for d in a_desenhar]))
+        coordenadas = geocodificar_bairros(
+            [(bairro, cidade) for bairro in bairros],
+            lambda bairro, _cidade: f"{bairro}, {cidade_estado}",
+        )
+        coordenadas = pd.DataFrame(
+            [(bairro, lat, lon) for (bairro, _), (lat, lon) in coordenadas.items()],
+            columns=['Bairro Consumidor', 'latitude', 'longitude'],
+        )
 
-# Função nova: pra processar múltiplas cidades e arquivos
-def gerar_mapas_multiplos(arquivos_excels, coluna_bairro, cidades, data_filtro):
-    mapas_gerados = []
-    num_arquivos = len(arquivos_excels)
-    num_cidades = len(cidades)
-    
-    if not os.path.exists('temp_maps'):
-        os.makedirs('temp_maps')
-    
-    for i, cidade in enumerate(cidades):
-        # Define o sufixo do nome do arquivo com base em data_filtro
-        if data_filtro:
-            try:
-                data_filtro_dt = pd.to_datetime(data_filtro)
-                data_suffix = data_filtro_dt.strftime('%Y%m%d')
-            except ValueError:
-                print(f"ERRO: A data '{data_filtro}' não é válida. Usando 'sem_data'.")
-                data_suffix = "sem_data"
-        else:
-            data_suffix = "sem_data"
-        
-        arquivo = arquivos_excels[min(i, num_arquivos - 1)]
-        cidade_nome = cidade.replace(", SP", "")
-        nome_mapa = os.path.join('static', 'temp_maps', f'{cidade_nome}_{data_suffix}.html')
-        resultado = SVOMaps(arquivo, coluna_bairro, cidade, nome_mapa, data_filtro)
-        if resultado:
-            mapas_gerados.append((cidade_nome, nome_mapa))
-        time.sleep(5)
-    
-    # Gera o HTML combinado
-    if mapas_gerados:
-        html_content = """
+    # --- 4. Um mapa por dia ---
+    for i, (chave_dia, caminho) in enumerate(sorted(a_desenhar.items())):
+        progresso(f"Desenhando o mapa {i + 1} de {len(a_desenhar)}", 0.4 + 0.5 * i / len(a_desenhar))
+        etapa('agregacao')
+        contagem_bairros = contagem_por_dia[chave_dia].merge(coordenadas, on='Bairro Consumidor', how='left')
+        contagem_bairros = contagem_bairros.dropna(subset=['latitude', 'longitude'])
+        if contagem_bairros.empty:
+            print(f"ERRO: Nenhum bairro geocodificado para {chave_dia}. Mapa não gerado.")
+            continue
+        data_correta = "Sem Data" if chave_dia == 'sem_data' else pd.Timestamp(chave_dia).strftime('%d/%m/%Y')
+        _salvar_mapa_bairros(contagem_bairros, cidade, data_correta, caminho, lambda etapa, fracao: None)
+        mapas[chave_dia] = caminho
+    if a_desenhar:
+        cache_mapas.registrar()
+
+    if not mapas:
+        return None, []
+
+    # --- 5. Página com todos os mapas do período ---
+    etapa('pagina')
+    mapas = sorted(mapas.items())
+    rotulos = [("Sem Data" if d == 'sem_data' else pd.Timestamp(d).strftime('%d/%m/%Y'), c) for d, c in mapas]
+    inicio, fim = pd.Timestamp(data_inicio).strftime('%Y%m%d'), pd.Timestamp(data_fim).strftime('%Y%m%d')
+    caminho_pagina = os.path.join(pasta, f"{cidade.replace(' ', '_')}_periodo_{inicio}-{fim}.html")
+    caminho_pagina = pagina_indice(f"Mapas de Calor | {cidade}", rotulos, caminho_pagina)
+    print(f"\nLote concluído! {len(rotulos)} mapas; página do período em '{caminho_pagina}'")
+    return caminho_pagina, rotulos
+
+def pagina_indice(titulo, mapas, caminho):
+    """
+    Página HTML com um iframe por mapa; `mapas` é [(rótulo, caminho do mapa), ...] na mesma pasta.
+    Também endereçada pelo conteúdo: grava em `caminho` com a chave dos mapas embutidos
+    (o cache_mapas a remove junto com eles) e retorna o caminho final.
+    """
+    embutidos = [(rotulo, os.path.basename(mapa_path)) for rotulo, mapa_path in mapas]
+    caminho = caminho_artefato(caminho, chave_pagina(titulo, embutidos))
+    if cache_mapas_padrao().buscar(caminho, dados=False):
+        return caminho
+    html_content = f"""
 <!DOCTYPE html>
 <html>
 <head>
-    <title>Mapas de Calor</title>
+    <meta charset="utf-8">
+    <title>{titulo}</title>
     <style>
-        h1 {
+        h1 {{
             text-align: center;
             font-family: Arial, sans-serif;
             color: #003366;
-        }
-        iframe {
+        }}
+        iframe {{
             margin-bottom: 20px;
-        }
+        }}
     </style>
 </head>
 <body>
 """
-        for cidade_nome, mapa_path in mapas_gerados:
-            mapa_nome = os.path.basename(mapa_path)
-            html_content += f"""
-    <h1>Mapa de {cidade_nome}</h1>
-    <iframe src="{mapa_nome}" width="100%" height="500px" style="border:none;"></iframe>
+    for rotulo, mapa_nome in embutidos:
+        html_content += f"""
+    <h1>Mapa de {rotulo}</h1>
+    <iframe src="{mapa_nome}" width="100%" height="500px" style="border:none;" loading="lazy"></iframe>
 """
-        html_content += """
+    html_content += """
 </body>
 </html>
 """
-        combined_html_path = 'temp_maps/mmaps.html'
-        with open(combined_html_path, 'w', encoding='utf-8') as f:
-            f.write(html_content)
+    temporario = f"{caminho}.{uuid.uuid4().hex}.tmp"
+    with open(temporario, 'w', encoding='utf-8') as f:
+        f.write(html_content)
+    os.replace(temporario, caminho)
+    return caminho
+
+# Função nova: pra processar múltiplas cidades e arquivos
+def gerar_mapas_multiplos(arquivos_excels, coluna_bairro, cidades, data_filtro, pasta=PASTA_MAPAS):
+    mapas_gerados = []
+    num_arquivos = len(arquivos_excels)
+
+    os.makedirs(pasta, exist_ok=True)
+
+    # Define o sufixo do nome do arquivo com base em data_filtro
+    if data_filtro:
+        try:
+            data_filtro_dt = pd.to_datetime(data_filtro)
+            data_suffix = data_filtro_dt.strftime('%Y%m%d')
+        except ValueError:
+            print(f"ERRO: A data '{data_filtro}' não é válida. Usando 'sem_data'.")
+            data_suffix = "sem_data"
+    else:
+        data_suffix = "sem_data"
+
+    # Sem pausa entre as cidades: o limitador do geocodificador já respeita o Nominatim
+    for i, cidade in enumerate(cidades):
+        arquivo = arquivos_excels[min(i, num_arquivos - 1)]
+        cidade_nome = cidade.replace(", SP", "")
+        nome_mapa = os.path.join(pasta, f'{cidade_nome.replace(" ", "_")}_{data_suffix}.html')
+        resultado = SVOMaps(arquivo, coluna_bairro, cidade, nome_mapa, data_filtro)
+        if resultado:
+            mapas_gerados.append((cidade_nome, resultado))
+
+    # Gera o HTML combinado, na mesma pasta dos mapas (os iframes apontam para o nome do arquivo)
+    if mapas_gerados:
+        combined_html_path = pagina_indice("Mapas de Calor", mapas_gerados,
+                                           os.path.join(pasta, f'mapas_{data_suffix}.html'))
         mapas_gerados.append(('Combinado', combined_html_path))
-    
-    return [(cidade, caminho_mapa) for cidade, caminho_mapa in mapas_gerados]
\ No newline at end of file
+
+    return [(cidade, caminho_mapa) for cidade, caminho_mapa in mapas_gerados]
@@ -1,29 +1,173 @@
-from flask import Flask, render_template, send_from_directory
+from flask import Flask, abort, jsonify, render_template, request, send_file, send_from_directory
+from datetime import date
+import gzip
+import io
 import os
+import threading
+from ao_vivo import SEM_DATA, agregados_padrao, eventos
+from catalogo_mapas import PASTA_MAPAS, catalogo_padrao
+from lote_noturno import CAMINHO_MANIFESTO, PASTA_RELATORIOS, ler_manifesto
+from metricas import registro_padrao
 
 app = Flask(__name__)
 
-# Caminho pra pasta dos mapas (ajuste pra dentro de static)
-MAPAS_DIR = os.path.join(os.getcwd(), 'static', 'temp_maps')
+# Por quanto tempo o navegador reaproveita um mapa sem perguntar de novo (depois, revalida pelo ETag)
+CACHE_SEGUNDOS = int(os.environ.get('MAPAS_CACHE_SEGUNDOS', '60'))
+POR_PAGINA_MAXIMO = 500
+# Cada tela ao vivo prende uma thread do worker enquanto o stream está aberto: ele fecha
+# depois deste tempo e o navegador reconecta de onde parou
+STREAM_SEGUNDOS = float(os.environ.get('AO_VIVO_STREAM_SEGUNDOS', '30'))
+# Streams abertos ao mesmo tempo por processo (o gthread tem poucas threads, ver gunicorn.conf.py,
+# e os mapas não podem ficar sem nenhuma); acima disso, 503 e a tela consulta /api/agregados?desde=
+MAX_STREAMS = int(os.environ.get('AO_VIVO_MAX_STREAMS', '1'))
+_streams = threading.BoundedSemaphore(MAX_STREAMS)
+
+TIPOS = {'.html': 'text/html', '.json': 'application/json'}
+
+def _filtros():
+    """Filtros e paginação da lista de mapas, a partir da query string."""
+    try:
+        data = date.fromisoformat(request.args['data']) if request.args.get('data') else None
+    except ValueError:
+        abort(400, "Parâmetro 'data' deve estar no formato AAAA-MM-DD.")
+    return {
+        'cidade': request.args.get('cidade', '').strip() or None,
+        'data': data,
+        'tipo': request.args.get('tipo') or None,
+        'pagina': max(request.args.get('pagina', 1, type=int), 1),
+        'por_pagina': min(max(request.args.get('por_pagina', 50, type=int), 1), POR_PAGINA_MAXIMO),
+    }
+
+def _resposta_catalogo(resposta):
+    # ETag pelo conteúdo (igual em todos os workers): sem mudança na lista, o navegador recebe 304
+    resposta.add_etag()
+    resposta.headers['Cache-Control'] = 'no-cache'
+    return resposta.make_conditional(request)
 
 @app.route('/')
 def home():
-    # Lista todos os arquivos HTML na pasta
-    mapas = []
-    if os.path.exists(MAPAS_DIR):
-        mapas = [f for f in os.listdir(MAPAS_DIR) if f.endswith('.html')]
-        mapas.sort()  # Organiza por nome
-    else:
-        print(f"Pasta {MAPAS_DIR} não encontrada. Verifique se ela existe.")
-    return render_template('index.html', mapas=mapas)
+    catalogo = catalogo_padrao()
+    filtros = _filtros()
+    mapas, total = catalogo.listar(**filtros)
+    paginas = max((total + filtros['por_pagina'] - 1) // filtros['por_pagina'], 1)
+    resposta = app.make_response(render_template(
+        'index.html', mapas=mapas, total=total, paginas=paginas,
+        cidades=catalogo.cidades(), filtros=filtros, lote=ler_manifesto(),
+    ))
+    return _resposta_catalogo(resposta)
+
+@app.route('/api/mapas')
+def api_mapas():
+    filtros = _filtros()
+    mapas, total = catalogo_padrao().listar(**filtros)
+    resposta = jsonify({
+        'total': total, 'pagina': filtros['pagina'], 'por_pagina': filtros['por_pagina'],
+        'mapas': [m.para_dict() for m in mapas],
+    })
+    return _resposta_catalogo(resposta)
+
+@app.route('/api/lote')
+def api_lote():
+    # Manifesto da última geração em lote (lote_noturno.py)
+    try:
+        with open(CAMINHO_MANIFESTO, 'rb') as f:
+            conteudo = f.read()
+    except FileNotFoundError:
+        abort(404)
+    return _resposta_catalogo(app.response_class(conteudo, mimetype='application/json'))
+
+def _filtros_ao_vivo():
+    """Cidade, dia ('AAAA-MM-DD' ou 'sem-data'; vazio = todos) e versão já vista, a partir da query string."""
+    dia = request.args.get('dia', '').strip() or None
+    if dia == 'sem-data':
+        dia = SEM_DATA
+    elif dia is not None:
+        try:
+            dia = date.fromisoformat(dia).isoformat()
+        except ValueError:
+            abort(400, "Parâmetro 'dia' deve estar no formato AAAA-MM-DD (ou 'sem-data').")
+    return request.args.get('cidade', '').strip() or None, dia, max(request.args.get('desde', 0, type=int), 0)
+
+@app.route('/api/agregados')
+def api_agregados():
+    # Contagens por cidade, dia e bairro; com 'desde', só o que mudou depois dessa versão
+    cidade, dia, desde = _filtros_ao_vivo()
+    versao, completo, linhas = agregados_padrao().mudancas(desde, cidade, dia)
+    resposta = jsonify({'versao': versao, 'completo': completo, 'linhas': linhas})
+    return _resposta_catalogo(resposta)
+
+@app.route('/api/agregados/stream')
+def api_agregados_stream():
+    # Server-Sent Events; ao reconectar, o navegador manda a última versão recebida no Last-Event-ID
+    cidade, dia, desde = _filtros_ao_vivo()
+    desde = request.headers.get('Last-Event-ID', desde, type=int) or desde
+    if not _streams.acquire(blocking=False):
+        resposta = jsonify({'erro': "Streams esgotados neste servidor; consulte /api/agregados?desde=<versão>."})
+        resposta.status_code = 503
+        resposta.headers['Retry-After'] = str(int(STREAM_SEGUNDOS))
+        return resposta
+    resposta = app.response_class(
+        eventos(agregados_padrao(), desde, cidade, dia, duracao=STREAM_SEGUNDOS),
+        mimetype='text/event-stream',
+    )
+    resposta.call_on_close(_streams.release)  # fim do stream ou cliente que desconectou
+    resposta.headers['Cache-Control'] = 'no-cache'
+    resposta.headers['X-Accel-Buffering'] = 'no'  # proxy na frente não segura os eventos
+    return resposta
+
+@app.route('/ao-vivo')
+def ao_vivo():
+    # Import aqui: camada_marcadores traz o pandas, que o resto do servidor não usa
+    from camada_marcadores import CALLBACK_MARCADOR, ICONE_CLUSTER
+
+    cidade, dia, _ = _filtros_ao_vivo()
+    return render_template(
+        'ao_vivo.html', cidade=cidade, dia=request.args.get('dia', ''), cidades=agregados_padrao().cidades(),
+        callback_marcador=CALLBACK_MARCADOR, icone_cluster=ICONE_CLUSTER,
+    )
+
+@app.route('/relatorio/<nome_relatorio>')
+def baixar_relatorio(nome_relatorio):
+    if not nome_relatorio.endswith('.csv'):
+        abort(404)
+    return send_from_directory(PASTA_RELATORIOS, nome_relatorio, as_attachment=True, max_age=CACHE_SEGUNDOS)
+
+@app.route('/metrics')
+def metricas():
+    # Somadas por todos os processos (Streamlit, fila de mapas, lote noturno); formato texto do Prometheus
+    return app.response_class(registro_padrao().texto_prometheus(), content_type='text/plain; version=0.0.4; charset=utf-8')
 
 @app.route('/mapa/<nome_mapa>')
 def mostrar_mapa(nome_mapa):
-    # DEBUG: Imprime no terminal do Flask o caminho que ele está usando
-    print(f"Tentando servir o arquivo: {os.path.join(MAPAS_DIR, nome_mapa)}")
-    return send_from_directory(MAPAS_DIR, nome_mapa)
+    recurso = catalogo_padrao().recurso(nome_mapa)
+    if recurso is None:
+        abort(404)
+    mimetype = TIPOS.get(os.path.splitext(nome_mapa)[1], 'application/octet-stream')
+
+    # Variante já comprimida que o navegador aceita (brotli > gzip > sem compressão)
+    codificacao = next(
+        (c for c in ('br', 'gzip') if c in recurso.variantes and request.accept_encodings[c]),
+        'identity',
+    )
+    if codificacao in recurso.variantes:
+        resposta = send_file(
+            recurso.variantes[codificacao], mimetype=mimetype, conditional=True,
+            etag=f"{recurso.etag}-{codificacao}", max_age=CACHE_SEGUNDOS,
+        )
+    else:
+        # Cliente sem suporte a gzip (raro) pedindo dados que só existem comprimidos
+        with open(recurso.variantes['gzip'], 'rb') as f:
+            conteudo = gzip.decompress(f.read())
+        resposta = send_file(
+            io.BytesIO(conteudo), mimetype=mimetype, conditional=True,
+            etag=f"{recurso.etag}-identity", max_age=CACHE_SEGUNDOS,
+        )
+    if codificacao != 'identity':
+        resposta.headers['Content-Encoding'] = codificacao
+    resposta.headers['Vary'] = 'Accept-Encoding'
+    return resposta
 
 if __name__ == '__main__':
-    # Cria a pasta static/temp_maps se não existir
-    os.makedirs(MAPAS_DIR, exist_ok=True)
-    app.run(debug=True)
\ No newline at end of file
+    # Só para desenvolvimento; em produção: gunicorn -c gunicorn.conf.py mc_webapp:app
+    os.makedirs(PASTA_MAPAS, exist_ok=True)
+    app.run(debug=os.environ.get('FLASK_DEBUG') == '1')
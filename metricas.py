@@ -0,0 +1,251 @@
+# Em metricas.py
+# Tempos de cada etapa do processamento (leitura da planilha, cruzamento,
+# geocodificação, desenho e gravação dos mapas) e contadores (acertos dos
+# caches, geocodificações por origem, linhas processadas, bytes gravados).
+# O Streamlit, os processos da fila de mapas e o lote noturno somam tudo num
+# SQLite compartilhado; o mc_webapp expõe o total em /metrics, no formato
+# texto do Prometheus.
+#
+#   @instrumentar('SVOMaps')       # tempo total da função
+#   def SVOMaps(...):
+#       etapa('filtro')            # fecha a etapa anterior e abre a próxima
+#       ...
+#       etapa('geocodificacao')
+
+import contextvars
+import functools
+import math
+import os
+import sqlite3
+import threading
+import time
+from contextlib import contextmanager
+
+BASE_DIR = os.path.dirname(os.path.abspath(__file__))
+CAMINHO_METRICAS = os.environ.get('METRICAS_PATH', os.path.join(BASE_DIR, 'metricas.sqlite3'))
+METRICAS_ATIVAS = os.environ.get('METRICAS', '1') != '0'
+PREFIXO = 'geo_ops_'
+# Limites (em segundos) dos baldes do histograma de duração das etapas
+LIMITES_SEGUNDOS = (0.01, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60, 120, 300)
+
+METRICAS = {
+    'etapa_segundos': ('histogram', "Duração de cada etapa do processamento, em segundos."),
+    'geocodificacoes_total': ('counter', "Bairros resolvidos pelo geocodificador, por origem."),
+    'linhas_processadas_total': ('counter', "Linhas de planilha processadas, por função."),
+    'bytes_gravados_total': ('counter', "Bytes gravados em disco, por função e tipo de arquivo."),
+    'cache_total': ('counter', "Consultas aos caches de planilhas e de mapas, por resultado."),
+}
+
+
+def _rotulos(rotulos):
+    """{'funcao': 'SVOMaps'} -> 'funcao="SVOMaps"' (ordenado e escapado como o Prometheus pede)."""
+    def escapar(valor):
+        return str(valor).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+    return ','.join(f'{nome}="{escapar(valor)}"' for nome, valor in sorted(rotulos.items()))
+
+
+def _numero(valor):
+    if math.isinf(valor):
+        return '+Inf'
+    return repr(float(valor)) if not float(valor).is_integer() else str(int(valor))
+
+
+class RegistroMetricas:
+    """
+    Contadores e histogramas somados num SQLite (modo WAL), para que vários
+    processos contribuam para os mesmos totais. Falhas de gravação só geram um
+    aviso: métrica nunca interrompe a geração de um mapa.
+    """
+
+    def __init__(self, caminho=CAMINHO_METRICAS):
+        self.caminho = caminho
+        self._local = threading.local()
+        self._avisado = False
+        os.makedirs(os.path.dirname(os.path.abspath(caminho)), exist_ok=True)
+        with self._conexao() as conn:
+            conn.execute("""
+                CREATE TABLE IF NOT EXISTS series (
+                    nome TEXT NOT NULL,
+                    rotulos TEXT NOT NULL,
+                    le REAL NOT NULL DEFAULT 0,
+                    valor REAL NOT NULL,
+                    PRIMARY KEY (nome, rotulos, le)
+                )
+            """)
+
+    def _conexao(self):
+        conn = getattr(self._local, 'conn', None)
+        if conn is None:
+            conn = sqlite3.connect(self.caminho, timeout=30)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            self._local.conn = conn
+        return conn
+
+    def _somar(self, linhas):
+        try:
+            with self._conexao() as conn:
+                conn.executemany(
+                    "INSERT INTO series (nome, rotulos, le, valor) VALUES (?, ?, ?, ?) "
+                    "ON CONFLICT (nome, rotulos, le) DO UPDATE SET valor = valor + excluded.valor",
+                    linhas,
+                )
+        except sqlite3.Error as e:
+            if not self._avisado:
+                print(f"AVISO: métricas não gravadas ({e}).")
+                self._avisado = True
+
+    def contar(self, nome, valor=1, **rotulos):
+        self._somar([(nome, _rotulos(rotulos), 0, valor)])
+
+    def observar(self, nome, valor, **rotulos):
+        """Uma observação no histograma `nome` (baldes acumulados, soma e contagem)."""
+        texto = _rotulos(rotulos)
+        linhas = [(f"{nome}_bucket", texto, limite, 1) for limite in LIMITES_SEGUNDOS if valor <= limite]
+        linhas += [
+            (f"{nome}_bucket", texto, math.inf, 1),
+            (f"{nome}_sum", texto, 0, valor),
+            (f"{nome}_count", texto, 0, 1),
+        ]
+        self._somar(linhas)
+
+    def texto_prometheus(self):
+        """Todas as séries no formato de exposição em texto do Prometheus."""
+        # Baldes sem nenhuma observação também precisam aparecer (com 0)
+        series = {}
+        for nome, rotulos, le, valor in self._conexao().execute("SELECT nome, rotulos, le, valor FROM series"):
+            series[(nome, rotulos, le)] = valor
+        for nome, rotulos, _ in list(series):
+            if nome.endswith('_bucket'):
+                for limite in LIMITES_SEGUNDOS:
+                    series.setdefault((nome, rotulos, limite), 0)
+
+        linhas = []
+        for base, (tipo, descricao) in METRICAS.items():
+            nomes = {base} if tipo == 'counter' else {f"{base}_bucket", f"{base}_sum", f"{base}_count"}
+            selecionadas = sorted(
+                (chave for chave in series if chave[0] in nomes),
+                key=lambda chave: (chave[1], chave[0] != f"{base}_bucket", chave[0], chave[2]),
+            )
+            linhas.append(f"# HELP {PREFIXO}{base} {descricao}")
+            linhas.append(f"# TYPE {PREFIXO}{base} {tipo}")
+            for nome, rotulos, le in selecionadas:
+                valor = series[(nome, rotulos, le)]
+                if nome.endswith('_bucket'):
+                    rotulos = ','.join(filter(None, [rotulos, f'le="{_numero(le)}"']))
+                linhas.append(f"{PREFIXO}{nome}{{{rotulos}}} {_numero(valor)}" if rotulos
+                              else f"{PREFIXO}{nome} {_numero(valor)}")
+        return '\n'.join(linhas) + '\n'
+
+
+_registro_padrao = None
+_registro_padrao_lock = threading.Lock()
+
+
+def registro_padrao():
+    global _registro_padrao
+    with _registro_padrao_lock:
+        if _registro_padrao is None:
+            _registro_padrao = RegistroMetricas()
+        return _registro_padrao
+
+
+def contar(nome, valor=1, **rotulos):
+    if METRICAS_ATIVAS and valor:
+        registro_padrao().contar(nome, valor, **rotulos)
+
+
+def contar_bytes(tipo, caminho, funcao=None):
+    """Soma o tamanho do arquivo recém-gravado em bytes_gravados_total (função: a instrumentada em andamento)."""
+    if funcao is None:
+        execucao = _execucao.get()
+        funcao = execucao.funcao if execucao is not None else 'outra'
+    try:
+        contar('bytes_gravados_total', os.path.getsize(caminho), funcao=funcao, tipo=tipo)
+    except OSError:
+        pass
+
+
+# --- Tempos por etapa ---
+
+_coletor = contextvars.ContextVar('coletor_tempos', default=None)
+_execucao = contextvars.ContextVar('execucao_instrumentada', default=None)
+
+
+def _registrar_etapa(funcao, etapa, segundos):
+    if METRICAS_ATIVAS:
+        registro_padrao().observar('etapa_segundos', segundos, funcao=funcao, etapa=etapa)
+    tempos = _coletor.get()
+    if tempos is not None:
+        tempos.append({'funcao': funcao, 'etapa': etapa, 'segundos': round(segundos, 4)})
+
+
+@contextmanager
+def medir(funcao, etapa):
+    """Cronometra o bloco como a etapa `etapa` de `funcao`."""
+    inicio = time.perf_counter()
+    try:
+        yield
+    finally:
+        _registrar_etapa(funcao, etapa, time.perf_counter() - inicio)
+
+
+class _Execucao:
+    def __init__(self, funcao):
+        self.funcao = funcao
+        self.etapa = None
+        self.inicio = None
+
+    def trocar(self, etapa):
+        agora = time.perf_counter()
+        if self.etapa is not None:
+            _registrar_etapa(self.funcao, self.etapa, agora - self.inicio)
+        self.etapa, self.inicio = etapa, agora
+
+
+def etapa(nome):
+    """
+    Fecha a etapa em andamento da função instrumentada e abre `nome`; a última
+    etapa fecha quando a função retorna. Fora de uma função instrumentada, não faz nada.
+    """
+    execucao = _execucao.get()
+    if execucao is not None:
+        execucao.trocar(nome)
+
+
+def instrumentar(funcao):
+    """Decorador: registra o tempo total da função (etapa 'total') e habilita `etapa()` dentro dela."""
+    def decorador(f):
+        @functools.wraps(f)
+        def envolvida(*args, **kwargs):
+            execucao = _Execucao(funcao)
+            token = _execucao.set(execucao)
+            inicio = time.perf_counter()
+            try:
+                return f(*args, **kwargs)
+            finally:
+                execucao.trocar(None)
+                _execucao.reset(token)
+                _registrar_etapa(funcao, 'total', time.perf_counter() - inicio)
+        return envolvida
+    return decorador
+
+
+@contextmanager
+def coletar():
+    """Junta numa lista os tempos das etapas executadas dentro do bloco (painel de tempos da interface)."""
+    tempos = []
+    token = _coletor.set(tempos)
+    try:
+        yield tempos
+    finally:
+        _coletor.reset(token)
+
+
+def tabela_tempos(tempos):
+    """Tempos coletados -> DataFrame (função, etapa, segundos), somando etapas repetidas."""
+    import pandas as pd
+
+    df = pd.DataFrame(tempos, columns=['funcao', 'etapa', 'segundos'])
+    df = df.groupby(['funcao', 'etapa'], sort=False, as_index=False)['segundos'].sum()
+    return df.rename(columns={'funcao': 'Função', 'etapa': 'Etapa', 'segundos': 'Segundos'})
@@ -0,0 +1,55 @@
+# Em pagina_mapa.py
+# HTML dos mapas direto de um template Jinja (templates/mapa.html), sem montar a
+# árvore de objetos do folium/branca a cada mapa. O template é compilado uma vez
+# por processo; os dados continuam em <mapa>.json.gz (mapa_dados.py), então a
+# página é só a casca do Leaflet, com as mesmas camadas que o folium gerava.
+# MAPAS_RENDERIZADOR=folium volta ao caminho antigo (para comparar ou depurar).
+
+import os
+import threading
+import uuid
+
+from jinja2 import Environment, FileSystemLoader, select_autoescape
+
+from camada_marcadores import CALLBACK_MARCADOR, ICONE_CLUSTER
+
+BASE_DIR = os.path.dirname(os.path.abspath(__file__))
+PASTA_TEMPLATES = os.path.join(BASE_DIR, 'templates')
+RENDERIZADOR = os.environ.get('MAPAS_RENDERIZADOR', 'template')
+
+_template = None
+_template_lock = threading.Lock()
+
+
+def usar_folium():
+    return RENDERIZADOR == 'folium'
+
+
+def _template_mapa():
+    global _template
+    with _template_lock:
+        if _template is None:
+            ambiente = Environment(loader=FileSystemLoader(PASTA_TEMPLATES), autoescape=select_autoescape(['html']))
+            _template = ambiente.get_template('mapa.html')
+        return _template
+
+
+def salvar_pagina_mapa(caminho, titulo, centro, url_dados, nome_marcadores,
+                       indice_tempo=None, nome_calor=None, tabela=False):
+    """
+    Grava (de forma atômica) a página de um mapa cujos dados estão em `url_dados`.
+    Sem `indice_tempo`: HeatMap com os níveis em dados['calor'] (mapa do dia).
+    Com `indice_tempo` (rótulos dos dias): HeatMapWithTime com dados['calor_por_dia'].
+    `nome_calor` acrescenta o controle de camadas; `tabela`, o resumo por bairro (dados['tabela']).
+    """
+    html = _template_mapa().render(
+        titulo=titulo, centro=[float(centro[0]), float(centro[1])], url_dados=url_dados,
+        indice_tempo=indice_tempo, nome_calor=nome_calor, nome_marcadores=nome_marcadores, tabela=tabela,
+        callback_marcador=CALLBACK_MARCADOR.strip(), icone_cluster=ICONE_CLUSTER.strip(),
+    )
+    os.makedirs(os.path.dirname(os.path.abspath(caminho)), exist_ok=True)
+    temporario = f"{caminho}.{uuid.uuid4().hex}.tmp"
+    with open(temporario, 'w', encoding='utf-8') as f:
+        f.write(html)
+    os.replace(temporario, caminho)
+    return caminho
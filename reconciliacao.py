@@ -0,0 +1,190 @@
+# Em reconciliacao.py
+
+import numpy as np
+import pandas as pd
+
+from cache_planilhas import carregar_planilha
+from ingestao import COLUNA_SVO_ORIGINAL, chave_svo, formatar_datas, ler_planilha_em_blocos, svos_em_texto, texto_svo
+from metricas import contar, etapa, instrumentar
+
+COLUNAS_FONTE = ['SVO', 'Status da OS', 'Agendado para', 'Cidade Consumidor']
+COLUNAS_RELATORIO = ['SVO', 'Cidade Consumidor']
+CIDADE_DESCONHECIDA = 'Desconhecida'
+
+
+def _blocos(origem, colunas, tamanho_bloco):
+    """Aceita DataFrame, caminho, bytes ou upload e entrega DataFrames (em blocos, se pedido)."""
+    if isinstance(origem, pd.DataFrame):
+        passo = tamanho_bloco or max(len(origem), 1)
+        for inicio in range(0, max(len(origem), 1), passo):
+            yield origem.iloc[inicio:inicio + passo]
+    elif tamanho_bloco:
+        yield from ler_planilha_em_blocos(origem, colunas, tamanho_bloco)
+    else:
+        yield carregar_planilha(origem, colunas)
+
+
+def _cidades(bloco, selecao=None):
+    """Cidade de cada linha (das linhas em `selecao`), recortando a category antes de virar texto."""
+    if 'Cidade Consumidor' not in bloco.columns:
+        quantidade = len(bloco) if selecao is None else int(np.count_nonzero(selecao))
+        return np.full(quantidade, CIDADE_DESCONHECIDA, dtype=object)
+    cidades = bloco['Cidade Consumidor']
+    if selecao is not None:
+        cidades = cidades[selecao]
+    return cidades.astype(object).fillna(CIDADE_DESCONHECIDA).to_numpy()
+
+
+def _chaves(bloco, textos):
+    """
+    Chave inteira de cada SVO do bloco (ver `chave_svo`: 'SVO-001' e 'SVO-1' são
+    distintas). As fora do padrão (chave < -1) entram em `textos` ({chave: texto})
+    para serem exibidas como vieram.
+    """
+    chaves = chave_svo(bloco['SVO'])
+    outras = chaves < -1
+    if outras.any():
+        textos.update(zip(chaves[outras].tolist(), svos_em_texto(bloco, outras).tolist()))
+    return chaves
+
+
+def _invalidas(bloco, chaves, planilha):
+    """Linhas cuja SVO ficou sem chave (-1): vão para o relatório de inválidas em vez de sumir."""
+    invalidas = chaves == -1
+    originais = bloco[COLUNA_SVO_ORIGINAL] if COLUNA_SVO_ORIGINAL in bloco.columns else bloco['SVO']
+    return pd.DataFrame({
+        'SVO': originais[invalidas].astype(object).to_numpy(),
+        'Cidade Consumidor': _cidades(bloco, invalidas),
+        'Planilha': planilha,
+    })
+
+
+def _texto(chaves, textos):
+    """Coluna SVO de exibição: chaves canônicas viram 'SVO-<número>', as outras voltam ao texto original."""
+    svos = texto_svo(chaves)
+    if textos:
+        outras = (chaves < -1).to_numpy()
+        svos[outras] = [textos[chave] for chave in chaves[outras].tolist()]
+    return svos
+
+
+def _presentes(chaves, ordenadas):
+    """Máscara: quais `chaves` estão no vetor ordenado e sem repetição `ordenadas` (busca binária)."""
+    posicao = np.searchsorted(ordenadas, chaves)
+    presentes = posicao < len(ordenadas)
+    presentes[presentes] = ordenadas[posicao[presentes]] == chaves[presentes]
+    return presentes
+
+
+def _juntar(partes, colunas, repetidas):
+    """Concatena os blocos e, se houver chaves `repetidas`, fica com a primeira; copia só quando precisa."""
+    if not partes:
+        return pd.DataFrame(columns=colunas)
+    df = partes[0] if len(partes) == 1 else pd.concat(partes, ignore_index=True)
+    if repetidas:
+        df = df.drop_duplicates('chave')
+    df.reset_index(drop=True, inplace=True)  # os blocos já são cópias feitas aqui
+    return df
+
+
+@instrumentar('reconciliar')
+def reconciliar(fontes, relatorios, tamanho_bloco=None):
+    """
+    Cruza N planilhas de SVOs abertas (fontes) com N relatórios numa só passada.
+
+    - pendentes: estão em alguma fonte e em nenhum relatório;
+    - resolvidas: estão numa fonte e em algum relatório;
+    - desconhecidas: aparecem só nos relatórios;
+    - invalidas: linhas de qualquer planilha sem uma SVO 'SVO-...' (com a 'Planilha' de onde vieram).
+
+    As SVOs viram chaves inteiras ('SVO-001' e 'SVO-1' continuam distintas, ver `chave_svo`); o cruzamento é um anti-join vetorizado sobre
+    o vetor ordenado de chaves dos relatórios. Com `tamanho_bloco`, as planilhas
+    são lidas em blocos e só as chaves inteiras ficam inteiras em memória.
+    Retorna {'pendentes', 'resolvidas', 'desconhecidas', 'invalidas'}, todos com 'Cidade Consumidor'.
+    """
+    textos, invalidas = {}, []
+    # 1. Chaves dos relatórios (ordenadas e únicas) e a cidade de cada uma, quando houver
+    etapa('relatorios')
+    chaves_rel, cidades_rel = [], []
+    for relatorio in relatorios:
+        for bloco in _blocos(relatorio, COLUNAS_RELATORIO, tamanho_bloco):
+            chaves = _chaves(bloco, textos)
+            validas = chaves != -1
+            if not validas.all():
+                invalidas.append(_invalidas(bloco, chaves, 'Relatório'))
+            chaves_rel.append(chaves[validas])
+            cidades_rel.append(_cidades(bloco, validas))
+    chaves_rel = np.concatenate(chaves_rel) if chaves_rel else np.empty(0, dtype='int64')
+    cidades_rel = np.concatenate(cidades_rel) if cidades_rel else np.empty(0, dtype=object)
+    chaves_rel, primeira = np.unique(chaves_rel, return_index=True)
+    cidades_rel = cidades_rel[primeira]
+
+    # 2. Fontes, bloco a bloco: anti-join contra os relatórios
+    etapa('fontes')
+    pendentes, resolvidas, chaves_fonte = [], [], []
+    for fonte in fontes:
+        for bloco in _blocos(fonte, COLUNAS_FONTE, tamanho_bloco):
+            chaves = _chaves(bloco, textos)
+            validas = chaves != -1
+            if not validas.all():  # quase sempre todas são válidas: sem copiar o bloco
+                invalidas.append(_invalidas(bloco, chaves, 'Origem'))
+                bloco, chaves = bloco[validas], chaves[validas]
+            no_relatorio = _presentes(chaves, chaves_rel)
+
+            colunas = [c for c in COLUNAS_FONTE + [COLUNA_SVO_ORIGINAL] if c in bloco.columns]
+            pendente = bloco.loc[~no_relatorio, colunas]
+            pendente['chave'] = chaves[~no_relatorio]
+            pendentes.append(pendente)
+            resolvidas.append(pd.DataFrame({
+                'chave': chaves[no_relatorio],
+                'Cidade Consumidor': _cidades(bloco, no_relatorio),
+            }))
+            chaves_fonte.append(chaves)
+
+    # Uma SVO presente em mais de uma fonte conta uma vez só
+    chaves_fonte = np.concatenate(chaves_fonte) if chaves_fonte else np.empty(0, dtype='int64')
+    contar('linhas_processadas_total', len(chaves_fonte), funcao='reconciliar')
+    unicas_fonte = np.unique(chaves_fonte)
+    repetidas = len(unicas_fonte) < len(chaves_fonte)
+    pendentes = _juntar(pendentes, COLUNAS_FONTE + ['chave'], repetidas)
+    resolvidas = _juntar(resolvidas, ['chave', 'Cidade Consumidor'], repetidas)
+
+    # 3. Desconhecidas: chaves dos relatórios que nenhuma fonte trouxe
+    etapa('desconhecidas')
+    so_relatorio = ~_presentes(chaves_rel, unicas_fonte)
+    desconhecidas = pd.DataFrame({
+        'chave': chaves_rel[so_relatorio],
+        'Cidade Consumidor': cidades_rel[so_relatorio],
+    })
+
+    for df in (resolvidas, desconhecidas):
+        df.insert(0, 'SVO', _texto(df['chave'], textos))
+    invalidas = _juntar(invalidas, ['SVO', 'Cidade Consumidor', 'Planilha'], False)
+    contar('svos_invalidas_total', len(invalidas), funcao='reconciliar')
+    return {'pendentes': pendentes, 'resolvidas': resolvidas, 'desconhecidas': desconhecidas, 'invalidas': invalidas}
+
+
+def resumo_por_cidade(resultado):
+    """Tabela cidade x (pendentes, resolvidas, desconhecidas, invalidas) com as contagens."""
+    contagens = {
+        nome: df['Cidade Consumidor'].astype(object).fillna(CIDADE_DESCONHECIDA).value_counts()
+        for nome, df in resultado.items()
+    }
+    return pd.DataFrame(contagens).fillna(0).astype(int).rename_axis('Cidade').reset_index()
+
+
+@instrumentar('formatar_pendentes')
+def formatar_pendentes(svos_pendentes):
+    """Ordena por status (na ordem em que aparecem) e formata SVO e data para exibição."""
+    if svos_pendentes.empty:
+        return svos_pendentes[COLUNAS_FONTE]
+    status = svos_pendentes['Status da OS']
+    status_order = list(status.dropna().unique())  # ordem de aparição, mesmo se for category
+    # Um DataFrame novo com só o que a tabela mostra; datas formatadas por dia distinto
+    formatado = pd.DataFrame({
+        'SVO': svos_em_texto(svos_pendentes),
+        'Status da OS': pd.Categorical(status, categories=status_order, ordered=True),
+        'Agendado para': formatar_datas(svos_pendentes['Agendado para']),
+        'Cidade Consumidor': svos_pendentes['Cidade Consumidor'],
+    }, index=svos_pendentes.index)
+    return formatado.sort_values('Status da OS', kind='stable')
@@ -0,0 +1,128 @@
+# Em snapshots.py
+
+import os
+import uuid
+from datetime import date
+from urllib.parse import quote, unquote
+
+import pandas as pd
+
+from ingestao import svos_em_texto
+from metricas import instrumentar
+from reconciliacao import CIDADE_DESCONHECIDA
+
+BASE_DIR = os.path.dirname(os.path.abspath(__file__))
+PASTA_SNAPSHOTS = os.environ.get('SNAPSHOTS_DIR', os.path.join(BASE_DIR, 'snapshots'))
+
+
+def _pasta_cidade(cidade, pasta=PASTA_SNAPSHOTS):
+    return os.path.join(pasta, f"cidade={quote(str(cidade), safe='')}")
+
+
+def _arquivo(cidade, dia, pasta=PASTA_SNAPSHOTS):
+    return os.path.join(_pasta_cidade(cidade, pasta), f"data={dia.isoformat()}", 'pendentes.parquet')
+
+
+@instrumentar('gravar_snapshot')
+def gravar_snapshot(pendentes, dia=None, outras_cidades=(), pasta=PASTA_SNAPSHOTS):
+    """
+    Guarda as SVOs pendentes de cada cidade (chave, status e data agendada) em
+    snapshots/cidade=<cidade>/data=<AAAA-MM-DD>/pendentes.parquet.
+    `outras_cidades` (ex.: cidades só com SVOs resolvidas) ganham um snapshot vazio,
+    para que as pendências que sumiram apareçam no delta.
+    Rodar de novo no mesmo dia substitui o snapshot do dia.
+    SVOs fora do padrão 'SVO-<número>' (chave negativa, ex.: 'SVO-001') levam o texto
+    original numa coluna 'svo', que só existe quando há alguma.
+    Retorna a lista de cidades gravadas.
+    """
+    dia = dia or date.today()
+    compacto = pd.DataFrame({
+        'chave': pendentes['chave'].astype('int64'),
+        'status': pendentes['Status da OS'].astype('category'),
+        'agendado': pd.to_datetime(pendentes['Agendado para'], errors='coerce'),
+        'cidade': pendentes['Cidade Consumidor'].astype(object).fillna(CIDADE_DESCONHECIDA),
+    })
+    outras = (compacto['chave'] < 0).to_numpy()
+    if outras.any():
+        compacto['svo'] = None
+        compacto.loc[outras, 'svo'] = svos_em_texto(pendentes, outras).to_numpy()
+    grupos = dict(list(compacto.groupby('cidade', sort=False)))
+    for cidade in outras_cidades:
+        grupos.setdefault(cidade, compacto.iloc[0:0])
+
+    cidades = []
+    for cidade, grupo in grupos.items():
+        destino = _arquivo(cidade, dia, pasta)
+        os.makedirs(os.path.dirname(destino), exist_ok=True)
+        temporario = f"{destino}.{uuid.uuid4().hex}.tmp"
+        grupo.drop(columns='cidade').reset_index(drop=True).to_parquet(temporario, index=False)
+        os.replace(temporario, destino)
+        cidades.append(cidade)
+    return cidades
+
+
+def datas_disponiveis(cidade, pasta=PASTA_SNAPSHOTS):
+    pasta_cidade = _pasta_cidade(cidade, pasta)
+    if not os.path.isdir(pasta_cidade):
+        return []
+    datas = []
+    for nome in os.listdir(pasta_cidade):
+        if nome.startswith('data=') and os.path.exists(os.path.join(pasta_cidade, nome, 'pendentes.parquet')):
+            datas.append(date.fromisoformat(nome[len('data='):]))
+    return sorted(datas)
+
+
+def cidades_disponiveis(pasta=PASTA_SNAPSHOTS):
+    if not os.path.isdir(pasta):
+        return []
+    return sorted(unquote(nome[len('cidade='):]) for nome in os.listdir(pasta) if nome.startswith('cidade='))
+
+
+def carregar_snapshot(cidade, dia, pasta=PASTA_SNAPSHOTS):
+    return pd.read_parquet(_arquivo(cidade, dia, pasta))
+
+
+def snapshot_anterior(cidade, dia=None, pasta=PASTA_SNAPSHOTS):
+    """Último snapshot da cidade estritamente anterior a `dia` (hoje), ou (None, None)."""
+    dia = dia or date.today()
+    anteriores = [d for d in datas_disponiveis(cidade, pasta) if d < dia]
+    if not anteriores:
+        return None, None
+    return anteriores[-1], carregar_snapshot(cidade, anteriores[-1], pasta)
+
+
+def _diferentes(atual, anterior):
+    """Comparação que trata vazio (NaN/NaT) nos dois lados como igual."""
+    return ~(atual.eq(anterior) | (atual.isna() & anterior.isna()))
+
+
+def calcular_delta(atual, anterior):
+    """
+    Diferença entre dois snapshots da mesma cidade:
+    - novas: pendentes agora e não antes;
+    - resolvidas: pendentes antes e não agora;
+    - status_alterado / reagendadas: nas duas, com status ou data diferente.
+    """
+    juntos = atual.merge(anterior, on='chave', how='outer', suffixes=('', '_anterior'), indicator=True)
+    if 'svo_anterior' in juntos.columns:
+        juntos['svo'] = juntos['svo'].fillna(juntos.pop('svo_anterior'))
+    svo = ['svo'] if 'svo' in juntos.columns else []
+    nas_duas = juntos['_merge'] == 'both'
+    mudou_status = nas_duas & _diferentes(juntos['status'].astype(object), juntos['status_anterior'].astype(object))
+    mudou_data = nas_duas & ~mudou_status & _diferentes(juntos['agendado'], juntos['agendado_anterior'])
+    colunas = ['chave', *svo, 'status', 'agendado', 'status_anterior', 'agendado_anterior']
+    return {
+        'novas': juntos.loc[juntos['_merge'] == 'left_only', ['chave', *svo, 'status', 'agendado']],
+        'resolvidas': juntos.loc[juntos['_merge'] == 'right_only', ['chave', *svo, 'status_anterior', 'agendado_anterior']],
+        'status_alterado': juntos.loc[mudou_status, colunas],
+        'reagendadas': juntos.loc[mudou_data, colunas],
+    }
+
+
+def delta_do_dia(cidade, dia=None, pasta=PASTA_SNAPSHOTS):
+    """Compara o snapshot de `dia` (hoje) com o anterior. Retorna (data_anterior, delta) ou (None, None)."""
+    dia = dia or date.today()
+    data_anterior, anterior = snapshot_anterior(cidade, dia, pasta)
+    if anterior is None:
+        return None, None
+    return data_anterior, calcular_delta(carregar_snapshot(cidade, dia, pasta), anterior)
@@ -0,0 +1,81 @@
+# Em tests/test_fila_mapas.py
+# Lote regional da fila de mapas com as coordenadas já no cache: a geocodificação
+# termina logo, e as entradas por cidade têm de continuar lá para os jobs de mapa.
+
+import os
+import time
+from datetime import date, timedelta
+
+import pandas as pd
+import pytest
+
+BAIRROS = ['Centro', 'Cambuí', 'Taquaral']
+CIDADES = ['Campinas', 'Sumaré']
+
+
+@pytest.fixture
+def ambiente(tmp_path, monkeypatch):
+    """Caches, mapas e Nominatim só deste teste (os workers herdam o ambiente ao subir)."""
+    for nome, caminho in {
+        'GEO_CACHE_PATH': 'geo_cache.sqlite3', 'GAZETTEER_PATH': 'gazetteer.sqlite3',
+        'AO_VIVO_PATH': 'ao_vivo.sqlite3', 'CUBOS_DIR': 'cubos', 'MAPAS_DIR': 'mapas',
+    }.items():
+        monkeypatch.setenv(nome, str(tmp_path / caminho))
+    monkeypatch.setenv('METRICAS', '0')
+    # Nada deve ir para a rede: uma consulta aqui falharia
+    monkeypatch.setenv('NOMINATIM_SCHEME', 'http')
+    monkeypatch.setenv('NOMINATIM_DOMAIN', '127.0.0.1:9')
+
+    from geo_cache import GeoCache, chave_endereco
+    GeoCache(str(tmp_path / 'geo_cache.sqlite3')).gravar_varios({
+        chave_endereco(bairro, cidade): (-22.9 + i / 100, -47.0 + j / 100)
+        for i, bairro in enumerate(BAIRROS) for j, cidade in enumerate(CIDADES)
+    })
+    return tmp_path
+
+
+def _planilha():
+    amanha = pd.Timestamp(date.today() + timedelta(days=1))
+    linhas = [(bairro, cidade) for bairro in BAIRROS for cidade in CIDADES] * 3
+    return pd.DataFrame({
+        'SVO': [f'SVO-{i}' for i in range(len(linhas))],
+        'Status da OS': 'Aberta',
+        'Agendado para': amanha,
+        'Bairro Consumidor': [bairro for bairro, _ in linhas],
+        'Cidade Consumidor': [cidade for _, cidade in linhas],
+    })
+
+
+def test_lote_regional_com_cache_quente_nao_perde_as_entradas(ambiente):
+    from fila_mapas import ERRO, FINALIZADOS, FilaMapas, salvar_por_cidade
+
+    fila = FilaMapas(str(ambiente / 'fila.sqlite3'), max_processos=2)
+    try:
+        for futuro in fila.aquecer():  # workers já no ar, como depois do aquecimento
+            futuro.result(timeout=120)
+        entradas = salvar_por_cidade(_planilha(), str(ambiente / 'entradas'), chave='planilha')
+
+        def mapas_da_cidade(cidade, entrada):
+            # Dá tempo de a geocodificação terminar, se ela já estiver no pool
+            limite = time.time() + (3 if cidade == CIDADES[0] else 0)
+            while time.time() < limite and not any(
+                    job['tipo'] == 'geocodificacao' and job['estado'] in FINALIZADOS
+                    for job in fila.jobs_do_lote('L')):
+                time.sleep(0.05)
+            return [('geral', f"{cidade} geral", {'entrada': entrada, 'pasta': str(ambiente / 'mapas')})]
+
+        fila.enviar_regional('L', entradas, mapas_da_cidade)
+        limite = time.time() + 120
+        while not all(job['estado'] in FINALIZADOS for job in fila.jobs_do_lote('L')):
+            assert time.time() < limite, "o lote não terminou"
+            time.sleep(0.1)
+
+        jobs = fila.jobs_do_lote('L')
+        assert len(jobs) == 1 + len(CIDADES)
+        assert [job['erro'] for job in jobs if job['estado'] == ERRO] == []
+        for job in jobs:
+            if job['tipo'] == 'geral':
+                assert job['resultado'] and os.path.exists(job['resultado'])
+    finally:
+        if fila._executor is not None:
+            fila._executor.shutdown()
@@ -0,0 +1,72 @@
+# Em tests/test_geocodificador.py
+# Serviço de geocodificação contra o Nominatim falso (fake_nominatim.py): a taxa
+# configurada nunca é ultrapassada e consultas iguais em andamento viram uma só.
+
+import threading
+
+import pytest
+
+from fake_nominatim import FakeNominatim
+from geocodificador import LimitadorCompartilhado, LimitadorTokens, ServicoGeocodificacao
+
+TAXA = 5  # requisições por segundo
+
+
+@pytest.fixture
+def nominatim():
+    servidor = FakeNominatim(latencia=0.2).iniciar()
+    yield servidor
+    servidor.shutdown()
+    servidor.server_close()
+
+
+def _servico(servidor, limitador, max_paralelo=4):
+    return ServicoGeocodificacao(domain=servidor.domain, scheme='http', max_paralelo=max_paralelo,
+                                 limitador=limitador)
+
+
+def test_consultas_iguais_em_andamento_viram_uma_requisicao(nominatim):
+    servico = _servico(nominatim, LimitadorTokens(50))
+    futuros = []
+    threads = [threading.Thread(target=lambda: futuros.append(servico.geocodificar('Cambuí, Campinas')))
+               for _ in range(20)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    resultados = {(f.result().latitude, f.result().longitude) for f in futuros}
+    assert len(resultados) == 1
+    assert len({id(f) for f in futuros}) == 1
+    assert nominatim.estatisticas()['requisicoes'] == 1
+    assert servico.requisicoes == 1
+
+
+def test_lote_com_repetidas_consulta_cada_endereco_uma_vez(nominatim):
+    servico = _servico(nominatim, LimitadorTokens(50))
+    consultas = ['Centro, Campinas', 'Taquaral, Campinas', 'inexistente, Campinas'] * 5
+
+    resultados = servico.geocodificar_lote(consultas)
+
+    assert set(resultados) == set(consultas)
+    assert resultados['inexistente, Campinas'] is None
+    assert nominatim.estatisticas()['requisicoes'] == 3
+
+
+@pytest.mark.parametrize('limitador', ['tokens', 'compartilhado'])
+def test_limitador_nunca_passa_da_taxa(nominatim, tmp_path, limitador):
+    if limitador == 'tokens':
+        limitador = LimitadorTokens(TAXA)
+    else:
+        limitador = LimitadorCompartilhado(TAXA, caminho=str(tmp_path / 'geo_cache.sqlite3'))
+    nominatim.latencia = 0.0
+    servico = _servico(nominatim, limitador, max_paralelo=8)
+    consultas = [f"Bairro {i}, Campinas" for i in range(15)]
+
+    servico.geocodificar_lote(consultas)
+
+    estatisticas = nominatim.estatisticas()
+    assert estatisticas['requisicoes'] == len(consultas)
+    # Capacidade 1: nenhuma janela de 1 s recebe mais que 1 + taxa requisições
+    assert estatisticas['pico_por_segundo'] <= 1 + TAXA
+    assert estatisticas['duracao_s'] >= (len(consultas) - 1) / TAXA * 0.9
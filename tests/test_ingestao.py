@@ -0,0 +1,41 @@
+# Em tests/test_ingestao.py
+# Esquema normalizado com SVOs fora do padrão: a coluna continua inteira e o
+# texto original só fica guardado para as exceções.
+
+import pandas as pd
+
+from ingestao import COLUNA_SVO_ORIGINAL, converter_tipos, svos_em_texto
+from reconciliacao import formatar_pendentes, reconciliar
+
+SVOS = ['SVO-1', 'SVO-001', 'SVO-12A', 'ABC', None, 'SVO-5']
+
+
+def _fonte():
+    return pd.DataFrame({
+        'SVO': SVOS,
+        'Status da OS': 'Aberta',
+        'Agendado para': pd.NaT,
+        'Cidade Consumidor': 'Campinas',
+    })
+
+
+def test_svos_fora_do_padrao_nao_impedem_a_chave_inteira():
+    df = converter_tipos(_fonte())
+
+    assert df['SVO'].dtype == 'int64'
+    assert df[COLUNA_SVO_ORIGINAL].dtype == 'category'
+    assert df[COLUNA_SVO_ORIGINAL].isna().tolist() == [True, False, False, False, True, True]
+    assert df['SVO'].tolist()[0] == 1 and df['SVO'].tolist()[1] < -1  # 'SVO-001' não vira 'SVO-1'
+    assert df['SVO'].tolist()[3:5] == [-1, -1]  # inválidas
+    assert svos_em_texto(df).tolist()[:4] == SVOS[:4]  # exibidas como vieram
+
+
+def test_reconciliacao_igual_com_e_sem_o_esquema_normalizado():
+    relatorio = pd.DataFrame({'SVO': ['SVO-001', 'SVO-5'], 'Cidade Consumidor': 'Campinas'})
+    cru = reconciliar([_fonte()], [relatorio])
+    normalizado = reconciliar([converter_tipos(_fonte())], [converter_tipos(relatorio)])
+
+    for resultado in (cru, normalizado):
+        assert formatar_pendentes(resultado['pendentes'])['SVO'].tolist() == ['SVO-1', 'SVO-12A']
+        assert resultado['resolvidas']['SVO'].tolist() == ['SVO-001', 'SVO-5']
+        assert resultado['invalidas']['SVO'].fillna('').tolist() == ['ABC', '']
@@ -0,0 +1,40 @@
+# Em tests/test_snapshots.py
+# Delta entre snapshots: status ou data em branco nos dois dias não é mudança.
+
+from datetime import date
+
+import pandas as pd
+
+from snapshots import calcular_delta, carregar_snapshot, gravar_snapshot
+
+
+def _pendentes(status, agendado):
+    return pd.DataFrame({
+        'SVO': [f'SVO-{i}' for i in range(len(status))],
+        'chave': range(len(status)),
+        'Status da OS': status,
+        'Agendado para': pd.to_datetime(agendado),
+        'Cidade Consumidor': 'Campinas',
+    })
+
+
+def test_vazios_nos_dois_snapshots_nao_contam_como_mudanca(tmp_path):
+    pendentes = _pendentes(['Aberta', None, None], ['2026-01-05', None, '2026-01-06'])
+    gravar_snapshot(pendentes, date(2026, 1, 1), pasta=tmp_path)
+    snapshot = carregar_snapshot('Campinas', date(2026, 1, 1), tmp_path)
+
+    delta = calcular_delta(snapshot, snapshot)
+
+    assert all(df.empty for df in delta.values())
+
+
+def test_status_e_data_que_mudaram_aparecem_no_delta(tmp_path):
+    gravar_snapshot(_pendentes(['Aberta', None, None], ['2026-01-05', None, None]), date(2026, 1, 1), pasta=tmp_path)
+    gravar_snapshot(_pendentes([None, None, None], ['2026-01-05', None, '2026-01-07']), date(2026, 1, 2), pasta=tmp_path)
+
+    delta = calcular_delta(carregar_snapshot('Campinas', date(2026, 1, 2), tmp_path),
+                           carregar_snapshot('Campinas', date(2026, 1, 1), tmp_path))
+
+    assert delta['status_alterado']['chave'].tolist() == [0]
+    assert delta['reagendadas']['chave'].tolist() == [2]
+    assert delta['novas'].empty and delta['resolvidas'].empty